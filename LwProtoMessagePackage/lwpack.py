@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# coding=utf8
+"""
+Compile a message text file into a binary .lwpack corpus, or inspect one.
+
+Usage:
+  python3 lwpack.py <input_txt> <output_lwpack> [allInOne|patch]
+  python3 lwpack.py --info <input_lwpack>
+
+The input file uses the same log-line format as message_common_simulate
+(... version=.. orchId=.. customerId=.. clientId=.. tranId=.. type=.. payload=...).
+Every line is parsed and routed once at compile time; the pack stores, per
+record, the target queue and the complete CommServer frame (20-byte plain
+header + serialized PayloadType), followed by an offset index. Pass the
+.lwpack path to message_common_simulate_main.py in place of the text file to
+skip text parsing at startup (the file is mmap'ed, not read).
+"""
+
+import mmap
+import sys
+from struct import Struct
+
+from proto_tools import plainHeaderLen
+
+LWPACK_MAGIC = b"LWPK"
+LWPACK_VERSION = 1
+LWPACK_SUFFIX = ".lwpack"
+# magic, version, deploy(0=allInOne 1=patch), queue 数, record 数, index 偏移
+_file_header = Struct(">4sHBBIQ")
+# queue 序号, frame 长度
+_record_header = Struct(">BI")
+_index_entry = Struct(">Q")
+
+DEPLOY_ALLINONE = 0
+DEPLOY_PATCH = 1
+
+
+def write_lwpack(path, queue_list, message_bytes_list, deploy=DEPLOY_ALLINONE):
+    """
+    将 handle_stats_* 的输出（队列名列表、帧列表）写成 .lwpack 文件。
+    """
+    queue_names = sorted(set(queue_list))
+    queue_ids = {name: i for i, name in enumerate(queue_names)}
+    offsets = []
+    with open(path, "wb") as f:
+        f.write(_file_header.pack(LWPACK_MAGIC, LWPACK_VERSION, deploy, len(queue_names), len(queue_list), 0))
+        for name in queue_names:
+            encoded = name.encode()
+            f.write(bytes([len(encoded)]) + encoded)
+        for queue, frame in zip(queue_list, message_bytes_list):
+            offsets.append(f.tell())
+            f.write(_record_header.pack(queue_ids[queue], len(frame)))
+            f.write(frame)
+        index_offset = f.tell()
+        for offset in offsets:
+            f.write(_index_entry.pack(offset))
+        f.seek(0)
+        f.write(_file_header.pack(LWPACK_MAGIC, LWPACK_VERSION, deploy, len(queue_names), len(queue_list),
+                                  index_offset))
+    return len(offsets)
+
+
+class LwPack(object):
+    """
+    以 mmap 方式打开的 .lwpack 文件；frames 中的每一帧都是指向映射区的 memoryview，不做拷贝。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, version, self.deploy, queue_count, record_count, index_offset = _file_header.unpack_from(view, 0)
+        if magic != LWPACK_MAGIC or version != LWPACK_VERSION:
+            raise ValueError(f"{path} is not a version {LWPACK_VERSION} lwpack file")
+        pos = _file_header.size
+        queue_names = []
+        for _ in range(queue_count):
+            size = view[pos]
+            queue_names.append(bytes(view[pos + 1:pos + 1 + size]).decode())
+            pos += 1 + size
+        self.queue_list, self.frames = [], []
+        for i in range(record_count):
+            offset, = _index_entry.unpack_from(view, index_offset + i * _index_entry.size)
+            queue_id, size = _record_header.unpack_from(view, offset)
+            start = offset + _record_header.size
+            self.queue_list.append(queue_names[queue_id])
+            self.frames.append(view[start:start + size])
+
+    def __len__(self):
+        return len(self.frames)
+
+
+def is_lwpack(messages):
+    return isinstance(messages, LwPack) or (isinstance(messages, str) and messages.endswith(LWPACK_SUFFIX))
+
+
+def load_lwpack(messages, orch_deploy=None):
+    """
+    返回与 handle_stats_allinone/handle_stats_patch 相同形式的 (lines_list, queue_list, message_bytes_list)，
+    其中 lines_list 全为 None（没有原始文本，send_stats 直接从帧构造模板）。
+
+    :param messages: .lwpack 文件路径或已打开的 LwPack。
+    :param orch_deploy: 命令行传入的部署方式，仅用于和编译时的部署方式做一致性提示。
+    """
+    pack = messages if isinstance(messages, LwPack) else LwPack(messages)
+    if orch_deploy is not None and ('allInOne' in orch_deploy) != (pack.deploy == DEPLOY_ALLINONE):
+        print(f"warning: {pack.path} was compiled for {'allInOne' if pack.deploy == DEPLOY_ALLINONE else 'patch'} "
+              f"deploy, queue routing from the pack is used as-is")
+    return [None] * len(pack), pack.queue_list, pack.frames
+
+
+def main() -> int:
+    if len(sys.argv) == 3 and sys.argv[1] == "--info":
+        pack = LwPack(sys.argv[2])
+        counts = {}
+        for queue in pack.queue_list:
+            counts[queue] = counts.get(queue, 0) + 1
+        print(f"{pack.path}: {len(pack)} records, deploy={'allInOne' if pack.deploy == DEPLOY_ALLINONE else 'patch'}, "
+              f"payload bytes={sum(len(frame) - plainHeaderLen for frame in pack.frames)}, queues={counts}")
+        return 0
+    if len(sys.argv) not in (3, 4):
+        print("Usage: lwpack.py <input_txt> <output_lwpack> [allInOne|patch]\n"
+              "       lwpack.py --info <input_lwpack>", file=sys.stderr)
+        return 2
+
+    from message_common_simulate import handle_stats_allinone, handle_stats_patch
+
+    in_path, out_path = sys.argv[1], sys.argv[2]
+    orch_deploy = sys.argv[3] if len(sys.argv) == 4 else "allInOne"
+    with open(in_path, "r", encoding="utf-8") as f:
+        messages = f.read()
+    if 'allInOne' in orch_deploy:
+        _, queue_list, message_bytes_list = handle_stats_allinone(messages)
+        deploy = DEPLOY_ALLINONE
+    else:
+        _, queue_list, message_bytes_list = handle_stats_patch(messages)
+        deploy = DEPLOY_PATCH
+    if not queue_list:
+        print("ERROR: input file has no messages", file=sys.stderr)
+        return 2
+    count = write_lwpack(out_path, queue_list, message_bytes_list, deploy)
+    print(f"OK: wrote {count} records to {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# coding=utf8
+import asyncio
+import time
+import redis
+import redis.asyncio as aioredis
+from message_common_simulate import prepare_messages, print_send_counts, shard_ranges
+from proto_tools import MessageTemplate, get_message_template, redis_connect
+from redis_sender import RateLimiter, QueueBackpressure
+from progress_reporter import ProgressReporter
+from simulate_metrics import start_metrics
+from queue_monitor import QueueDepthMonitor
+
+
+class AsyncBatchedSender(object):
+    """
+    BatchedSender 的 asyncio 版本：按队列攒帧，多值 LPUSH 经非事务 pipeline 发出；batch_size <= 1 时逐条 LPUSH。
+    单个事件循环内使用；攒够 batch_size 条，或最早一条待发帧等待超过 max_latency 秒（后台任务检查）时发出。
+    metrics、counts、dropped 的含义与 BatchedSender 相同：一批帧在执行 pipeline 前就移出缓冲，失败时计入 dropped
+    并抛出异常，不会被之后的 flush/close 重发；后台任务 flush 失败时异常由下一次 send/flush 抛出。
+    须在事件循环内构造。
+    """
+
+    def __init__(self, redis_cli, batch_size=1, max_latency=0.05, metrics=None):
+        self._redis = redis_cli
+        self._metrics = metrics
+        self._batch_size = int(batch_size)
+        self._max_latency = float(max_latency)
+        self._pending = {}
+        self._pending_count = 0
+        self._oldest = None
+        # 后台任务与发送协程的 flush 串行执行，同一队列的前后两批不会因各自占用一个连接而乱序
+        self._lock = asyncio.Lock()
+        self._closed = False
+        self.counts = {}
+        self.dropped = {}
+        self._error = None
+        self._timer = None
+        if self._batch_size > 1 and self._max_latency > 0:
+            self._timer = asyncio.ensure_future(self._flush_timer())
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # 已有异常在传播时不再 flush，避免 flush 的异常掩盖原来的异常
+        await self.close(flush=exc_type is None)
+        return False
+
+    async def send(self, queue_name, frame):
+        self._raise_timer_error()
+        if self._batch_size <= 1:
+            start = time.perf_counter()
+            await self._redis.lpush(queue_name, frame)
+            if self._metrics is not None:
+                self._metrics.observe("lpush", time.perf_counter() - start)
+                self._metrics.record_sent(queue_name, 1, len(frame))
+            self.counts[queue_name] = self.counts.get(queue_name, 0) + 1
+            return
+        self._pending.setdefault(queue_name, []).append(frame)
+        self._pending_count += 1
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        if self._pending_count >= self._batch_size:
+            await self._flush()
+
+    async def flush(self):
+        self._raise_timer_error()
+        await self._flush()
+
+    def _raise_timer_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    async def _flush(self):
+        async with self._lock:
+            if not self._pending_count:
+                return
+            pending = self._pending
+            self._pending = {}
+            self._pending_count = 0
+            self._oldest = None
+            try:
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for queue_name, frames in pending.items():
+                        pipe.lpush(queue_name, *frames)
+                    start = time.perf_counter()
+                    # 非事务 pipeline 中各队列的 LPUSH 互不影响，逐条检查结果，只丢弃真正失败的队列
+                    results = await pipe.execute(raise_on_error=False)
+            except BaseException:
+                self._drop(pending)
+                raise
+            if self._metrics is not None:
+                self._metrics.observe("pipeline", time.perf_counter() - start)
+        error = None
+        for (queue_name, frames), result in zip(pending.items(), results):
+            if isinstance(result, Exception):
+                self.dropped[queue_name] = self.dropped.get(queue_name, 0) + len(frames)
+                error = error or result
+                continue
+            self.counts[queue_name] = self.counts.get(queue_name, 0) + len(frames)
+            if self._metrics is not None:
+                self._metrics.record_sent(queue_name, len(frames), sum(len(frame) for frame in frames))
+        if error is not None:
+            raise error
+
+    def _drop(self, pending):
+        for queue_name, frames in pending.items():
+            self.dropped[queue_name] = self.dropped.get(queue_name, 0) + len(frames)
+
+    async def _flush_timer(self):
+        while True:
+            await asyncio.sleep(self._max_latency / 2)
+            if self._oldest is not None and time.monotonic() - self._oldest >= self._max_latency:
+                try:
+                    await self._flush()
+                except redis.RedisError as e:
+                    # 这批帧已计入 dropped，异常交给发送协程下一次 send/flush 抛出
+                    print(f"Error flushing batch: {e}")
+                    self._error = e
+
+    async def close(self, flush=True):
+        """
+        停止后台任务；flush 为 True 时发出剩余帧（后台任务遗留的异常也在这里抛出）。
+        调用方正在处理异常时传 flush=False：剩余帧计入 dropped 直接丢弃，不再访问 Redis。重复调用时直接返回。
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+        try:
+            if flush:
+                await self.flush()
+            else:
+                self._drop(self._pending)
+                self._pending = {}
+                self._pending_count = 0
+                self._oldest = None
+        finally:
+            if self.dropped:
+                print("info", f"未确认写入而丢弃的帧：{self.dropped}")
+
+
+async def async_send_stats(redis_cli, repeat, speed_info, group_interval, total_group, lines_list, queue_list,
+                           message_bytes_list, line_num, batch_size=1, batch_latency=0.05, rate_limiter=None,
+                           name="coroutine", reporter=None, metrics=None, backpressure=None):
+    """
+    send_stats 的协程版本：输入、发送顺序、计数与打印保持一致，等待 Redis 应答时让出事件循环。
+    """
+    templates = [get_message_template(line) if line is not None else MessageTemplate.from_frame(frame)
+                 for line, frame in zip(lines_list, message_bytes_list)]
+    async with AsyncBatchedSender(redis_cli, batch_size, batch_latency, metrics) as sender:
+        for group in range(int(total_group)):
+            num = line_num
+            for j in range(int(repeat)):
+                for index, template in enumerate(templates):
+                    current_timestamp = int(round(time.time(), 6) * 1000000)
+                    message_bytes_list[index] = template.stamp(current_timestamp)
+                    if reporter is not None and reporter.record(f"协程{name}", queue_list[index],
+                                                                len(message_bytes_list[index])):
+                        reporter.trace(f"协程{name}", num, template, current_timestamp)
+                    num += 1
+                    if rate_limiter is not None:
+                        deadline = rate_limiter.reserve(
+                            1 if rate_limiter.unit == "msgs" else len(message_bytes_list[index]))
+                        if deadline:
+                            await asyncio.sleep(max(0, deadline - time.monotonic_ns()) / 1e9)
+                    while backpressure is not None and backpressure.is_paused(queue_list[index]):
+                        await asyncio.sleep(backpressure.poll_interval)
+                    await sender.send(queue_list[index], message_bytes_list[index])
+                    if rate_limiter is None and (speed_info != "0" or j != int(repeat) - 1):
+                        await asyncio.sleep(float(speed_info))
+            if group_interval != "0" or group != int(total_group) - 1:
+                await sender.flush()
+                await asyncio.sleep(float(group_interval))
+    print_send_counts(sender.counts)
+    return sender.counts
+
+
+async def async_simulate_message(repeated, speed, redis_info, messages, concurrency, group_message_intervals,
+                                 total_group_message, orch_deploy, pool_size=None, encode_processes=1, batch_size=1,
+                                 batch_latency=0.05, rate=None, burst=None, rate_unit="msgs", progress_interval=10,
+                                 trace_sample=0, metrics_port=None, metrics_file=None, metrics_interval=1.0,
+                                 high_water=None, low_water=None, depth_poll_interval=0.1, depth_monitor=None,
+                                 depth_monitor_interval=0.05):
+    redis_info = eval(str(redis_info))
+    lines, queueName_list, message_bytes_list = prepare_messages(messages, orch_deploy, encode_processes)
+    if redis_info.get("nodes") or redis_info.get("cluster"):
+        raise ValueError("the asyncio engine only supports a single redis node or sentinel, use --engine threads")
+    if redis_info.get("master_name"):
+        # asyncio 引擎只在启动时经 Sentinel 解析一次主节点，运行中的主从切换不会自动跟随
+        master = redis_connect(redis_info).master
+        redis_info = dict(redis_info, ip=master[0], port=master[1])
+    # 连接池上限默认与协程数相同，协程多于连接数时在池上排队等待空闲连接
+    pool = aioredis.BlockingConnectionPool(host=redis_info["ip"], port=redis_info["port"], password=redis_info["password"],
+                                   db=redis_info["db"], max_connections=int(pool_size or concurrency))
+    redis_cli = aioredis.StrictRedis(connection_pool=pool)
+    rate_limiter = RateLimiter(rate, burst, rate_unit) if rate else None
+    reporter = ProgressReporter(progress_interval, trace_sample)
+    # 队列深度记录器按 LPUSH 成功后的计数算写入速率，不用 reporter 在限速/背压/攒批之前的计数
+    metrics = start_metrics(metrics_port, metrics_file, metrics_interval, force=bool(depth_monitor))
+    # 队列深度由后台线程用同步客户端轮询，协程只读取暂停状态
+    sync_cli = redis_connect(redis_info) if high_water or depth_monitor else None
+    backpressure = QueueBackpressure(sync_cli, queueName_list, high_water, low_water,
+                                     depth_poll_interval) if high_water else None
+    monitor = QueueDepthMonitor(sync_cli, metrics.sent_counts, depth_monitor,
+                                depth_monitor_interval) if depth_monitor else None
+    try:
+        results = await asyncio.gather(*[
+            async_send_stats(redis_cli, repeated, speed, group_message_intervals, total_group_message,
+                             lines[start:end], queueName_list[start:end], message_bytes_list[start:end], start + 1,
+                             batch_size=batch_size, batch_latency=batch_latency, rate_limiter=rate_limiter,
+                             name=str(i), reporter=reporter, metrics=metrics, backpressure=backpressure)
+            for i, (start, end) in enumerate(shard_ranges(len(lines), concurrency))])
+    finally:
+        reporter.close()
+        if metrics is not None:
+            metrics.close()
+        if backpressure is not None:
+            backpressure.close()
+            backpressure.report()
+        if monitor is not None:
+            monitor.close()
+            monitor.report()
+        if hasattr(redis_cli, "aclose"):
+            await redis_cli.aclose()
+        else:
+            await redis_cli.close()
+        await pool.disconnect()
+    if rate_limiter is not None:
+        rate_limiter.report()
+    totals = {}
+    for counts in results:
+        for queue_name, count in counts.items():
+            totals[queue_name] = totals.get(queue_name, 0) + count
+    return totals
+
+
+def simulate_message_async_jenkins(repeated, speed, redis_info, messages, concurrency, group_message_intervals,
+                                   total_group_message, orch_deploy, pool_size=None, encode_processes=1, batch_size=1,
+                                   batch_latency=0.05, rate=None, burst=None, rate_unit="msgs", progress_interval=10,
+                                   trace_sample=0, metrics_port=None, metrics_file=None, metrics_interval=1.0,
+                                   high_water=None, low_water=None, depth_poll_interval=0.1, depth_monitor=None,
+                                   depth_monitor_interval=0.05):
+    """
+    simulate_message_quickly_jenkins 的 asyncio 引擎：concurrency 个发送协程共享一个 redis.asyncio 连接池，
+    替代「每个分片一个 OS 线程 + 共享同步客户端」的模型。参数含义与 simulate_message_quickly_jenkins 相同，
+    threads 对应 concurrency；pool_size 为连接池上限（默认等于 concurrency）。返回各队列的发送总数。
+    """
+    return asyncio.run(async_simulate_message(repeated, speed, redis_info, messages, concurrency,
+                                              group_message_intervals, total_group_message, orch_deploy,
+                                              pool_size=pool_size, encode_processes=encode_processes,
+                                              batch_size=batch_size, batch_latency=batch_latency, rate=rate,
+                                              burst=burst, rate_unit=rate_unit,
+                                              progress_interval=progress_interval, trace_sample=trace_sample,
+                                              metrics_port=metrics_port, metrics_file=metrics_file,
+                                              metrics_interval=metrics_interval, high_water=high_water,
+                                              low_water=low_water, depth_poll_interval=depth_poll_interval,
+                                              depth_monitor=depth_monitor,
+                                              depth_monitor_interval=depth_monitor_interval))
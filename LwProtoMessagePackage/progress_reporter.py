@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# coding=utf8
+import sys
+import threading
+import time
+
+
+class ProgressReporter(object):
+    """
+    发送进度汇总器，同一次运行的所有发送线程/协程共享一个实例。
+
+    每条消息只在内存里按线程、按队列累加计数（record），不再逐条 print；后台线程每 interval 秒输出一行吞吐汇总。
+    sample_every > 0 时每 sample_every 条抽样输出一次原来的逐条明细（trace），便于排查而不会刷爆 Jenkins 日志。
+    interval <= 0 时不启动后台线程，只在 close() 时输出一次汇总。name 用于区分多进程模式下各进程的输出。
+    """
+
+    def __init__(self, interval=10, sample_every=0, out=None, name=None):
+        self._name = f"[{name}]" if name else ""
+        self._interval = float(interval or 0)
+        self._sample_every = int(sample_every or 0)
+        self._out = out or sys.stdout
+        self._lock = threading.Lock()
+        self.total = 0
+        self.total_bytes = 0
+        self.by_thread = {}
+        self.by_queue = {}
+        self._start = self._last_time = time.monotonic()
+        self._last_total = self._last_bytes = 0
+        self._closed = threading.Event()
+        self._timer = None
+        if self._interval > 0:
+            self._timer = threading.Thread(target=self._report_timer, daemon=True)
+            self._timer.start()
+
+    def record(self, worker, queue_name, nbytes):
+        """
+        记一条已提交发送的消息，返回这条是否需要抽样输出明细。
+        """
+        with self._lock:
+            self.total += 1
+            self.total_bytes += nbytes
+            self.by_thread[worker] = self.by_thread.get(worker, 0) + 1
+            self.by_queue[queue_name] = self.by_queue.get(queue_name, 0) + 1
+            seq = self.total
+        return self._sample_every > 0 and seq % self._sample_every == 0
+
+    def trace(self, worker, num, template, current_timestamp):
+        lines = []
+        if template.timestamp is not None:
+            lines.append(f"原时间戳为：{template.timestamp}")
+            lines.append(f"当前时间戳为：{current_timestamp}")
+        lines.append(f"线程[{worker}]：第{num}行(原文件行数索引)的消息正在发送，请等待。。。。。。 "
+                     f"clientId={template.header['clientId']}")
+        self._out.write("\n".join(lines) + "\n")
+
+    def summary(self):
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._last_time
+            msgs, nbytes = self.total - self._last_total, self.total_bytes - self._last_bytes
+            self._last_time, self._last_total, self._last_bytes = now, self.total, self.total_bytes
+            by_queue = ", ".join(f"{name}={count}" for name, count in sorted(self.by_queue.items()))
+            by_thread = ", ".join(f"{name}={count}" for name, count in sorted(self.by_thread.items()))
+            total, total_elapsed = self.total, now - self._start
+        rate = msgs / elapsed if elapsed > 0 else 0.0
+        byte_rate = nbytes / elapsed if elapsed > 0 else 0.0
+        return (f"进度{self._name}：已发送{total}条（运行{total_elapsed:.1f}秒），最近{elapsed:.1f}秒 {rate:.1f}条/秒 "
+                f"{byte_rate:.1f}字节/秒；队列[{by_queue}]；线程[{by_thread}]")
+
+    def report(self):
+        self._out.write(f"info {self.summary()}\n")
+        self._out.flush()
+
+    def _report_timer(self):
+        while not self._closed.wait(self._interval):
+            self.report()
+
+    def close(self):
+        self._closed.set()
+        if self._timer is not None:
+            self._timer.join()
+        self.report()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# coding=utf8
+"""
+Micro-benchmarks for the simulator hot paths in proto_tools.
+
+Usage:
+  python3 proto_bench.py header <message_file> [rounds]
+  python3 proto_bench.py frame <message_file> [rounds]
+  python3 proto_bench.py encode <message_file> [processes]
+  python3 proto_bench.py fanout <message_file> [variants]
+  python3 proto_bench.py engine <message_file> <redis_info> [concurrency] [repeat]
+
+header: compares the single-pass handle_header tokenizer against the legacy
+        split-per-field implementation and checks that both produce identical
+        encoded frames for every line of <message_file>.
+frame:  compares message_encode/message_encode_batch against the legacy
+        per-call Struct + ctypes buffer framing.
+encode: compares single-process handle_headers against the process-pool
+        encoding stage (default: one process per CPU core).
+fanout: builds [variants] clientId variants of the first line with HeaderFanout
+        and compares it against create_simulate_messages + re-parsing per
+        variant (timed on a small sample and extrapolated). variants() still
+        copies the whole frame once per variant (batched sends keep every
+        frame until flush); variants_into() rewrites only the header ids in
+        one reused buffer, which is what single-LPUSH senders use.
+engine: sends <message_file> through the thread engine and the asyncio engine
+        and reports msgs/s and CPU time per message for each. It LPUSHes into
+        the real orch queue names, so point it at a throwaway local Redis.
+"""
+
+import contextlib
+import itertools
+import os
+import sys
+import tempfile
+import time
+from ctypes import create_string_buffer
+from struct import Struct
+
+from lwpack import LWPACK_SUFFIX, write_lwpack
+from proto_tools import HEADER_FIELDS, HeaderFanout, handle_header, handle_headers, message_encode, \
+    message_encode_batch, plainHeader, scan_header
+
+
+def legacy_scan_header(line):
+    # 旧实现：每个字段 split 一次整行，仅用于对比
+    version = line.split("version=")[1].split(" ")[0]
+    orchId = line.split("orchId=")[1].split(" ")[0]
+    customerId = line.split("customerId=")[1].split(" ")[0]
+    clientId = line.split("clientId=")[1].split(" ")[0]
+    mtype = line.split("type=")[1].split(" ")[0]
+    payload_text = line.split("payload=")[1]
+    tranId = line.split("tranId=")[1].split(" ")[0]
+    return version, orchId, customerId, clientId, tranId, mtype, payload_text
+
+
+def legacy_message_encode(plain_header_dict):
+    # 旧实现：每次构造带 payload 长度的 Struct，ctypes 缓冲区再拷贝成 bytes，仅用于对比
+    fmt = Struct(f'>HHIHHII{plain_header_dict["plen"]}s')
+    buffer = create_string_buffer(20 + plain_header_dict["plen"])
+    fmt.pack_into(buffer, 0, plain_header_dict["version"], plain_header_dict["orchId"],
+                  plain_header_dict["customerId"], plain_header_dict["clientId"], plain_header_dict["mtype"],
+                  plain_header_dict["plen"], plain_header_dict["tranId"], plain_header_dict["payload"])
+    return buffer.raw
+
+
+def _timeit(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds
+
+
+def bench_header(lines, rounds):
+    for line in lines:
+        offsets = scan_header(line)
+        values = tuple(line[slice(*offsets[field])] for field in HEADER_FIELDS)
+        if values != legacy_scan_header(line):
+            raise AssertionError(f"tokenizer mismatch: {line[:120]}")
+    frames = [message_encode(h) for h in handle_headers(lines)]
+    if frames != [message_encode(handle_header(line)) for line in lines]:
+        raise AssertionError("handle_headers output differs from handle_header")
+
+    legacy = _timeit(lambda: [legacy_scan_header(line) for line in lines], rounds)
+    single = _timeit(lambda: [scan_header(line) for line in lines], rounds)
+    full = _timeit(lambda: handle_headers(lines), max(1, rounds // 10))
+    print(f"lines={len(lines)} bytes={sum(len(line) for line in lines)} rounds={rounds}")
+    print(f"legacy split tokenizer : {legacy * 1000:.3f} ms/corpus")
+    print(f"single-pass tokenizer  : {single * 1000:.3f} ms/corpus ({legacy / single:.1f}x)")
+    print(f"handle_headers (+Parse): {full * 1000:.3f} ms/corpus")
+
+
+def bench_frame(lines, rounds):
+    headers = handle_headers(lines)
+    legacy_frames = [legacy_message_encode(h) for h in headers]
+    if legacy_frames != [message_encode(h) for h in headers] or \
+            legacy_frames != [bytes(frame) for frame in message_encode_batch(headers)]:
+        raise AssertionError("framing output differs from legacy message_encode")
+
+    legacy = _timeit(lambda: [legacy_message_encode(h) for h in headers], rounds)
+    single = _timeit(lambda: [message_encode(h) for h in headers], rounds)
+    batch = _timeit(lambda: message_encode_batch(headers), rounds)
+    print(f"frames={len(headers)} bytes={sum(len(frame) for frame in legacy_frames)} rounds={rounds}")
+    print(f"legacy Struct+ctypes : {legacy * 1000:.3f} ms/corpus")
+    print(f"message_encode       : {single * 1000:.3f} ms/corpus ({legacy / single:.1f}x)")
+    print(f"message_encode_batch : {batch * 1000:.3f} ms/corpus ({legacy / batch:.1f}x)")
+
+
+def bench_encode(lines, processes):
+    processes = processes if processes > 1 else os.cpu_count() or 1
+    start = time.perf_counter()
+    serial = handle_headers(lines)
+    serial_time = time.perf_counter() - start
+    start = time.perf_counter()
+    parallel = handle_headers(lines, processes=processes)
+    parallel_time = time.perf_counter() - start
+    if serial != parallel:
+        raise AssertionError("process-pool encoding output differs from handle_headers")
+    print(f"lines={len(lines)} bytes={sum(len(line) for line in lines)} processes={processes}")
+    print(f"handle_headers (1 process)  : {serial_time:.3f} s")
+    print(f"handle_headers ({processes} processes): {parallel_time:.3f} s ({serial_time / parallel_time:.1f}x)")
+
+
+def bench_fanout(lines, variants):
+    from message_common_simulate import create_simulate_messages
+
+    line = lines[0]
+    header = handle_header(line)
+    frame = message_encode(header)
+    sample = min(variants, 200)
+    start = time.perf_counter()
+    legacy = [message_encode(handle_header(create_simulate_messages(line, header["orchId"], header["customerId"],
+                                                                    client_id)))
+              for client_id in range(1, sample + 1)]
+    legacy_time = (time.perf_counter() - start) / sample * variants
+    start = time.perf_counter()
+    # clientId 只有 16 位，超过 50000 个变体时再组合多个 customerId
+    clients = min(variants, 50000)
+    fanout = HeaderFanout(customer_ids=range(header["customerId"], header["customerId"] + -(-variants // clients)),
+                          client_ids=range(1, clients + 1))
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for frame_bytes in fanout.variants(frame):
+        pass
+    frames_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for frame_bytes in fanout.variants_into(frame, bytearray()):
+        pass
+    in_place_time = time.perf_counter() - start
+    if [fanout.variant(frame, i) for i in range(sample)] != legacy:
+        raise AssertionError("HeaderFanout output differs from create_simulate_messages")
+    if [bytes(buffer) for buffer in itertools.islice(fanout.variants_into(frame, bytearray()), sample)] != legacy:
+        raise AssertionError("HeaderFanout.variants_into output differs from create_simulate_messages")
+    print(f"variants={len(fanout)} frame bytes={len(frame)} mtype={plainHeader.unpack_from(frame, 0)[4]}")
+    print(f"regex + re-parse (extrapolated): {legacy_time:.3f} s")
+    print(f"HeaderFanout id tables         : {build_time * 1000:.3f} ms")
+    print(f"HeaderFanout variants (copies {len(frame)} bytes per variant, "
+          f"{len(frame) * len(fanout) / 1e6:.1f} MB total): {frames_time * 1000:.3f} ms")
+    print(f"HeaderFanout variants_into (rewrites 8 header bytes in one buffer): {in_place_time * 1000:.3f} ms")
+
+
+def bench_engine(message_file, redis_info, concurrency=20, repeat=10):
+    from message_async_simulate import simulate_message_async_jenkins
+    from message_common_simulate import prepare_messages, simulate_message_quickly_jenkins
+
+    with open(message_file, "r", encoding="utf-8") as f:
+        _, queue_list, message_bytes_list = prepare_messages(f.read(), "allInOne")
+    # 预编译成 .lwpack，让两种引擎的计时只包含发送，不包含文本解析
+    fd, messages = tempfile.mkstemp(suffix=LWPACK_SUFFIX)
+    os.close(fd)
+    write_lwpack(messages, queue_list, message_bytes_list)
+    total = len(queue_list) * repeat
+    engines = [
+        ("threads", simulate_message_quickly_jenkins),
+        ("asyncio", simulate_message_async_jenkins),
+    ]
+    print(f"messages={total} concurrency={concurrency}")
+    for name, engine in engines:
+        wall, cpu = time.perf_counter(), time.process_time()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            engine(repeat, "0", redis_info, messages, concurrency, "0", 1, "allInOne")
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        print(f"{name:8}: {total / wall:10.1f} msgs/s  {cpu / total * 1e6:8.1f} us CPU/msg")
+    os.remove(messages)
+
+
+BENCHES = {
+    "header": bench_header,
+    "frame": bench_frame,
+    "encode": bench_encode,
+    "fanout": bench_fanout,
+}
+
+
+def _read_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line for line in f.read().split("\n") if line.strip()]
+
+
+def main() -> int:
+    if len(sys.argv) >= 4 and sys.argv[1] == "engine":
+        bench_engine(sys.argv[2], sys.argv[3], *(int(arg) for arg in sys.argv[4:6]))
+        return 0
+    if len(sys.argv) < 3 or sys.argv[1] not in BENCHES:
+        print(f"Usage: proto_bench.py {{{'|'.join(BENCHES)}}} <message_file> [rounds]\n"
+              f"       proto_bench.py engine <message_file> <redis_info> [concurrency] [repeat]", file=sys.stderr)
+        return 2
+    lines = _read_lines(sys.argv[2])
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else {"encode": 0, "fanout": 100000}.get(sys.argv[1], 200)
+    BENCHES[sys.argv[1]](lines, rounds)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# coding=utf8
+from struct import Struct
+from google.protobuf.descriptor import FieldDescriptor
+from LwProto import LightwanMsg_pb2
+
+# protobuf wire type
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LENGTH = 2
+WIRE_FIXED32 = 5
+
+_fixed_formats = {
+    FieldDescriptor.TYPE_FIXED32: Struct("<I"),
+    FieldDescriptor.TYPE_SFIXED32: Struct("<i"),
+    FieldDescriptor.TYPE_FLOAT: Struct("<f"),
+    FieldDescriptor.TYPE_FIXED64: Struct("<Q"),
+    FieldDescriptor.TYPE_SFIXED64: Struct("<q"),
+    FieldDescriptor.TYPE_DOUBLE: Struct("<d"),
+}
+
+
+def read_varint(buffer, pos):
+    result, shift = 0, 0
+    while True:
+        b = buffer[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def encode_varint(value):
+    if value < 0:
+        # int32/int64 负数按 64 位补码编码（固定 10 字节）
+        value += 1 << 64
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _encode_value(field, value):
+    if field.type in _fixed_formats:
+        return _fixed_formats[field.type].pack(value)
+    if field.type == FieldDescriptor.TYPE_SINT32:
+        return encode_varint((value << 1) ^ (value >> 31))
+    if field.type == FieldDescriptor.TYPE_SINT64:
+        return encode_varint((value << 1) ^ (value >> 63))
+    return encode_varint(int(value))
+
+
+class _Span(object):
+    # 被索引的一段字节：目标字段的值，或某个外层消息的长度前缀
+    __slots__ = ("start", "end", "parent", "length")
+
+    def __init__(self, start, end, parent, length=None):
+        self.start = start
+        self.end = end
+        self.parent = parent
+        self.length = length
+
+
+def _compile_paths(descriptor, field_paths):
+    # "msgBase.statsReportV2.timestamp" -> {4: (fd, {30: (fd, {2: (fd, path)})})}
+    tree = {}
+    for path in field_paths:
+        node, desc = tree, descriptor
+        names = path.split(".")
+        for depth, name in enumerate(names):
+            if desc is None or name not in desc.fields_by_name:
+                raise KeyError(f"unknown field path: {path}")
+            field = desc.fields_by_name[name]
+            leaf = depth == len(names) - 1
+            if leaf and field.type in (FieldDescriptor.TYPE_MESSAGE, FieldDescriptor.TYPE_GROUP,
+                                       FieldDescriptor.TYPE_STRING, FieldDescriptor.TYPE_BYTES):
+                raise ValueError(f"only scalar numeric fields can be patched: {path}")
+            entry = node.setdefault(field.number, (field, path if leaf else {}))
+            node, desc = entry[1], field.message_type
+    return tree
+
+
+class PayloadPatcher(object):
+    """
+    序列化后 PayloadType 字节的字段路径补丁引擎。
+
+    构造时按字段路径（如 "msgBase.statsReportV2.timestamp"、"transactionId"）一次性索引出目标值
+    及其所有外层消息长度前缀的字节偏移；set() 直接原地改写 varint/fixed 值，varint 宽度变化时
+    逐层修正外层长度前缀，无需文本 Parse 和 SerializeToString。repeated 消息中的同名路径全部改写。
+    """
+
+    def __init__(self, payload_bytes, field_paths, descriptor=LightwanMsg_pb2.PayloadType.DESCRIPTOR):
+        self.buffer = bytearray(payload_bytes)
+        self._spans = []
+        self._targets = {path: [] for path in field_paths}
+        self._fields = {}
+        self._index(0, len(self.buffer), _compile_paths(descriptor, field_paths), None)
+
+    def _index(self, pos, end, tree, parent):
+        buffer = self.buffer
+        while pos < end:
+            tag, pos = read_varint(buffer, pos)
+            number, wire_type = tag >> 3, tag & 7
+            entry = tree.get(number)
+            start = pos
+            if wire_type == WIRE_VARINT:
+                _, pos = read_varint(buffer, pos)
+            elif wire_type == WIRE_FIXED64:
+                pos += 8
+            elif wire_type == WIRE_FIXED32:
+                pos += 4
+            elif wire_type == WIRE_LENGTH:
+                length, pos = read_varint(buffer, pos)
+                if entry is not None and isinstance(entry[1], dict):
+                    span = _Span(start, pos, parent, length)
+                    self._spans.append(span)
+                    self._index(pos, pos + length, entry[1], span)
+                pos += length
+                continue
+            else:
+                raise ValueError(f"unsupported wire type {wire_type} at offset {start}")
+            if entry is not None and not isinstance(entry[1], dict):
+                span = _Span(start, pos, parent)
+                self._spans.append(span)
+                self._targets[entry[1]].append(span)
+                self._fields[entry[1]] = entry[0]
+
+    def count(self, path):
+        return len(self._targets[path])
+
+    def get(self, path):
+        values = []
+        for span in self._targets[path]:
+            field = self._fields[path]
+            if field.type in _fixed_formats:
+                values.append(_fixed_formats[field.type].unpack_from(self.buffer, span.start)[0])
+            else:
+                values.append(read_varint(self.buffer, span.start)[0])
+        return values
+
+    def set(self, path, value):
+        spans = self._targets[path]
+        if spans:
+            data = _encode_value(self._fields[path], value)
+            for span in spans:
+                self._replace(span, data)
+
+    def _replace(self, span, data):
+        # 改写 span 并逐层修正外层长度前缀；delta 累计本层内容变化加上各层前缀自身的宽度变化
+        delta = self._write(span, data)
+        parent = span.parent
+        while delta and parent is not None:
+            parent.length += delta
+            delta += self._write(parent, encode_varint(parent.length))
+            parent = parent.parent
+
+    def _write(self, span, data):
+        delta = len(data) - (span.end - span.start)
+        self.buffer[span.start:span.end] = data
+        if delta:
+            for other in self._spans:
+                if other.start > span.start:
+                    other.start += delta
+                    other.end += delta
+            span.end += delta
+        return delta
+
+    @property
+    def payload(self):
+        return bytes(self.buffer)
+
+
+def find_field_paths(payload_bytes, name, descriptor=LightwanMsg_pb2.PayloadType.DESCRIPTOR, cpp_types=None):
+    """
+    遍历序列化字节，返回其中实际出现的、字段名为 name 的标量字段路径（去重、按出现顺序）。
+    cpp_types 不为空时只返回 FieldDescriptor.cpp_type 在其中的字段，例如同名的 uint32 秒级字段与
+    uint64 微秒字段并存时，只取后者。
+    """
+    paths = []
+    _find_paths(payload_bytes, 0, len(payload_bytes), descriptor, "", name, paths, cpp_types)
+    return paths
+
+
+def _find_paths(buffer, pos, end, descriptor, prefix, name, paths, cpp_types=None):
+    while pos < end:
+        tag, pos = read_varint(buffer, pos)
+        number, wire_type = tag >> 3, tag & 7
+        field = descriptor.fields_by_number.get(number) if descriptor is not None else None
+        if wire_type == WIRE_VARINT:
+            _, pos = read_varint(buffer, pos)
+        elif wire_type == WIRE_FIXED64:
+            pos += 8
+        elif wire_type == WIRE_FIXED32:
+            pos += 4
+        elif wire_type == WIRE_LENGTH:
+            length, pos = read_varint(buffer, pos)
+            if field is not None and field.type == FieldDescriptor.TYPE_MESSAGE:
+                _find_paths(buffer, pos, pos + length, field.message_type, prefix + field.name + ".", name, paths,
+                            cpp_types)
+            pos += length
+            continue
+        else:
+            raise ValueError(f"unsupported wire type {wire_type}")
+        if field is not None and field.name == name and prefix + name not in paths and \
+                (cpp_types is None or field.cpp_type in cpp_types):
+            paths.append(prefix + name)
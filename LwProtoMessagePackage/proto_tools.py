@@ -1,32 +1,89 @@
 #!/usr/bin/env python
 # coding=utf8
 from LwProto import LightwanMsg_pb2
+from google.protobuf.descriptor import FieldDescriptor
 from google.protobuf.text_format import Parse
-from struct import *
-from ctypes import *
-import numpy as np
+from struct import Struct
+import re
+import sys
 import redis
 import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from proto_patch import PayloadPatcher, find_field_paths
+from redis_failover import DEFAULT_SENTINEL_PORT, SentinelRedis
+from redis_nodes import MultiNodeRedis
 
 configQueue = "ServerToOrchCfg"  # 配置类，代表rcs
 statsQueue = "ServerToOrchSta"  # 统计类，代表mars
 smStatsQueue = "ServerToOrchSta_SM"  # 代表商密统计类消息
 smConfigQueue = "ServerToOrchCfg_SM"  # 代表商密配置类消息
 replyQueue = "ServerToOrchReply"
+# orch 侧的全部事件队列（含商密队列）
+ORCH_QUEUES = (configQueue, statsQueue, replyQueue, smConfigQueue, smStatsQueue)
 # header总长度为20 bytes
 plainHeaderLen = 20
+plainHeader = Struct('>HHIHHII')
 # 签名sign的字节长度
 paraLen = 64
+# 发送时需要刷新为当前时间的 payload 字段名
+TIMESTAMP_FIELD = "timestamp"
+# 只刷新 64 位的微秒时间戳；CrashInfo/AcceServStatReport_C2O 的 timestamp 是 uint32 秒，写入微秒会被截断
+TIMESTAMP_CPP_TYPES = (FieldDescriptor.CPPTYPE_UINT64, FieldDescriptor.CPPTYPE_INT64)
+
+
+# 头部字段的单次扫描分词器：一次扫描定位 version/orchId/customerId/clientId/tranId/type/payload，
+# 只记录偏移量，避免对整行(20~40KB 的 payload 文本)反复 split 拷贝
+HEADER_FIELDS = ("version", "orchId", "customerId", "clientId", "tranId", "type", "payload")
+_header_token = re.compile("(" + "|".join(HEADER_FIELDS) + ")=")
+
+
+def scan_header(line):
+    """
+    单次扫描日志行，返回各头部字段值在 line 中的 (start, end) 偏移，不拷贝任何文本。
+
+    语义与逐个 line.split("xxx=")[1].split(" ")[0] 完全一致：取每个字段名第一次出现处，
+    值截止到下一个空格或同名字段的下一次出现；payload 与 line.split("payload=")[1] 一致，
+    取到行尾或 payload 文本里下一次出现的 "payload=" 为止。
+    """
+    offsets = {}
+    for match in _header_token.finditer(line):
+        field = match.group(1)
+        if field in offsets:
+            continue
+        offsets[field] = (match.end(), _field_end(line, field, match.end()))
+        if field == "payload":
+            break
+    if len(offsets) != len(HEADER_FIELDS):
+        # payload 之后才出现的字段（头部缺字段时），按原 split 语义在整行中补查
+        for field in HEADER_FIELDS:
+            if field in offsets:
+                continue
+            pos = line.find(field + "=")
+            if pos < 0:
+                raise IndexError(f"header field {field}= not found")
+            start = pos + len(field) + 1
+            offsets[field] = (start, _field_end(line, field, start))
+    return offsets
+
+
+def _field_end(line, field, start):
+    # split(field + "=") 的第 1 段截止到该字段名的下一次出现，头部字段再截止到第一个空格
+    end = line.find(field + "=", start)
+    if end < 0:
+        end = len(line)
+    if field != "payload":
+        space = line.find(" ", start, end)
+        if space >= 0:
+            end = space
+    return end
 
 
 def handle_header(line, msg_type="normal"):
-    version = line.split("version=")[1].split(" ")[0]
-    orchId = line.split("orchId=")[1].split(" ")[0]
-    customerId = line.split("customerId=")[1].split(" ")[0]
-    clientId = line.split("clientId=")[1].split(" ")[0]
-    mtype = line.split("type=")[1].split(" ")[0]
-    payload_text = line.split("payload=")[1]
-    tranId = line.split("tranId=")[1].split(" ")[0]
+    offsets = scan_header(line)
+    version, orchId, customerId, clientId, tranId, mtype = (
+        line[slice(*offsets[field])] for field in HEADER_FIELDS[:-1])
+    payload_text = line[slice(*offsets["payload"])]
     # 将一个文本payload解析成protobuf格式的payload
     payload_proto = Parse(payload_text, LightwanMsg_pb2.PayloadType())
     # 将protobuf对象序列化成字节数组
@@ -50,26 +107,277 @@ def handle_header(line, msg_type="normal"):
     return header_dict
 
 
+def handle_headers(lines, msg_type="normal", processes=1):
+    """
+    批量版 handle_header：对整批日志行逐行单次扫描并解析，返回 header 字典列表（顺序与输入一致）。
+
+    :param processes: 大于 1 时把文本 Parse/序列化分块交给进程池并行处理（Parse 是纯 CPU 且持有 GIL，
+                      多线程无法加速），结果按原顺序返回。
+    """
+    processes = int(processes or 1)
+    if processes <= 1 or len(lines) < 2:
+        return [handle_header(line, msg_type) for line in lines]
+    chunk_size = max(1, len(lines) // (processes * 4))
+    chunks = [(lines[i:i + chunk_size], msg_type) for i in range(0, len(lines), chunk_size)]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return [head_dict for chunk in pool.map(_handle_headers_chunk, chunks) for head_dict in chunk]
+
+
+def _handle_headers_chunk(args):
+    # 进程池 worker：必须是模块级函数，Windows 下 spawn 方式才能 pickle
+    lines, msg_type = args
+    return [handle_header(line, msg_type) for line in lines]
+
+
 def message_encode(plain_header_dict):
-    # H代表unsigned short ==>2 bytes  I代表unsigned int ==>4 bytes  s代表string ==> 1 byte   >代表大端
-    fmt = Struct(f'>HHIHHII{plain_header_dict["plen"]}s')
-    buffer = create_string_buffer(plainHeaderLen + plain_header_dict["plen"])
-    Struct.pack_into(fmt, buffer, 0, plain_header_dict["version"], plain_header_dict["orchId"],
-                     plain_header_dict["customerId"], plain_header_dict["clientId"], plain_header_dict["mtype"],
-                     plain_header_dict["plen"], plain_header_dict["tranId"], plain_header_dict["payload"])
-    # 以下两行等于buffer.raw
-    data = np.frombuffer(buffer, dtype=np.uint8)
-    data = bytes(data)
-    return data
+    # H代表unsigned short ==>2 bytes  I代表unsigned int ==>4 bytes  >代表大端
+    header = plainHeader.pack(plain_header_dict["version"], plain_header_dict["orchId"],
+                              plain_header_dict["customerId"], plain_header_dict["clientId"],
+                              plain_header_dict["mtype"], plain_header_dict["plen"], plain_header_dict["tranId"])
+    payload = plain_header_dict["payload"]
+    pad = plain_header_dict["plen"] - len(payload)
+    if pad > 0:
+        # sm 消息的 plen 包含签名长度，签名部分补零（与原 '{plen}s' 打包行为一致）
+        return b"".join((header, payload, bytes(pad)))
+    return header + payload if pad == 0 else header + payload[:plain_header_dict["plen"]]
+
+
+def message_encode_batch(plain_header_dicts):
+    """
+    批量封帧：一次性预分配一个 bytearray，把 N 帧依次写入，返回指向各帧的 memoryview 切片（零拷贝）。
+
+    注意返回的切片共享同一块缓冲区，调用方不要修改它们。
+    """
+    total = sum(plainHeaderLen + h["plen"] for h in plain_header_dicts)
+    buffer = bytearray(total)
+    view = memoryview(buffer)
+    frames = []
+    offset = 0
+    for h in plain_header_dicts:
+        plainHeader.pack_into(buffer, offset, h["version"], h["orchId"], h["customerId"], h["clientId"],
+                              h["mtype"], h["plen"], h["tranId"])
+        payload = h["payload"][:h["plen"]]
+        start = offset + plainHeaderLen
+        buffer[start:start + len(payload)] = payload
+        end = start + h["plen"]
+        frames.append(view[offset:end])
+        offset = end
+    return frames
+
+
+class MessageTemplate(object):
+    """
+    解析一次的消息模板：保存 header 字典及编码好的整帧字节。
+
+    stamp() 通过 PayloadPatcher 直接在序列化字节上改写所有 64 位的 timestamp 字段（与日志文本里是否带
+    "timestamp:" 无关，uint32 秒级的 timestamp 保持原值），只有时间戳真正变化时才重新打包整帧，否则直接复用上一次的帧。
+    """
+
+    def __init__(self, line, msg_type="normal", header=None):
+        header = handle_header(line, msg_type) if header is None else dict(header)
+        self._init(header, message_encode(header))
+
+    def _init(self, header, frame):
+        self.header = header
+        self.frame = frame
+        self.timestamp = None
+        self._patcher = None
+        self._timestamp_paths = None
+        self._stamped = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, frame):
+        """
+        由已封好的帧（如 .lwpack 中的 memoryview）构造模板，不需要原始日志文本。
+        """
+        template = cls.__new__(cls)
+        version, orchId, customerId, clientId, mtype, plen, tranId = plainHeader.unpack_from(frame, 0)
+        header = {
+            "version": version,
+            "orchId": orchId,
+            "customerId": customerId,
+            "clientId": clientId,
+            "mtype": mtype,
+            "plen": plen,
+            "tranId": tranId,
+            "payload": frame[plainHeaderLen:plainHeaderLen + plen]
+        }
+        template._init(header, frame)
+        return template
+
+    def _index_timestamps(self):
+        # 首次 stamp 时才遍历一次字节建立索引
+        self._timestamp_paths = find_field_paths(self.header["payload"], TIMESTAMP_FIELD,
+                                                 cpp_types=TIMESTAMP_CPP_TYPES)
+        if self._timestamp_paths:
+            self._patcher = PayloadPatcher(self.header["payload"], self._timestamp_paths)
+            self.timestamp = self._patcher.get(self._timestamp_paths[0])[0]
+
+    def stamp(self, timestamp):
+        with self._lock:
+            if self._timestamp_paths is None:
+                self._index_timestamps()
+            if self._patcher is None or timestamp == self._stamped:
+                return self.frame
+            for path in self._timestamp_paths:
+                self._patcher.set(path, timestamp)
+            payload_bytes = self._patcher.payload
+            self.header["plen"] += len(payload_bytes) - len(self.header["payload"])
+            self.header["payload"] = payload_bytes
+            self.frame = message_encode(self.header)
+            self._stamped = timestamp
+            return self.frame
+
+
+_template_cache = {}
+_template_lock = threading.Lock()
+
+
+def get_message_template(line, msg_type="normal", header=None):
+    """
+    按日志行内容缓存 MessageTemplate，同一行在所有重复/分组/线程间只 Parse 一次。
+
+    :param header: 已由 handle_header/handle_headers 解析好的 header 字典，传入时不再重复解析。
+    """
+    key = (msg_type, line)
+    template = _template_cache.get(key)
+    if template is None:
+        with _template_lock:
+            template = _template_cache.get(key)
+            if template is None:
+                template = _template_cache[key] = MessageTemplate(line, msg_type, header)
+    return template
+
+
+def parse_id_range(text):
+    """
+    解析命令行的 id 范围："1-100000"、"5" 或 "1,3,5-9"，返回 range 或 list。
+    """
+    parts = []
+    for part in str(text).split(","):
+        start, _, end = part.strip().partition("-")
+        if int(end or start) < int(start):
+            raise ValueError(f"empty id range: {part.strip()}")
+        parts.append(range(int(start), int(end or start) + 1))
+    return parts[0] if len(parts) == 1 else [value for part in parts for value in part]
+
+
+def _typecode(width):
+    # array 的 I/L 在不同平台上宽度不同（LP64 上 L 是 8 字节），按 itemsize 选出恰好 width 字节的类型
+    return next(code for code in "BHILQ" if array(code).itemsize == width)
+
+
+def _id_column(typecode, values, inner, outer):
+    # 每个值连续重复 inner 次，整列再重复 outer 次，转成大端字节；循环次数只与 len(values) 有关
+    if inner == 1:
+        column = array(typecode, values)
+    else:
+        column = array(typecode)
+        for value in values:
+            column.extend(array(typecode, [value]) * inner)
+    column *= outer
+    if sys.byteorder == "little":
+        column.byteswap()
+    return memoryview(column.tobytes())
+
+
+class HeaderFanout(object):
+    """
+    头部级多 CPE 扇出：orchId/customerId/clientId 只存在于 20 字节明文头的第 2~10 字节，
+    扇出时不重新解析文本、不重新序列化 protobuf，只替换这几个字节。
+
+    orchId/clientId 为 16 位、customerId 为 32 位（超过 65535 个 CPE 时组合多个 customerId）。
+    构造时按 orch_ids x customer_ids x client_ids（clientId 变化最快）一次性生成各列的大端字节表，
+    10 万个变体只需几毫秒、几百 KB；某一列传 None 表示保留原帧里的值，传空范围抛 ValueError。
+    variant(frame, i) 返回第 i 个变体的完整帧（新的 bytes，每个变体拷贝一次整帧）。
+    variants_into(frame, buffer) 只把整帧拷进 buffer 一次，之后每个变体只原地改写头部的 8 个字节，
+    返回的始终是同一个 buffer：调用方必须在取下一个变体前用完它（逐条 LPUSH 发出），
+    批量发送等会保留引用的场合要用 variants()/variant()。
+    """
+
+    def __init__(self, orch_ids=None, customer_ids=None, client_ids=None):
+        columns = [list(ids) if ids is not None and not isinstance(ids, range) else ids
+                   for ids in (orch_ids, customer_ids, client_ids)]
+        sizes = [len(ids) if ids is not None else 1 for ids in columns]
+        self._count = sizes[0] * sizes[1] * sizes[2]
+        self._columns = []
+        for name, width, ids, inner, outer in zip(("orchId", "customerId", "clientId"), (2, 4, 2), columns,
+                                                  (sizes[1] * sizes[2], sizes[2], 1),
+                                                  (1, sizes[0], sizes[0] * sizes[1])):
+            if ids is None:
+                self._columns.append(None)
+                continue
+            if not len(ids):
+                raise ValueError(f"empty {name} range for header fan-out")
+            if not all(0 <= value < 1 << (8 * width) for value in (min(ids), max(ids))):
+                raise ValueError(f"header ids must fit in {8 * width} bits: {min(ids)}..{max(ids)}")
+            self._columns.append((_id_column(_typecode(width), ids, inner, outer), width))
+
+    def __len__(self):
+        return self._count
+
+    def variant(self, frame, index):
+        frame = memoryview(frame)
+        parts = [frame[:2]]
+        offset = 2
+        for column in self._columns:
+            if column is None:
+                width = 4 if offset == 4 else 2
+                parts.append(frame[offset:offset + width])
+            else:
+                table, width = column
+                parts.append(table[index * width:(index + 1) * width])
+            offset += width
+        parts.append(frame[offset:])
+        return b"".join(parts)
+
+    def variants(self, frame):
+        for index in range(self._count):
+            yield self.variant(frame, index)
+
+    def write_variant(self, buffer, index):
+        offset = 2
+        for column in self._columns:
+            if column is None:
+                offset += 4 if offset == 4 else 2
+                continue
+            table, width = column
+            buffer[offset:offset + width] = table[index * width:(index + 1) * width]
+            offset += width
+        return buffer
+
+    def variants_into(self, frame, buffer):
+        buffer[:] = frame
+        for index in range(self._count):
+            yield self.write_variant(buffer, index)
 
 
 def redis_connect(redis_ssh):
+    """
+    redis_ssh 中带 master_name（可选 sentinel_port，默认 26399；或 sentinels="host:port,host:port"）时
+    经 Sentinel 连接当前主节点，并在主从切换时自动重新解析、重试（见 redis_failover.SentinelRedis）；
+    带 nodes 或 cluster 时把每个队列路由到所属节点，每个节点独立连接池（见 redis_nodes.MultiNodeRedis）。
+    """
+    if redis_ssh.get("nodes") or redis_ssh.get("cluster"):
+        return MultiNodeRedis(redis_ssh, ORCH_QUEUES)
+    if redis_ssh.get("master_name"):
+        return SentinelRedis(redis_ssh, redis_ssh["master_name"],
+                             int(redis_ssh.get("sentinel_port", DEFAULT_SENTINEL_PORT)))
     redis_pool = redis.ConnectionPool(host=redis_ssh["ip"], port=redis_ssh["port"], password=redis_ssh["password"],
                                       db=redis_ssh["db"])
     redis_conn = redis.StrictRedis(connection_pool=redis_pool)
     return redis_conn
 
 
+def report_connection(redis_conn):
+    """
+    Sentinel/多节点客户端在运行结束时输出重连或各节点吞吐统计，普通单节点客户端不输出。
+    """
+    if isinstance(redis_conn, (SentinelRedis, MultiNodeRedis)):
+        redis_conn.report()
+
+
 def str_replace(message, old, diff):
     result = int(message.split(old)[1].split(" ")[0])
     result = result + diff
@@ -94,11 +402,11 @@ def my_thread_multi_argvs(target, argv_list):
     [thread.join() for thread in threads]
 
 
-def get_master_address(redis_info, master_name):
+def get_master_address(redis_info, master_name, sentinel_port=DEFAULT_SENTINEL_PORT):
     """
-    获取指定主节点的地址信息。
+    获取指定主节点的地址信息（只解析一次；长时间运行需要跟随主从切换时用 redis_connect + master_name）。
     """
-    sentinel_hosts = [(redis_info['ip'], 26399)]
+    sentinel_hosts = [(redis_info['ip'], int(sentinel_port))]
     # 创建 Redis Sentinel 实例
     sentinel = redis.sentinel.Sentinel(sentinel_hosts)
     print(sentinel)
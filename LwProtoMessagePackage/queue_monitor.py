@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# coding=utf8
+import threading
+import time
+import redis
+from proto_tools import ORCH_QUEUES
+
+
+class QueueDepthMonitor(object):
+    """
+    orch 队列深度记录器与消费速率估算器，与发送线程同时运行。
+
+    后台线程每 interval 秒用一个非事务 pipeline 对全部 orch 队列（含 _SM 队列）执行 LLEN，
+    连同本次运行已写入各队列的条数（enqueued() 返回 {队列名: 条数}，应是 LPUSH 成功后的计数，
+    如 SimulateMetrics.sent_counts）追加一行到 CSV 时间序列。
+    每 window 秒按「消费条数 = 写入增量 - 深度增量」估算各队列的消费速率；连续 onset_windows 个窗口
+    深度上涨且写入速率高于消费速率时，记为积压开始，并记录当时的写入/消费速率。
+    """
+
+    def __init__(self, redis_cli, enqueued=None, output=None, interval=0.05, window=1.0, onset_windows=3,
+                 queue_names=ORCH_QUEUES):
+        self._redis = redis_cli
+        self._enqueued = enqueued or dict
+        self._queue_names = list(queue_names)
+        self._interval = float(interval)
+        self._window = float(window)
+        self._onset_windows = int(onset_windows)
+        self._file = open(output, "w") if output else None
+        if self._file is not None:
+            self._file.write(",".join(["elapsed_ms"] + [f"{name}_depth" for name in self._queue_names] +
+                                      [f"{name}_enqueued" for name in self._queue_names]) + "\n")
+        self._start = time.monotonic()
+        self.samples = 0
+        self._first = self._checkpoint = self._last = self._sample()
+        self.peak_drain_rate = {name: 0.0 for name in self._queue_names}
+        self._growing = {name: [] for name in self._queue_names}
+        self.onset = {}
+        self._closed = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_timer, daemon=True)
+        self._sampler.start()
+
+    def _sample(self):
+        pipe = self._redis.pipeline(transaction=False)
+        for name in self._queue_names:
+            pipe.llen(name)
+        depths = pipe.execute()
+        now = time.monotonic()
+        enqueued = self._enqueued()
+        sample = (now, dict(zip(self._queue_names, depths)),
+                  {name: enqueued.get(name, 0) for name in self._queue_names})
+        if self._file is not None:
+            self._file.write(",".join([str(int((now - self._start) * 1000))] + [str(d) for d in depths] +
+                                      [str(sample[2][name]) for name in self._queue_names]) + "\n")
+        self.samples += 1
+        return sample
+
+    def _sample_timer(self):
+        while not self._closed.wait(self._interval):
+            try:
+                self._last = self._sample()
+            except redis.RedisError as e:
+                print(f"Error sampling queue depth: {e}")
+                continue
+            if self._last[0] - self._checkpoint[0] >= self._window:
+                self._close_window(self._checkpoint, self._last)
+                self._checkpoint = self._last
+
+    def _close_window(self, begin, end):
+        elapsed = end[0] - begin[0]
+        for name in self._queue_names:
+            depth_delta = end[1][name] - begin[1][name]
+            enqueue_rate = (end[2][name] - begin[2][name]) / elapsed
+            drain_rate = enqueue_rate - depth_delta / elapsed
+            self.peak_drain_rate[name] = max(self.peak_drain_rate[name], drain_rate)
+            if name in self.onset:
+                continue
+            growing = self._growing[name]
+            if depth_delta > 0 and enqueue_rate > drain_rate:
+                growing.append((begin[0] - self._start, begin[1][name], enqueue_rate, drain_rate))
+                if len(growing) >= self._onset_windows:
+                    self.onset[name] = growing[0]
+                    print("info", f"队列监控：{name}从第{growing[0][0]:.1f}秒开始积压，深度{growing[0][1]}，"
+                                  f"写入{growing[0][2]:.1f}条/秒，消费{growing[0][3]:.1f}条/秒")
+            else:
+                growing.clear()
+
+    def drain_rates(self):
+        """
+        返回从开始到最近一次采样各队列的平均消费速率（条/秒）。
+        """
+        first, last = self._first, self._last
+        elapsed = last[0] - first[0]
+        if elapsed <= 0:
+            return {name: 0.0 for name in self._queue_names}
+        return {name: ((last[2][name] - first[2][name]) - (last[1][name] - first[1][name])) / elapsed
+                for name in self._queue_names}
+
+    def close(self):
+        self._closed.set()
+        self._sampler.join()
+        self._last = self._sample()
+        if self._file is not None:
+            self._file.close()
+
+    def report(self):
+        drain_rates = self.drain_rates()
+        for name in self._queue_names:
+            first, last = self._first, self._last
+            enqueued = last[2][name] - first[2][name]
+            if not enqueued and not first[1][name] and not last[1][name]:
+                continue
+            onset = self.onset.get(name)
+            print("info", f"队列监控：{name}本次写入{enqueued}条，深度{first[1][name]}->{last[1][name]}，"
+                          f"平均消费{drain_rates[name]:.1f}条/秒，窗口峰值消费{self.peak_drain_rate[name]:.1f}条/秒，"
+                          + (f"第{onset[0]:.1f}秒开始积压" if onset else "未出现持续积压"))
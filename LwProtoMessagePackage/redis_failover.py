@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# coding=utf8
+import threading
+import time
+from redis.exceptions import ConnectionError, ReadOnlyError, TimeoutError
+from redis.sentinel import Sentinel
+
+DEFAULT_SENTINEL_PORT = 26399
+# 主从切换期间可能出现的错误：旧主节点断开/超时、降级为从节点后写入报 READONLY、Sentinel 尚未选出新主节点
+FAILOVER_ERRORS = (ConnectionError, TimeoutError, ReadOnlyError)
+
+
+class SentinelRedis(object):
+    """
+    经 Sentinel 访问主节点的 Redis 客户端，对发送端表现得和 redis.StrictRedis 一样（lpush/llen/pipeline...）。
+
+    所有线程共享 Sentinel.master_for 返回的客户端及其连接池，当前主节点地址缓存在 master 中。
+    命令或 pipeline 遇到连接错误/READONLY 时：断开池中旧连接，向 Sentinel 重新查询主节点，
+    按退避间隔重试同一个命令（pipeline 按原命令重新构建后整批重试，极端情况下可能重复写入一批），
+    直到成功或超过 failover_timeout 秒。reconnects/reconnect_seconds/failovers 记录重连次数、耗时和主节点切换次数。
+    """
+
+    def __init__(self, redis_info, master_name="mymaster", sentinel_port=DEFAULT_SENTINEL_PORT, failover_timeout=60,
+                 retry_delay=0.2):
+        sentinels = redis_info.get("sentinels") or f"{redis_info['ip']}:{sentinel_port}"
+        self._sentinel = Sentinel([(host, int(port)) for host, port in
+                                   (address.split(":") for address in sentinels.split(","))],
+                                  socket_timeout=float(redis_info.get("socket_timeout", 5)))
+        self.master_name = master_name
+        self.redis = self._sentinel.master_for(master_name, password=redis_info.get("password"),
+                                               db=int(redis_info.get("db", 0)),
+                                               socket_timeout=float(redis_info.get("socket_timeout", 5)))
+        self._failover_timeout = float(failover_timeout)
+        self._retry_delay = float(retry_delay)
+        self._lock = threading.Lock()
+        self.master = self._sentinel.discover_master(master_name)
+        self.reconnects = 0
+        self.reconnect_seconds = 0.0
+        self.failovers = 0
+
+    def call(self, func):
+        """
+        执行 func()，遇到主从切换相关错误时重新解析主节点并重试。
+        """
+        try:
+            return func()
+        except FAILOVER_ERRORS as e:
+            error = e
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            if time.monotonic() - start > self._failover_timeout:
+                raise error
+            print(f"Error talking to redis master {self.master}: {error}, retrying ({attempt})")
+            time.sleep(min(self._retry_delay * attempt, 2.0))
+            try:
+                self._resolve()
+                result = func()
+            except FAILOVER_ERRORS as e:
+                error = e
+                continue
+            with self._lock:
+                self.reconnects += 1
+                self.reconnect_seconds += time.monotonic() - start
+            return result
+
+    def _resolve(self):
+        master = self._sentinel.discover_master(self.master_name)
+        with self._lock:
+            if master != self.master:
+                print("info", f"Sentinel：主节点由{self.master[0]}:{self.master[1]}切换到{master[0]}:{master[1]}")
+                self.master = master
+                self.failovers += 1
+                # 丢弃指向旧主节点的连接，连接池之后会按新主节点重新建连
+                self.redis.connection_pool.disconnect()
+
+    def pipeline(self, transaction=True):
+        return _FailoverPipeline(self, transaction)
+
+    def __getattr__(self, name):
+        method = getattr(self.redis, name)
+        if not callable(method):
+            return method
+
+        def call(*args, **kwargs):
+            return self.call(lambda: method(*args, **kwargs))
+        return call
+
+    def report(self):
+        print("info", f"Sentinel：当前主节点{self.master[0]}:{self.master[1]}，主节点切换{self.failovers}次，"
+                      f"重连重试{self.reconnects}次，累计耗时{self.reconnect_seconds:.2f}秒")
+
+
+class _FailoverPipeline(object):
+    """
+    记录 pipeline 命令，execute 时在真正的 pipeline 上重放；失败重试时整批重新构建。
+    """
+
+    def __init__(self, client, transaction):
+        self._client = client
+        self._transaction = transaction
+        self._commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return command
+
+    def __len__(self):
+        return len(self._commands)
+
+    def execute(self, raise_on_error=True):
+        def run():
+            pipe = self._client.redis.pipeline(transaction=self._transaction)
+            for name, args, kwargs in self._commands:
+                getattr(pipe, name)(*args, **kwargs)
+            return pipe.execute(raise_on_error=raise_on_error)
+        try:
+            return self._client.call(run)
+        finally:
+            self._commands = []
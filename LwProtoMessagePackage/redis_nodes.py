@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# coding=utf8
+import threading
+import time
+import redis
+from redis.crc import REDIS_CLUSTER_HASH_SLOTS, key_slot
+
+
+def _parse_address(address):
+    host, port = address.strip().rsplit(":", 1)
+    return host, int(port)
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class MultiNodeRedis(object):
+    """
+    多个 Redis 节点的客户端：每个队列（key）固定路由到它的所属节点，对发送端表现得和 redis.StrictRedis 一样
+    （lpush/llen/pipeline...）。每个节点有独立的连接池，pipeline 按节点拆成多个 pipeline 分别执行，结果按原顺序返回。
+
+    redis_info 的写法：
+    - "nodes": "host:port,host:port"：多个独立节点。queue_names 中的队列按顺序轮流分给各节点（第 i 个队列写第 i % 节点数 个节点）；
+      队列只有几个，按 slot 平均切分会让 ServerToOrchCfg(slot 15032) 和 ServerToOrchSta(slot 15372) 落在同一节点。
+      其他 key 按 Redis Cluster 的 key slot（CRC16 % 16384）把 slot 平均分给各节点；
+    - "cluster": 任意真值：从 ip:port 执行 CLUSTER SLOTS 取得 slot 分布，直接写各 slot 的主节点（运行中不跟随 slot 迁移）；
+    - "queue_nodes": {"ServerToOrchSta": "host:port"}：可选，把指定队列钉到指定节点，优先于 slot 路由。
+    启动时输出 queue_names 中每个队列所在的节点。stats 记录每个节点写入的条数、字节数、命令数和命令耗时，report() 输出各节点吞吐。
+    """
+
+    def __init__(self, redis_info, queue_names=()):
+        self._password = redis_info.get("password")
+        self._db = int(redis_info.get("db", 0))
+        if redis_info.get("cluster"):
+            self._slots = self._cluster_slots(redis_info["ip"], int(redis_info["port"]))
+            nodes = sorted({node for _, _, node in self._slots})
+            self._assigned = {}
+        else:
+            nodes = [_parse_address(address) for address in redis_info["nodes"].split(",")]
+            per_node = REDIS_CLUSTER_HASH_SLOTS // len(nodes)
+            self._slots = [(i * per_node, (i + 1) * per_node - 1 if i < len(nodes) - 1 else REDIS_CLUSTER_HASH_SLOTS - 1,
+                            node) for i, node in enumerate(nodes)]
+            self._assigned = {name: nodes[i % len(nodes)] for i, name in enumerate(queue_names)}
+        self._pinned = {queue: _parse_address(address)
+                        for queue, address in (redis_info.get("queue_nodes") or {}).items()}
+        nodes = sorted(set(nodes) | set(self._pinned.values()))
+        self.clients = {node: redis.StrictRedis(connection_pool=redis.ConnectionPool(
+            host=node[0], port=node[1], password=self._password, db=self._db)) for node in nodes}
+        self._routes = {}
+        self._lock = threading.Lock()
+        self.stats = {node: {"messages": 0, "bytes": 0, "commands": 0, "seconds": 0.0, "first": None, "last": None}
+                      for node in nodes}
+        if queue_names:
+            routes = [(name, self.node_for(name)) for name in queue_names]
+            print("info", "队列路由：" + "，".join(f"{name}->{host}:{port}" for name, (host, port) in routes))
+
+    def _cluster_slots(self, host, port):
+        slots = []
+        reply = redis.StrictRedis(host=host, port=port, password=self._password).execute_command("CLUSTER", "SLOTS")
+        if isinstance(reply, dict):
+            # 旧版 redis-py 会把 CLUSTER SLOTS 解析成 {(start, end): {"primary": (host, port), ...}}
+            for (start, end), owner in reply.items():
+                primary = owner.get("primary") or owner.get("master")
+                slots.append((int(start), int(end), (_decode(primary[0]), int(primary[1]))))
+        else:
+            for start, end, primary, *_ in reply:
+                slots.append((int(start), int(end), (_decode(primary[0]), int(primary[1]))))
+        return slots
+
+    def node_for(self, key):
+        node = self._routes.get(key)
+        if node is None:
+            name = _decode(key)
+            node = self._pinned.get(name) or self._assigned.get(name)
+            if node is None:
+                slot = key_slot(name.encode())
+                node = next(owner for start, end, owner in self._slots if start <= slot <= end)
+            self._routes[key] = node
+        return node
+
+    def _record(self, node, messages, nbytes, commands, started):
+        now = time.monotonic()
+        with self._lock:
+            stats = self.stats[node]
+            stats["messages"] += messages
+            stats["bytes"] += nbytes
+            stats["commands"] += commands
+            stats["seconds"] += now - started
+            stats["first"] = stats["first"] or started
+            stats["last"] = now
+
+    def lpush(self, key, *values):
+        node = self.node_for(key)
+        started = time.monotonic()
+        result = self.clients[node].lpush(key, *values)
+        self._record(node, len(values), sum(len(value) for value in values), 1, started)
+        return result
+
+    def llen(self, key):
+        return self.clients[self.node_for(key)].llen(key)
+
+    def pipeline(self, transaction=False):
+        return _MultiNodePipeline(self)
+
+    def report(self):
+        for node, stats in sorted(self.stats.items()):
+            span = (stats["last"] - stats["first"]) if stats["first"] else 0.0
+            latency = stats["seconds"] / stats["commands"] * 1e3 if stats["commands"] else 0.0
+            print("info", f"节点[{node[0]}:{node[1]}]：写入{stats['messages']}条，{stats['bytes']}字节，"
+                          f"命令{stats['commands']}次，平均耗时{latency:.2f}毫秒，"
+                          f"吞吐{stats['messages'] / span if span > 0 else 0:.1f}条/秒")
+
+
+class _MultiNodePipeline(object):
+    """
+    按节点拆分的非事务 pipeline：命令按所属节点分组，每个节点一次往返，返回值按命令原顺序排列。
+    raise_on_error=False 时与 redis-py 一致，失败命令的位置返回异常对象；某个节点整体连接失败时，
+    该节点的全部命令都返回这个异常，其他节点照常执行。
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def lpush(self, key, *values):
+        self._commands.append(("lpush", key, values))
+        return self
+
+    def llen(self, key):
+        self._commands.append(("llen", key, ()))
+        return self
+
+    def __len__(self):
+        return len(self._commands)
+
+    def execute(self, raise_on_error=True):
+        by_node = {}
+        for index, command in enumerate(self._commands):
+            by_node.setdefault(self._client.node_for(command[1]), []).append((index, command))
+        results = [None] * len(self._commands)
+        try:
+            for node, commands in by_node.items():
+                pipe = self._client.clients[node].pipeline(transaction=False)
+                for _, (name, key, args) in commands:
+                    getattr(pipe, name)(key, *args)
+                started = time.monotonic()
+                try:
+                    replies = pipe.execute(raise_on_error=raise_on_error)
+                except redis.RedisError as e:
+                    if raise_on_error:
+                        raise
+                    replies = [e] * len(commands)
+                for (index, _), result in zip(commands, replies):
+                    results[index] = result
+                pushed = [args for (_, (name, _, args)), result in zip(commands, replies)
+                          if name == "lpush" and not isinstance(result, Exception)]
+                self._client._record(node, sum(len(args) for args in pushed),
+                                     sum(len(value) for args in pushed for value in args), 1, started)
+        finally:
+            self._commands = []
+        return results
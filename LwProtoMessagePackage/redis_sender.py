@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# coding=utf8
+import threading
+import time
+import redis
+
+
+class BatchedSender(object):
+    """
+    按队列聚合帧后批量 LPUSH 的发送器（每个发送线程一个）。
+
+    攒够 batch_size 条，或最早一条待发帧等待超过 max_latency 秒（后台定时器检查）时，
+    把每个队列的帧合并成一条多值 LPUSH，并通过一个非事务 pipeline 一次往返发出。
+    多值 LPUSH 按参数顺序依次压入，队列内顺序与逐条 LPUSH 一致。
+    counts 只在 pipeline 执行成功后累加，保证各队列计数准确。batch_size <= 1 时退化为逐条 LPUSH。
+    metrics 为 simulate_metrics.SimulateMetrics 时，记录每次 LPUSH/pipeline 的往返延迟和成功写入的条数、字节数。
+
+    一批帧在执行 pipeline 前就移出缓冲：执行失败时这批帧计入 dropped 并抛出异常，不会被之后的 flush/close 重发。
+    后台定时器 flush 失败时异常保存下来，由发送线程下一次 send/flush 抛出。
+    """
+
+    def __init__(self, redis_cli, batch_size=1, max_latency=0.05, metrics=None):
+        self._redis = redis_cli
+        self._metrics = metrics
+        self._batch_size = int(batch_size)
+        self._max_latency = float(max_latency)
+        self._pending = {}
+        self._pending_count = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self.counts = {}
+        self.dropped = {}
+        self._error = None
+        self._timer = None
+        if self._batch_size > 1 and self._max_latency > 0:
+            self._timer = threading.Thread(target=self._flush_timer, daemon=True)
+            self._timer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 已有异常在传播时不再 flush，避免 flush 的异常掩盖原来的异常
+        self.close(flush=exc_type is None)
+        return False
+
+    @property
+    def retains_frames(self):
+        # 批量模式下帧留在缓冲里直到 flush；逐条 LPUSH 时 send 返回后就不再引用 frame
+        return self._batch_size > 1
+
+    def send(self, queue_name, frame):
+        self._raise_timer_error()
+        if self._batch_size <= 1:
+            if self._metrics is None:
+                self._redis.lpush(queue_name, frame)
+            else:
+                start = time.perf_counter()
+                self._redis.lpush(queue_name, frame)
+                self._metrics.observe("lpush", time.perf_counter() - start)
+                self._metrics.record_sent(queue_name, 1, len(frame))
+            self.counts[queue_name] = self.counts.get(queue_name, 0) + 1
+            return
+        with self._lock:
+            self._pending.setdefault(queue_name, []).append(frame)
+            self._pending_count += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if self._pending_count >= self._batch_size:
+                self._flush_locked()
+
+    def flush(self):
+        self._raise_timer_error()
+        with self._lock:
+            self._flush_locked()
+
+    def _raise_timer_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _flush_locked(self):
+        if not self._pending_count:
+            return
+        pending = self._pending
+        self._pending = {}
+        self._pending_count = 0
+        self._oldest = None
+        pipe = self._redis.pipeline(transaction=False)
+        for queue_name, frames in pending.items():
+            pipe.lpush(queue_name, *frames)
+        start = time.perf_counter()
+        try:
+            # 非事务 pipeline 中各队列的 LPUSH 互不影响，逐条检查结果，只丢弃真正失败的队列
+            results = pipe.execute(raise_on_error=False)
+        except BaseException:
+            self._drop(pending)
+            raise
+        if self._metrics is not None:
+            self._metrics.observe("pipeline", time.perf_counter() - start)
+        error = None
+        for (queue_name, frames), result in zip(pending.items(), results):
+            if isinstance(result, Exception):
+                self.dropped[queue_name] = self.dropped.get(queue_name, 0) + len(frames)
+                error = error or result
+                continue
+            self.counts[queue_name] = self.counts.get(queue_name, 0) + len(frames)
+            if self._metrics is not None:
+                self._metrics.record_sent(queue_name, len(frames), sum(len(frame) for frame in frames))
+        if error is not None:
+            raise error
+
+    def _drop(self, pending):
+        for queue_name, frames in pending.items():
+            self.dropped[queue_name] = self.dropped.get(queue_name, 0) + len(frames)
+
+    def _flush_timer(self):
+        while not self._closed.wait(self._max_latency / 2):
+            with self._lock:
+                if self._oldest is not None and time.monotonic() - self._oldest >= self._max_latency:
+                    try:
+                        self._flush_locked()
+                    except redis.RedisError as e:
+                        # 这批帧已计入 dropped，异常交给发送线程下一次 send/flush 抛出
+                        print(f"Error flushing batch: {e}")
+                        self._error = e
+
+    def close(self, flush=True):
+        """
+        停止后台定时器；flush 为 True 时发出剩余帧（定时器遗留的异常也在这里抛出）。
+        调用方正在处理异常时传 flush=False：剩余帧计入 dropped 直接丢弃，不再访问 Redis。重复调用时直接返回。
+        """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._timer is not None:
+            self._timer.join()
+        try:
+            if flush:
+                self.flush()
+            else:
+                with self._lock:
+                    self._drop(self._pending)
+                    self._pending = {}
+                    self._pending_count = 0
+                    self._oldest = None
+        finally:
+            if self.dropped:
+                print("info", f"未确认写入而丢弃的帧：{self.dropped}")
+
+
+class RateLimiter(object):
+    """
+    高精度全局令牌桶限速器，同一进程内所有发送线程共享一个实例。
+
+    rate 为目标速率（unit="msgs" 时为条/秒，unit="bytes" 时为字节/秒），burst 为桶容量。
+    令牌不足时先预占（令牌数允许为负），再按单调纳秒时钟精确等待到期，线程之间按请求顺序公平排队；
+    等待时先粗粒度 sleep，最后 1ms 以内用 sleep(0) 让出 GIL 自旋，避免 time.sleep 粒度带来的偏差。
+    """
+
+    def __init__(self, rate, burst=None, unit="msgs"):
+        if float(rate) <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.unit = unit
+        self._burst = float(burst) if burst else max(1.0, self.rate / 100)
+        self._tokens = self._burst
+        self._ns_per_token = 1e9 / self.rate
+        self._last = time.monotonic_ns()
+        self._lock = threading.Lock()
+        self._start = None
+        self._consumed = 0
+
+    def acquire(self, amount=1):
+        deadline = self.reserve(amount)
+        if deadline:
+            _sleep_until_ns(deadline)
+
+    def reserve(self, amount=1):
+        """
+        预占 amount 个令牌，返回需要等待到的单调时钟纳秒时刻（0 表示无需等待）；asyncio 发送端据此 await sleep。
+        """
+        with self._lock:
+            now = time.monotonic_ns()
+            if self._start is None:
+                self._start = now
+            self._tokens = min(self._burst, self._tokens + (now - self._last) / self._ns_per_token)
+            self._last = now
+            self._tokens -= amount
+            self._consumed += amount
+            return now + int(-self._tokens * self._ns_per_token) if self._tokens < 0 else 0
+
+    def achieved_rate(self):
+        with self._lock:
+            if self._start is None:
+                return 0.0
+            elapsed = (time.monotonic_ns() - self._start) / 1e9
+            return self._consumed / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        unit = "条/秒" if self.unit == "msgs" else "字节/秒"
+        print("info", f"限速：目标速率{self.rate:.1f}{unit}，实际速率{self.achieved_rate():.1f}{unit}")
+
+
+def _sleep_until_ns(deadline):
+    while True:
+        remaining = deadline - time.monotonic_ns()
+        if remaining <= 0:
+            return
+        if remaining > 2000000:
+            time.sleep((remaining - 1000000) / 1e9)
+        else:
+            time.sleep(0)
+
+
+class QueueBackpressure(object):
+    """
+    按 orch 队列深度做闭环背压，同一进程内所有发送线程共享一个实例。
+
+    后台线程每 poll_interval 秒用一个非事务 pipeline 对全部目标队列执行 LLEN（一次往返）。
+    某个队列深度超过 high_water 后，发往该队列的发送线程在 wait() 处暂停，直到深度回落到 low_water 以下才恢复，
+    以免消费端（rcs/mars）跟不上时队列无限增长把 Redis 内存打满；配合 --rate 逐步调高即可找到消费端的最大可持续吞吐。
+    连续 max_poll_failures 次查询失败、或轮询线程退出（close/异常）时放行全部队列，发送线程不会无限期停在 wait()。
+    """
+
+    def __init__(self, redis_cli, queue_names, high_water, low_water=None, poll_interval=0.1, max_poll_failures=10):
+        self._redis = redis_cli
+        self._queue_names = sorted(set(queue_names))
+        self.high_water = int(high_water)
+        self.low_water = int(low_water) if low_water is not None else self.high_water // 2
+        if self.low_water >= self.high_water:
+            raise ValueError("low_water must be lower than high_water")
+        self.poll_interval = float(poll_interval)
+        self.max_poll_failures = int(max_poll_failures)
+        self.poll_failures = 0
+        self._open = {name: threading.Event() for name in self._queue_names}
+        [event.set() for event in self._open.values()]
+        self.depths = {name: 0 for name in self._queue_names}
+        self.max_depths = dict(self.depths)
+        self.pauses = {name: 0 for name in self._queue_names}
+        self.paused_seconds = {name: 0.0 for name in self._queue_names}
+        self._paused_since = {}
+        self._closed = threading.Event()
+        self.poll()
+        self._poller = threading.Thread(target=self._poll_timer, daemon=True)
+        self._poller.start()
+
+    def poll(self):
+        pipe = self._redis.pipeline(transaction=False)
+        for name in self._queue_names:
+            pipe.llen(name)
+        now = time.monotonic()
+        for name, depth in zip(self._queue_names, pipe.execute()):
+            self.depths[name] = depth
+            self.max_depths[name] = max(self.max_depths[name], depth)
+            event = self._open[name]
+            if event.is_set() and depth > self.high_water:
+                event.clear()
+                self.pauses[name] += 1
+                self._paused_since[name] = now
+                print("info", f"背压：{name}队列深度{depth}超过高水位{self.high_water}，暂停发送")
+            elif not event.is_set() and depth <= self.low_water:
+                self.paused_seconds[name] += now - self._paused_since.pop(name)
+                event.set()
+                print("info", f"背压：{name}队列深度{depth}回落到低水位{self.low_water}以下，恢复发送")
+
+    def _poll_timer(self):
+        failures = 0
+        try:
+            while not self._closed.wait(self.poll_interval):
+                try:
+                    self.poll()
+                    failures = 0
+                except redis.RedisError as e:
+                    # 查询失败时先保持当前的暂停/放行状态，下一轮再试
+                    failures += 1
+                    self.poll_failures += 1
+                    print(f"Error polling queue depth: {e}")
+                    if failures == self.max_poll_failures:
+                        # 深度一直未知就不再让发送线程等下去；之后查询恢复时 poll() 会按深度重新暂停
+                        print("info", f"背压：连续{failures}次查询队列深度失败，放行全部队列")
+                        self._open_all()
+        finally:
+            # 轮询线程退出后没有人再开闸
+            self._open_all()
+
+    def _open_all(self):
+        now = time.monotonic()
+        for name, since in self._paused_since.items():
+            self.paused_seconds[name] += now - since
+        self._paused_since = {}
+        [event.set() for event in self._open.values()]
+
+    def is_paused(self, queue_name):
+        event = self._open.get(queue_name)
+        return event is not None and not event.is_set()
+
+    def wait(self, queue_name):
+        event = self._open.get(queue_name)
+        # 分段等待，轮询线程已经退出时直接放行
+        while event is not None and not event.wait(self.poll_interval) and self._poller.is_alive():
+            pass
+
+    def close(self):
+        self._closed.set()
+        self._poller.join()
+        self._open_all()
+
+    def report(self):
+        for name in self._queue_names:
+            print("info", f"背压：{name}队列最大深度{self.max_depths[name]}，暂停{self.pauses[name]}次，"
+                          f"累计暂停{self.paused_seconds[name]:.2f}秒")
+        if self.poll_failures:
+            print("info", f"背压：查询队列深度失败{self.poll_failures}次")
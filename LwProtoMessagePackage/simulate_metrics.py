@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# coding=utf8
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 每个 2 的幂区间再线性分成 2**_SUB_BITS 份，记录值的相对误差不超过 1/32
+_SUB_BITS = 5
+_SUB_COUNT = 1 << _SUB_BITS
+# 覆盖到 2**40 微秒，远超任何一次 Redis 命令耗时
+_BUCKET_COUNT = (40 - _SUB_BITS + 1) * _SUB_COUNT
+QUANTILES = {0.5: "p50", 0.99: "p99", 0.999: "p999"}
+
+
+def _bucket_index(value):
+    if value < 2 * _SUB_COUNT:
+        return value
+    shift = value.bit_length() - _SUB_BITS - 1
+    return min((shift << _SUB_BITS) + (value >> shift), _BUCKET_COUNT - 1)
+
+
+def _bucket_upper(index):
+    if index < 2 * _SUB_COUNT:
+        return index
+    shift = (index >> _SUB_BITS) - 1
+    return ((index - (shift << _SUB_BITS) + 1) << shift) - 1
+
+
+class LatencyHistogram(object):
+    """
+    HDR 风格的延迟直方图（单位微秒）：对数分段 + 段内线性分桶，固定内存，记录 O(1)，分位数误差约 3%。
+    """
+
+    def __init__(self):
+        self._counts = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._lock = threading.Lock()
+
+    def record(self, micros):
+        micros = max(0, int(micros))
+        with self._lock:
+            self._counts[_bucket_index(micros)] += 1
+            self.count += 1
+            self.total += micros
+            if micros > self.max:
+                self.max = micros
+
+    def percentile(self, quantile):
+        with self._lock:
+            if not self.count:
+                return 0
+            rank = max(1, int(round(quantile * self.count)))
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= rank:
+                    return min(_bucket_upper(index), self.max)
+            return self.max
+
+
+class SimulateMetrics(object):
+    """
+    一次模拟发送的运行指标：各队列已成功写入 Redis 的消息数/字节数，以及 LPUSH（逐条）和 pipeline（批量）
+    的命令延迟直方图。由 BatchedSender/AsyncBatchedSender 在命令返回后更新。
+
+    start() 可选地启动 Prometheus 文本格式的 HTTP 端点（GET /metrics）和每 interval 秒追加一行快照的 JSON-lines 文件。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.messages = {}
+        self.bytes = {}
+        self.latency = {}
+        self._start = time.monotonic()
+        self._last = (self._start, 0, 0)
+        self._closed = threading.Event()
+        self._server = None
+        self._threads = []
+        self._json_file = None
+
+    def record_sent(self, queue_name, count, nbytes):
+        with self._lock:
+            self.messages[queue_name] = self.messages.get(queue_name, 0) + count
+            self.bytes[queue_name] = self.bytes.get(queue_name, 0) + nbytes
+
+    def sent_counts(self):
+        """
+        各队列已确认写入 Redis 的条数 {队列名: 条数}，供 QueueDepthMonitor 计算写入速率。
+        """
+        with self._lock:
+            return dict(self.messages)
+
+    def observe(self, op, seconds):
+        histogram = self.latency.get(op)
+        if histogram is None:
+            with self._lock:
+                histogram = self.latency.setdefault(op, LatencyHistogram())
+        histogram.record(seconds * 1e6)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            messages, nbytes = dict(self.messages), dict(self.bytes)
+            last_time, last_messages, last_bytes = self._last
+            total_messages, total_bytes = sum(messages.values()), sum(nbytes.values())
+            self._last = (now, total_messages, total_bytes)
+        interval = now - last_time
+        return {
+            "ts": time.time(),
+            "elapsed": now - self._start,
+            "messages": total_messages,
+            "bytes": total_bytes,
+            "msgs_per_sec": (total_messages - last_messages) / interval if interval > 0 else 0.0,
+            "bytes_per_sec": (total_bytes - last_bytes) / interval if interval > 0 else 0.0,
+            "queues": {name: {"messages": count, "bytes": nbytes.get(name, 0)} for name, count in messages.items()},
+            "latency_us": {op: {"count": histogram.count, "max": histogram.max,
+                                **{key: histogram.percentile(q) for q, key in QUANTILES.items()}}
+                           for op, histogram in list(self.latency.items())},
+        }
+
+    def prometheus_text(self):
+        with self._lock:
+            messages, nbytes = dict(self.messages), dict(self.bytes)
+        elapsed = time.monotonic() - self._start
+        lines = ["# HELP lwsim_messages_total Messages written to Redis, per queue.",
+                 "# TYPE lwsim_messages_total counter"]
+        lines += [f'lwsim_messages_total{{queue="{name}"}} {count}' for name, count in sorted(messages.items())]
+        lines += ["# HELP lwsim_bytes_total Frame bytes written to Redis, per queue.",
+                  "# TYPE lwsim_bytes_total counter"]
+        lines += [f'lwsim_bytes_total{{queue="{name}"}} {count}' for name, count in sorted(nbytes.items())]
+        lines += ["# HELP lwsim_elapsed_seconds Seconds since the run started.",
+                  "# TYPE lwsim_elapsed_seconds gauge",
+                  f"lwsim_elapsed_seconds {elapsed:.3f}",
+                  "# HELP lwsim_redis_latency_seconds Redis LPUSH/pipeline round-trip latency.",
+                  "# TYPE lwsim_redis_latency_seconds summary"]
+        for op, histogram in sorted(self.latency.items()):
+            lines += [f'lwsim_redis_latency_seconds{{op="{op}",quantile="{q}"}} {histogram.percentile(q) / 1e6:.6f}'
+                      for q in QUANTILES]
+            lines.append(f'lwsim_redis_latency_seconds_sum{{op="{op}"}} {histogram.total / 1e6:.6f}')
+            lines.append(f'lwsim_redis_latency_seconds_count{{op="{op}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def start(self, port=None, json_file=None, interval=1.0, host="0.0.0.0"):
+        if port:
+            metrics = self
+
+            class _MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] not in ("/", "/metrics"):
+                        self.send_error(404)
+                        return
+                    body = metrics.prometheus_text().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            self._server.daemon_threads = True
+            self._threads.append(threading.Thread(target=self._server.serve_forever, daemon=True))
+            print("info", f"指标：Prometheus 端点 http://{host}:{self._server.server_address[1]}/metrics")
+        if json_file:
+            self._json_file = open(json_file, "a")
+            self._threads.append(threading.Thread(target=self._json_timer, args=(float(interval),), daemon=True))
+        [t.start() for t in self._threads]
+        return self
+
+    def _write_json(self):
+        self._json_file.write(json.dumps(self.snapshot(), ensure_ascii=False) + "\n")
+        self._json_file.flush()
+
+    def _json_timer(self, interval):
+        while not self._closed.wait(interval):
+            self._write_json()
+
+    def close(self):
+        self._closed.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        [t.join() for t in self._threads]
+        if self._json_file is not None:
+            self._write_json()
+            self._json_file.close()
+        for op, histogram in sorted(self.latency.items()):
+            print("info", f"指标：{op} 共{histogram.count}次，延迟 p50={histogram.percentile(0.5)}us "
+                          f"p99={histogram.percentile(0.99)}us p999={histogram.percentile(0.999)}us "
+                          f"max={histogram.max}us")
+
+
+def start_metrics(port=None, json_file=None, interval=1.0, force=False):
+    """
+    按命令行参数创建并启动 SimulateMetrics；两者都未指定时返回 None，发送路径不做任何计时。
+    force 为 True 时（开启队列深度记录器，需要已确认写入的条数）即使两者都未指定也返回一个只计数的实例。
+    """
+    if not port and not json_file and not force:
+        return None
+    return SimulateMetrics().start(port, json_file, interval)
@@ -0,0 +1,88 @@
+# coding=utf8
+import os
+import sys
+
+import redis
+
+# 被测模块都用扁平导入（from proto_tools import ...），与直接在包目录下运行脚本时一致
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+
+# 基线里的 635 统计消息，两个 statsReportV2 各带一个 uint64 微秒时间戳
+STATS_LINE = (
+    '2024-10-28 14:06:47.966 [recv-stat-0] DEBUG cloudwan.cpe.proto.message.StatsMessageReceiver [] - '
+    'recv stat message: version=48 reserved=0 orchId=19096 customerId=1909622898 clientId=1 tranId=365869 '
+    'type=635 payload=netId: 0 transactionId: 365869 msgBase { statsReportV2 { timestamp: '
+    '1730095607949439 systemStats { cpuUsage: 100 cpuUsage: 100 cpuUsage: 100 memTotal: 100 memUsed: 1 '
+    'diskTotal: 100 diskUsed: 1 commSrvTcpBufData { recvBufSize: 0 sendBufSize: 0 } } } statsReportV2 { '
+    'vpnId: 0 timestamp: 1730095607949439 wanStats { wanInterface { interfaceName: "eth1" interfaceType: '
+    '2 rxBytes: 3230900662 txBytes: 7146838404 rxPackets: 41292911 txPackets: 66151995 rxBps: 949 txBps: '
+    '2105 rxPps: 12 txPps: 19 smoothrxBps: 951 smoothtxBps: 2102 smoothrxPps: 8 smoothtxPps: 16 '
+    'incRxBytes: 9492 incTxBytes: 21054 incRxPkts: 122 incTxPkts: 195 } wanID: 1 isWanUp: true  } '
+    'totalActiveFlows: 0 lanStat { lanStats { interfaceName: "eth0" interfaceType: 1 rxBytes: 0 txBytes: '
+    '0 rxPackets: 0 txPackets: 0 rxBps: 0 txBps: 0 rxPps: 0 txPps: 0 smoothrxBps: 0 smoothtxBps: 0 '
+    'smoothrxPps: 0 smoothtxPps: 0 incRxBytes: 0 incTxBytes: 0 incRxPkts: 0 incTxPkts: 0 } lanId: 1 '
+    'isLanUp: true }} } fragInfo { fragSeq: 0 endFlag: true }')
+
+
+def sample_lines():
+    with open(os.path.join(PACKAGE_DIR, "msg_402.txt")) as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+class FakePipeline(object):
+    def __init__(self, server):
+        self._server = server
+        self._commands = []
+
+    def lpush(self, name, *values):
+        self._commands.append(("lpush", name, values))
+        return self
+
+    def llen(self, name):
+        self._commands.append(("llen", name, ()))
+        return self
+
+    def execute(self, raise_on_error=True):
+        server = self._server
+        commands, self._commands = self._commands, []
+        server.executes += 1
+        if server.fail_execute:
+            raise redis.ConnectionError("connection lost mid-batch")
+        results = []
+        for op, name, values in commands:
+            if name in server.wrongtype:
+                error = redis.ResponseError("WRONGTYPE Operation against a key holding the wrong kind of value")
+                if raise_on_error:
+                    raise error
+                results.append(error)
+                continue
+            queue = server.queues.setdefault(name, [])
+            if op == "lpush":
+                for value in values:
+                    # 和真实 Redis 一样保存值的副本，发送端之后改写复用的 bytearray 不影响已写入的值
+                    queue.insert(0, bytes(value))
+            results.append(len(queue))
+        return results
+
+
+class FakeRedis(object):
+    """
+    内存里的 Redis 替身，只实现发送端用到的 lpush/llen/pipeline；fail_execute、wrongtype 控制失败方式，
+    executes 记录往返次数。
+    """
+
+    def __init__(self, wrongtype=()):
+        self.queues = {}
+        self.wrongtype = set(wrongtype)
+        self.fail_execute = False
+        self.executes = 0
+
+    def lpush(self, name, *values):
+        return self.pipeline().lpush(name, *values).execute()[0]
+
+    def llen(self, name):
+        return self.pipeline().llen(name).execute()[0]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
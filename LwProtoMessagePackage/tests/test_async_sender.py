@@ -0,0 +1,153 @@
+# coding=utf8
+import asyncio
+
+import pytest
+import redis
+
+from conftest import FakePipeline, FakeRedis
+from message_async_simulate import AsyncBatchedSender
+
+
+class AsyncFakePipeline(object):
+    def __init__(self, pipe):
+        self._pipe = pipe
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def lpush(self, name, *values):
+        self._pipe.lpush(name, *values)
+        return self
+
+    async def execute(self, raise_on_error=True):
+        await asyncio.sleep(0)
+        return self._pipe.execute(raise_on_error)
+
+
+class AsyncFakeRedis(FakeRedis):
+    """FakeRedis 的 redis.asyncio 接口"""
+
+    async def lpush(self, name, *values):
+        return FakePipeline(self).lpush(name, *values).execute()[0]
+
+    def pipeline(self, transaction=True):
+        return AsyncFakePipeline(FakePipeline(self))
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_single_lpush_path():
+    async def main(server):
+        async with AsyncBatchedSender(server) as sender:
+            await sender.send("cfg", b"1")
+            await sender.send("cfg", b"2")
+        return sender
+    server = AsyncFakeRedis()
+    sender = run(main(server))
+    assert server.queues == {"cfg": [b"2", b"1"]}
+    assert sender.counts == {"cfg": 2}
+    assert sender.dropped == {}
+
+
+def test_batches_keep_per_queue_order():
+    async def main(server):
+        sender = AsyncBatchedSender(server, batch_size=3, max_latency=0)
+        for i in range(7):
+            await sender.send("sta" if i % 2 else "cfg", b"%d" % i)
+        assert server.executes == 2
+        await sender.close()
+        return sender
+    server = AsyncFakeRedis()
+    sender = run(main(server))
+    assert server.executes == 3
+    assert server.queues == {"cfg": [b"6", b"4", b"2", b"0"], "sta": [b"5", b"3", b"1"]}
+    assert sender.counts == {"cfg": 4, "sta": 3}
+
+
+def test_max_latency_flushes_a_partial_batch():
+    async def main(server):
+        async with AsyncBatchedSender(server, batch_size=100, max_latency=0.02) as sender:
+            await sender.send("cfg", b"0")
+            await asyncio.sleep(0.2)
+            # 不等 close，后台任务已经发出
+            assert server.queues == {"cfg": [b"0"]}
+            await sender.send("cfg", b"1")
+        return sender
+    server = AsyncFakeRedis()
+    sender = run(main(server))
+    assert server.queues == {"cfg": [b"1", b"0"]}
+    assert server.executes == 2
+
+
+def test_failure_mid_batch_is_not_resent():
+    async def main(server):
+        sender = AsyncBatchedSender(server, batch_size=2, max_latency=0)
+        await sender.send("cfg", b"0")
+        await sender.send("cfg", b"1")
+        server.fail_execute = True
+        await sender.send("cfg", b"2")
+        with pytest.raises(redis.ConnectionError):
+            await sender.send("sta", b"3")
+        server.fail_execute = False
+        await sender.send("cfg", b"4")
+        await sender.close()
+        return sender
+    server = AsyncFakeRedis()
+    sender = run(main(server))
+    assert server.queues == {"cfg": [b"4", b"1", b"0"]}
+    assert sender.counts == {"cfg": 3}
+    assert sender.dropped == {"cfg": 1, "sta": 1}
+
+
+def test_wrongtype_only_drops_failed_queue():
+    async def main(server):
+        sender = AsyncBatchedSender(server, batch_size=3, max_latency=0)
+        await sender.send("cfg", b"0")
+        await sender.send("sta", b"1")
+        with pytest.raises(redis.ResponseError):
+            await sender.send("cfg", b"2")
+        await sender.close()
+        return sender
+    server = AsyncFakeRedis(wrongtype={"sta"})
+    sender = run(main(server))
+    assert server.queues == {"cfg": [b"2", b"0"]}
+    assert sender.counts == {"cfg": 2}
+    assert sender.dropped == {"sta": 1}
+
+
+def test_timer_error_surfaces_on_next_send():
+    async def main(server):
+        sender = AsyncBatchedSender(server, batch_size=100, max_latency=0.01)
+        server.fail_execute = True
+        await sender.send("cfg", b"0")
+        for _ in range(500):
+            if sender.dropped:
+                break
+            await asyncio.sleep(0.01)
+        assert sender.dropped == {"cfg": 1}
+        server.fail_execute = False
+        with pytest.raises(redis.ConnectionError):
+            await sender.send("cfg", b"1")
+        await sender.send("cfg", b"2")
+        await sender.close()
+        return sender
+    server = AsyncFakeRedis()
+    sender = run(main(server))
+    assert server.queues == {"cfg": [b"2"]}
+    assert sender.counts == {"cfg": 1}
+
+
+def test_with_block_does_not_flush_while_raising():
+    async def main(server):
+        async with AsyncBatchedSender(server, batch_size=10, max_latency=0.05) as sender:
+            await sender.send("cfg", b"0")
+            raise KeyError("original")
+    server = AsyncFakeRedis()
+    with pytest.raises(KeyError):
+        run(main(server))
+    assert server.executes == 0
@@ -0,0 +1,87 @@
+# coding=utf8
+import threading
+import time
+
+import pytest
+
+from conftest import FakeRedis
+from redis_sender import QueueBackpressure
+
+
+def waiter(backpressure, queue_name):
+    thread = threading.Thread(target=backpressure.wait, args=(queue_name,), daemon=True)
+    thread.start()
+    return thread
+
+
+@pytest.fixture
+def server():
+    server = FakeRedis()
+    server.queues["cfg"] = [b"x"] * 11
+    return server
+
+
+def test_pauses_above_high_water_and_resumes_below_low_water(server):
+    backpressure = QueueBackpressure(server, ["cfg", "sta"], 10, poll_interval=0.01)
+    assert backpressure.is_paused("cfg") and not backpressure.is_paused("sta")
+    thread = waiter(backpressure, "cfg")
+    thread.join(0.1)
+    assert thread.is_alive()
+    del server.queues["cfg"][5:]
+    thread.join(5)
+    assert not thread.is_alive()
+    backpressure.close()
+    assert backpressure.pauses == {"cfg": 1, "sta": 0}
+    assert backpressure.max_depths == {"cfg": 11, "sta": 0}
+
+
+def test_repeated_poll_failures_open_the_gate(server):
+    backpressure = QueueBackpressure(server, ["cfg"], 10, poll_interval=0.01, max_poll_failures=3)
+    thread = waiter(backpressure, "cfg")
+    server.fail_execute = True
+    thread.join(5)
+    assert not thread.is_alive()
+    assert backpressure.poll_failures >= 3
+    # 查询恢复后按深度重新暂停
+    server.fail_execute = False
+    deadline = time.monotonic() + 5
+    while not backpressure.is_paused("cfg") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert backpressure.pauses["cfg"] == 2
+    thread = waiter(backpressure, "cfg")
+    thread.join(0.1)
+    assert thread.is_alive()
+    backpressure.close()
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_close_releases_every_waiter(server):
+    server.queues["sta"] = [b"x"] * 20
+    backpressure = QueueBackpressure(server, ["cfg", "sta"], 10, poll_interval=60)
+    threads = [waiter(backpressure, name) for name in ("cfg", "sta", "cfg")]
+    backpressure.close()
+    for thread in threads:
+        thread.join(5)
+        assert not thread.is_alive()
+    assert not backpressure.is_paused("cfg") and not backpressure.is_paused("sta")
+    assert backpressure.paused_seconds["cfg"] > 0
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_poller_crash_releases_waiters(server):
+    backpressure = QueueBackpressure(server, ["cfg"], 10, poll_interval=0.01)
+
+    def broken(transaction=True):
+        raise RuntimeError("poller bug")
+    server.pipeline = broken
+    thread = waiter(backpressure, "cfg")
+    thread.join(5)
+    assert not thread.is_alive()
+    assert not backpressure.is_paused("cfg")
+    backpressure.close()
+
+
+def test_low_water_must_be_below_high_water(server):
+    with pytest.raises(ValueError):
+        QueueBackpressure(server, ["cfg"], 10, low_water=10)
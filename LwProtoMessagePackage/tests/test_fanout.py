@@ -0,0 +1,129 @@
+# coding=utf8
+import itertools
+from array import array
+
+import pytest
+
+from conftest import FakeRedis, sample_lines
+from message_common_simulate import create_simulate_messages, send_template
+from proto_tools import HeaderFanout, _typecode, handle_header, message_encode, parse_id_range
+from redis_sender import BatchedSender
+
+
+def legacy_variants(line, orch_ids, customer_ids, client_ids):
+    # 旧实现：逐个 CPE 替换日志文本里的头部字段，再重新解析、序列化
+    header = handle_header(line)
+    columns = [ids if ids is not None else [int(header[name])]
+               for name, ids in zip(("orchId", "customerId", "clientId"), (orch_ids, customer_ids, client_ids))]
+    return [message_encode(handle_header(create_simulate_messages(line, *ids)))
+            for ids in itertools.product(*columns)]
+
+
+@pytest.mark.parametrize("orch_ids, customer_ids, client_ids", [
+    ([19096], range(1, 4), range(1, 6)),
+    (range(7, 9), [1909622898, 0xffffffff], range(65530, 65536)),
+    # 超过 65535 个 CPE 时 customerId 超出 16 位
+    (None, range(65535, 65538), [0, 1]),
+    # None 保留原帧里的值
+    (None, None, range(3)),
+    ([0xffff], None, None),
+    (None, None, None),
+])
+def test_variants_match_legacy(orch_ids, customer_ids, client_ids):
+    fanout = HeaderFanout(orch_ids, customer_ids, client_ids)
+    for line in sample_lines():
+        expected = legacy_variants(line, orch_ids, customer_ids, client_ids)
+        assert len(fanout) == len(expected)
+        assert list(fanout.variants(message_encode(handle_header(line)))) == expected
+
+
+def test_client_id_varies_fastest():
+    fanout = HeaderFanout([1, 2], [10, 20], [100, 200])
+    frame = message_encode(handle_header(sample_lines()[0]))
+    ids = [(int.from_bytes(v[2:4], "big"), int.from_bytes(v[4:8], "big"), int.from_bytes(v[8:10], "big"))
+           for v in fanout.variants(frame)]
+    assert ids == list(itertools.product([1, 2], [10, 20], [100, 200]))
+
+
+@pytest.mark.parametrize("orch_ids, customer_ids, client_ids", [
+    ([19096], range(1, 4), range(1, 6)),
+    (None, range(65535, 65538), [0, 1]),
+    (None, None, range(3)),
+    (None, None, None),
+])
+def test_variants_into_rewrites_one_buffer(orch_ids, customer_ids, client_ids):
+    fanout = HeaderFanout(orch_ids, customer_ids, client_ids)
+    buffer = bytearray(b"left over from a longer frame" * 10)
+    for line in sample_lines():
+        frame = message_encode(handle_header(line))
+        seen = []
+        for variant in fanout.variants_into(frame, buffer):
+            assert variant is buffer
+            seen.append(bytes(variant))
+        assert seen == list(fanout.variants(frame))
+
+
+class FixedTemplate(object):
+    def __init__(self, frame):
+        self.frame = frame
+
+    def stamp(self, timestamp):
+        return self.frame
+
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+def test_send_template_fanout(batch_size):
+    fanout = HeaderFanout(None, [10, 20], range(1, 4))
+    frame = message_encode(handle_header(sample_lines()[0]))
+    server = FakeRedis()
+    buffer = bytearray()
+    with BatchedSender(server, batch_size, max_latency=0) as sender:
+        send_template(sender, FixedTemplate(frame), "ServerToOrchSta", 1, "worker", fanout=fanout, buffer=buffer)
+    # LPUSH 从队头压入，队列里是倒序
+    assert server.queues["ServerToOrchSta"][::-1] == list(fanout.variants(frame))
+    # 批量发送时帧要留到 flush，不能复用缓冲区
+    assert len(buffer) == (len(frame) if batch_size == 1 else 0)
+
+
+@pytest.mark.parametrize("columns", [
+    ([], None, None),
+    (None, range(0), None),
+    (None, None, range(5, 5)),
+    ([1], [2], []),
+])
+def test_empty_range_rejected(columns):
+    with pytest.raises(ValueError, match="empty"):
+        HeaderFanout(*columns)
+
+
+@pytest.mark.parametrize("columns", [
+    ([0x10000], None, None),
+    (None, [1 << 32], None),
+    (None, None, [-1]),
+    (None, None, range(65535, 65537)),
+])
+def test_out_of_range_ids_rejected(columns):
+    with pytest.raises(ValueError, match="bits"):
+        HeaderFanout(*columns)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("5", range(5, 6)),
+    ("1-100000", range(1, 100001)),
+    ("1,3,5-9", [1, 3, 5, 6, 7, 8, 9]),
+    (" 2 - 3 ", range(2, 4)),
+    (7, range(7, 8)),
+])
+def test_parse_id_range(text, expected):
+    assert parse_id_range(text) == expected
+
+
+@pytest.mark.parametrize("text", ["9-5", "1,9-5"])
+def test_parse_id_range_rejects_reversed(text):
+    with pytest.raises(ValueError, match="empty id range"):
+        parse_id_range(text)
+
+
+@pytest.mark.parametrize("width", [1, 2, 4, 8])
+def test_typecode_itemsize(width):
+    assert array(_typecode(width)).itemsize == width
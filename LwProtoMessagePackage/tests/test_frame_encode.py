@@ -0,0 +1,41 @@
+# coding=utf8
+import pytest
+
+from conftest import sample_lines
+from proto_bench import legacy_message_encode
+from proto_tools import handle_header, message_encode, message_encode_batch, paraLen
+
+
+def header(plen, payload, **fields):
+    values = {"version": 48, "orchId": 19096, "customerId": 1909622898, "clientId": 1, "mtype": 635,
+              "tranId": 365869}
+    values.update(fields)
+    return dict(values, plen=plen, payload=payload)
+
+
+HEADERS = [
+    header(3, b"abc"),
+    # 空 payload
+    header(0, b""),
+    # sm 消息：plen 含签名长度，签名部分补零
+    header(3 + paraLen, b"abc"),
+    # plen 小于 payload 时按 plen 截断
+    header(2, b"abc"),
+    # 头部各字段取最大值
+    header(1, b"\xff", version=0xffff, orchId=0xffff, customerId=0xffffffff, clientId=0xffff, mtype=0xffff,
+           tranId=0xffffffff),
+] + [handle_header(line) for line in sample_lines()] + [handle_header(line, "sm") for line in sample_lines()]
+
+
+@pytest.mark.parametrize("plain_header_dict", HEADERS)
+def test_message_encode_matches_legacy(plain_header_dict):
+    assert message_encode(plain_header_dict) == legacy_message_encode(plain_header_dict)
+
+
+def test_message_encode_batch_matches_legacy():
+    frames = message_encode_batch(HEADERS)
+    assert [bytes(frame) for frame in frames] == [legacy_message_encode(h) for h in HEADERS]
+
+
+def test_message_encode_batch_empty():
+    assert message_encode_batch([]) == []
@@ -0,0 +1,45 @@
+# coding=utf8
+import pytest
+
+from conftest import STATS_LINE, sample_lines
+from lwpack import DEPLOY_PATCH, LwPack, is_lwpack, load_lwpack, write_lwpack
+from message_common_simulate import handle_stats_allinone, handle_stats_patch
+
+HANDLE_STATS = {"allInOne": handle_stats_allinone, "patch": handle_stats_patch}
+
+
+@pytest.mark.parametrize("deploy", ["allInOne", "patch"])
+def test_round_trip_matches_handle_stats(tmp_path, deploy):
+    lines, queue_list, frames = HANDLE_STATS[deploy]("\n".join(sample_lines() + [STATS_LINE]))
+    path = str(tmp_path / "corpus.lwpack")
+    assert write_lwpack(path, queue_list, frames, 0 if deploy == "allInOne" else DEPLOY_PATCH) == len(frames)
+    assert is_lwpack(path)
+    packed_lines, packed_queues, packed_frames = load_lwpack(path, deploy)
+    assert packed_lines == [None] * len(frames)
+    assert packed_queues == queue_list
+    assert [bytes(frame) for frame in packed_frames] == [bytes(frame) for frame in frames]
+
+
+def test_round_trip_odd_sizes(tmp_path):
+    # 空帧、单字节帧、跨越 64KB 的帧，以及同一队列的多条记录
+    frames = [b"", b"\x00", bytes(range(256)) * 300, b"tail"]
+    queue_list = ["ServerToOrchSta", "ServerToOrchCfg", "ServerToOrchSta", "ServerToOrchReply"]
+    path = str(tmp_path / "odd.lwpack")
+    write_lwpack(path, queue_list, frames)
+    pack = LwPack(path)
+    assert len(pack) == 4
+    assert pack.queue_list == queue_list
+    assert [bytes(frame) for frame in pack.frames] == frames
+
+
+def test_empty_pack(tmp_path):
+    path = str(tmp_path / "empty.lwpack")
+    assert write_lwpack(path, [], []) == 0
+    assert len(LwPack(path)) == 0
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "bad.lwpack"
+    path.write_bytes(b"NOPE" + bytes(32))
+    with pytest.raises(ValueError):
+        LwPack(str(path))
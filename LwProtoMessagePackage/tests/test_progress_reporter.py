@@ -0,0 +1,80 @@
+# coding=utf8
+import io
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from progress_reporter import ProgressReporter
+
+
+def test_record_counts_per_thread_and_queue():
+    reporter = ProgressReporter(interval=0, out=io.StringIO())
+    for worker, queue_name, nbytes in [("t1", "cfg", 10), ("t1", "sta", 20), ("t2", "sta", 30)]:
+        reporter.record(worker, queue_name, nbytes)
+    assert (reporter.total, reporter.total_bytes) == (3, 60)
+    assert reporter.by_thread == {"t1": 2, "t2": 1}
+    assert reporter.by_queue == {"cfg": 1, "sta": 2}
+
+
+def test_record_samples_every_nth_message():
+    reporter = ProgressReporter(interval=0, sample_every=3, out=io.StringIO())
+    assert [reporter.record("t", "q", 1) for _ in range(7)] == [False, False, True, False, False, True, False]
+    assert not any(ProgressReporter(interval=0, out=io.StringIO()).record("t", "q", 1) for _ in range(10))
+
+
+def test_record_is_thread_safe():
+    reporter = ProgressReporter(interval=0, out=io.StringIO())
+
+    def worker(name):
+        for _ in range(10000):
+            reporter.record(name, "q", 2)
+    threads = [threading.Thread(target=worker, args=(f"t{i}",)) for i in range(4)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert (reporter.total, reporter.total_bytes) == (40000, 80000)
+    assert reporter.by_thread == {f"t{i}": 10000 for i in range(4)}
+
+
+def test_summary_reports_interval_rate():
+    reporter = ProgressReporter(interval=0, out=io.StringIO(), name="进程1")
+    for _ in range(5):
+        reporter.record("t1", "cfg", 100)
+    line = reporter.summary()
+    assert line.startswith("进度[进程1]：已发送5条")
+    assert "队列[cfg=5]" in line and "线程[t1=5]" in line
+    # 第二次汇总只计上次之后的增量
+    time.sleep(0.01)
+    assert re.search(r"最近[\d.]+秒 0\.0条/秒 0\.0字节/秒", reporter.summary())
+
+
+def test_trace_prints_the_legacy_per_message_lines():
+    out = io.StringIO()
+    reporter = ProgressReporter(interval=0, out=out)
+    reporter.trace("t1", 7, SimpleNamespace(timestamp=123, header={"clientId": 9}), 456)
+    reporter.trace("t1", 8, SimpleNamespace(timestamp=None, header={"clientId": 9}), 456)
+    assert out.getvalue().splitlines() == [
+        "原时间戳为：123", "当前时间戳为：456",
+        "线程[t1]：第7行(原文件行数索引)的消息正在发送，请等待。。。。。。 clientId=9",
+        "线程[t1]：第8行(原文件行数索引)的消息正在发送，请等待。。。。。。 clientId=9"]
+
+
+def test_close_without_interval_reports_once():
+    out = io.StringIO()
+    reporter = ProgressReporter(interval=0, out=out)
+    reporter.record("t1", "cfg", 1)
+    reporter.close()
+    assert len(out.getvalue().splitlines()) == 1
+    assert out.getvalue().startswith("info 进度：已发送1条")
+
+
+def test_timer_reports_periodically_until_closed():
+    out = io.StringIO()
+    reporter = ProgressReporter(interval=0.01, out=out)
+    time.sleep(0.1)
+    reporter.close()
+    lines = out.getvalue().splitlines()
+    assert len(lines) >= 3
+    written = len(lines)
+    time.sleep(0.03)
+    assert len(out.getvalue().splitlines()) == written
@@ -0,0 +1,87 @@
+# coding=utf8
+import pytest
+from LwProto import LightwanMsg_pb2
+
+from conftest import STATS_LINE, sample_lines
+from proto_patch import PayloadPatcher, encode_varint, find_field_paths, read_varint
+from proto_tools import TIMESTAMP_CPP_TYPES, MessageTemplate, handle_header, message_encode
+
+# varint 宽度边界：1/2/3 字节、32 位、int64 最大值、uint64 最大值（10 字节）
+BOUNDARIES = [1, 127, 128, 16383, 16384, 1 << 32, (1 << 63) - 1, (1 << 64) - 1]
+
+
+def legacy_stamp(line, timestamp):
+    # 旧实现：在日志文本里替换 "timestamp: <原值>"，再整行 Parse、序列化、封帧
+    initial = int(line.split("timestamp: ")[1].split(" ")[0])
+    return message_encode(handle_header(line.replace(f"timestamp: {initial}", f"timestamp: {timestamp}")))
+
+
+@pytest.mark.parametrize("value", BOUNDARIES)
+def test_varint_round_trip(value):
+    data = encode_varint(value)
+    assert len(data) == (value.bit_length() + 6) // 7
+    assert read_varint(data + b"\x01", 0) == (value, len(data))
+
+
+def test_varint_encoding_at_boundaries():
+    assert encode_varint(127) == b"\x7f"
+    assert encode_varint(128) == b"\x80\x01"
+    assert encode_varint((1 << 63) - 1) == b"\xff" * 8 + b"\x7f"
+    # 负数按 64 位补码编码，固定 10 字节
+    assert encode_varint(-1) == b"\xff" * 9 + b"\x01"
+
+
+@pytest.mark.parametrize("line", [STATS_LINE, sample_lines()[0]], ids=["stats635", "login402"])
+@pytest.mark.parametrize("initial", [127, 128, 1730095607949439])
+@pytest.mark.parametrize("timestamp", BOUNDARIES)
+def test_stamp_matches_text_replace(line, initial, timestamp):
+    original = int(line.split("timestamp: ")[1].split(" ")[0])
+    line = line.replace(f"timestamp: {original}", f"timestamp: {initial}")
+    assert bytes(MessageTemplate(line).stamp(timestamp)) == legacy_stamp(line, timestamp)
+
+
+def test_restamp_grows_and_shrinks_outer_lengths():
+    template = MessageTemplate(STATS_LINE)
+    for timestamp in (127, (1 << 64) - 1, 128, 1, (1 << 63) - 1, 16384):
+        assert bytes(template.stamp(timestamp)) == legacy_stamp(STATS_LINE, timestamp)
+        assert template.header["plen"] == len(template.frame) - 20
+
+
+def test_stamp_from_frame_matches_text_replace():
+    template = MessageTemplate.from_frame(memoryview(MessageTemplate(STATS_LINE).frame))
+    assert bytes(template.stamp(128)) == legacy_stamp(STATS_LINE, 128)
+
+
+def test_patcher_rewrites_every_repeated_path():
+    payload = handle_header(STATS_LINE)["payload"]
+    paths = find_field_paths(payload, "timestamp")
+    assert paths == ["msgBase.statsReportV2.timestamp"]
+    patcher = PayloadPatcher(payload, paths)
+    assert patcher.count(paths[0]) == 2
+    patcher.set(paths[0], 128)
+    assert PayloadPatcher(patcher.payload, paths).get(paths[0]) == [128, 128]
+
+
+def payload_of(frame):
+    message = LightwanMsg_pb2.PayloadType()
+    message.ParseFromString(bytes(frame[20:]))
+    return message
+
+
+def test_stamp_skips_32_bit_timestamps():
+    # CrashInfo.timestamp 是 uint32 秒，与 login.timestamp（uint64 微秒）同名
+    crash_info = 'crashInfo { agentCrash: false crashFileName: "core" timestamp: 1766631576 } '
+    line = sample_lines()[0].replace("login { ", "login { " + crash_info, 1)
+    paths = find_field_paths(handle_header(line)["payload"], "timestamp", cpp_types=TIMESTAMP_CPP_TYPES)
+    assert paths == ["msgBase.login.timestamp"]
+    login = payload_of(MessageTemplate(line).stamp(1766631576590123)).msgBase.login
+    assert login.timestamp == 1766631576590123
+    assert login.crashInfo[0].timestamp == 1766631576
+
+
+def test_stamp_leaves_frame_without_64_bit_timestamp():
+    line = sample_lines()[0].split("payload=")[0] + "payload=netId: 0 msgBase { acceServStats { timestamp: 1766631576 } }"
+    template = MessageTemplate(line)
+    frame = template.frame
+    assert template.stamp(1766631576590123) is frame
+    assert payload_of(frame).msgBase.acceServStats.timestamp == 1766631576
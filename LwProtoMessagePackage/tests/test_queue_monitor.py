@@ -0,0 +1,82 @@
+# coding=utf8
+import pytest
+
+from conftest import FakeRedis
+from queue_monitor import ORCH_QUEUES, QueueDepthMonitor
+
+
+@pytest.fixture
+def monitor():
+    # 采样间隔设得很长，后台线程在用例期间不会采样，窗口由用例直接喂入
+    monitor = QueueDepthMonitor(FakeRedis(), interval=60, window=1.0, onset_windows=3, queue_names=("cfg", "sta"))
+    yield monitor
+    monitor.close()
+
+
+def sample(monitor, elapsed, cfg_depth, cfg_enqueued, sta_depth=0, sta_enqueued=0):
+    return (monitor._start + elapsed, {"cfg": cfg_depth, "sta": sta_depth}, {"cfg": cfg_enqueued, "sta": sta_enqueued})
+
+
+def feed(monitor, samples):
+    for begin, end in zip(samples, samples[1:]):
+        monitor._close_window(begin, end)
+
+
+def test_drain_rate_is_enqueued_minus_depth_growth(monitor):
+    # 1 秒写入 1000 条，深度涨 300：消费 700 条/秒
+    monitor._close_window(sample(monitor, 0, 0, 0), sample(monitor, 1, 300, 1000))
+    assert monitor.peak_drain_rate["cfg"] == pytest.approx(700)
+    # 深度回落时消费速率高于写入速率
+    monitor._close_window(sample(monitor, 1, 300, 1000), sample(monitor, 3, 100, 1400))
+    assert monitor.peak_drain_rate["cfg"] == pytest.approx(700)
+    monitor._close_window(sample(monitor, 3, 100, 1400), sample(monitor, 4, 0, 2300))
+    assert monitor.peak_drain_rate["cfg"] == pytest.approx(1000)
+    assert monitor.onset == {}
+
+
+def test_onset_needs_consecutive_growing_windows(monitor):
+    samples = [sample(monitor, t, depth, enqueued) for t, depth, enqueued in [
+        (0, 0, 0), (1, 100, 1000), (2, 200, 2000),
+        # 第 3 个窗口深度没有上涨，重新计数
+        (3, 200, 3000),
+        (4, 250, 4000), (5, 400, 5000), (6, 600, 6000), (7, 900, 7000)]]
+    feed(monitor, samples[:5])
+    assert monitor.onset == {}
+    feed(monitor, samples[4:])
+    # 积压从连续上涨的第一个窗口（第 3 秒开始）算起，记录当时的深度与写入/消费速率
+    assert monitor.onset["cfg"] == pytest.approx((3.0, 200, 1000.0, 950.0))
+    assert "sta" not in monitor.onset
+
+
+def test_onset_is_recorded_once(monitor):
+    feed(monitor, [sample(monitor, t, 100 * t, 1000 * t) for t in range(4)])
+    first = monitor.onset["cfg"]
+    feed(monitor, [sample(monitor, t, 500 * t, 2000 * t) for t in range(4, 10)])
+    assert monitor.onset["cfg"] == first
+
+
+def test_drain_rates_average_from_first_to_last_sample(monitor):
+    monitor._first = sample(monitor, 0, 50, 0, 10, 0)
+    monitor._last = sample(monitor, 10, 150, 5000, 0, 200)
+    assert monitor.drain_rates() == pytest.approx({"cfg": 490.0, "sta": 21.0})
+    monitor._last = monitor._first
+    assert monitor.drain_rates() == {"cfg": 0.0, "sta": 0.0}
+
+
+def test_csv_records_depth_and_confirmed_counts(tmp_path):
+    server = FakeRedis()
+    server.queues["ServerToOrchSta"] = [b"x"] * 3
+    counts = {"ServerToOrchSta": 5}
+    path = tmp_path / "depth.csv"
+    monitor = QueueDepthMonitor(server, lambda: counts, str(path), interval=60)
+    server.queues["ServerToOrchSta"].append(b"y")
+    counts["ServerToOrchSta"] = 9
+    monitor.close()
+    header, first, last = [line.split(",") for line in path.read_text().splitlines()]
+    assert header == ["elapsed_ms"] + [f"{name}_depth" for name in ORCH_QUEUES] + \
+        [f"{name}_enqueued" for name in ORCH_QUEUES]
+    column = dict(zip(header, zip(first, last)))
+    assert column["ServerToOrchSta_depth"] == ("3", "4")
+    assert column["ServerToOrchSta_enqueued"] == ("5", "9")
+    assert column["ServerToOrchCfg_enqueued"] == ("0", "0")
+    assert monitor.samples == 2
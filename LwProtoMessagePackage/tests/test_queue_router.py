@@ -0,0 +1,39 @@
+# coding=utf8
+import itertools
+
+import pytest
+
+from message_common_simulate import QueueRouter
+from proto_tools import configQueue, replyQueue, smConfigQueue, smStatsQueue, statsQueue
+
+MTYPES = [0, 1, 199, 200, 401, 402, 403, 600, 601, 635, 65535]
+LINES = ["recv stat message: type=635 payload=netId: 0", "send reply message: type=1 payload=netId: 0"]
+
+
+def legacy_route(mtype, line, orch_deploy, sm):
+    # 旧实现里 handle_stats_allinone/handle_stats_patch 的 if 链
+    queueName = configQueue
+    if mtype > 600:
+        queueName = statsQueue
+    elif mtype < 200 or mtype == 402 or "reply message" in line:
+        queueName = replyQueue
+    queues = [queueName] if 'allInOne' in orch_deploy else [queueName, configQueue]
+    if sm:
+        queues = [{configQueue: smConfigQueue, statsQueue: smStatsQueue}.get(name, name) for name in queues]
+    return tuple(queues)
+
+
+@pytest.mark.parametrize("orch_deploy, sm", list(itertools.product(["allInOne", "patch"], [False, True])))
+def test_route_matches_legacy(orch_deploy, sm):
+    router = QueueRouter(orch_deploy, sm)
+    # 跑两遍：第二遍走缓存的查找表
+    for _ in range(2):
+        for mtype, line in itertools.product(MTYPES, LINES):
+            assert router.route(mtype, line) == legacy_route(mtype, line, orch_deploy, sm)
+
+
+def test_route_without_line():
+    router = QueueRouter()
+    assert router.route(635) == (statsQueue,)
+    assert router.route(300) == (configQueue,)
+    assert router.route(402) == (replyQueue,)
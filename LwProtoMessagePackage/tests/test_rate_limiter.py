@@ -0,0 +1,110 @@
+# coding=utf8
+import time
+
+import pytest
+
+import redis_sender
+from redis_sender import RateLimiter
+
+
+class FakeClock(object):
+    """替换 redis_sender 里的 time 模块（RateLimiter 只用 monotonic_ns）；sleep_until 记录每次等待的截止时刻并把时钟拨到那里"""
+
+    def __init__(self):
+        self.now = 10 ** 12
+        self.deadlines = []
+
+    def monotonic_ns(self):
+        return self.now
+
+    def sleep_until(self, deadline):
+        self.deadlines.append(deadline)
+        self.now = max(self.now, deadline)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(redis_sender, "time", clock)
+    monkeypatch.setattr(redis_sender, "_sleep_until_ns", clock.sleep_until)
+    return clock
+
+
+@pytest.mark.parametrize("rate", [0, -1, "0"])
+def test_rate_must_be_positive(rate):
+    with pytest.raises(ValueError):
+        RateLimiter(rate)
+
+
+@pytest.mark.parametrize("rate, burst, expected", [(1000, None, 10), (50, None, 1), (1000, 200, 200)])
+def test_burst_is_served_without_waiting(clock, rate, burst, expected):
+    limiter = RateLimiter(rate, burst)
+    for _ in range(expected):
+        limiter.acquire()
+    assert clock.deadlines == []
+    limiter.acquire()
+    assert clock.deadlines == [clock.now]
+    assert clock.deadlines[0] - 10 ** 12 == pytest.approx(1e9 / rate, abs=1)
+
+
+def test_steady_state_spacing_matches_rate(clock):
+    limiter = RateLimiter(1000, burst=1)
+    start = clock.now
+    for _ in range(1001):
+        limiter.acquire()
+    # 第一条用掉桶里的 1 个令牌，之后每条等 1ms
+    assert len(clock.deadlines) == 1000
+    gaps = {b - a for a, b in zip(clock.deadlines, clock.deadlines[1:])}
+    assert gaps <= {999999, 1000000, 1000001}
+    assert clock.now - start == pytest.approx(1e9, rel=1e-6)
+    assert limiter.achieved_rate() == pytest.approx(1001, rel=1e-3)
+
+
+def test_idle_refill_is_capped_at_burst(clock):
+    limiter = RateLimiter(100, burst=5)
+    for _ in range(5):
+        limiter.acquire()
+    clock.now += 10 * 10 ** 9
+    for _ in range(5):
+        limiter.acquire()
+    assert clock.deadlines == []
+    limiter.acquire()
+    assert clock.deadlines == [clock.now]
+    assert clock.now - 10 * 10 ** 9 - 10 ** 12 == pytest.approx(1e7, abs=1)
+
+
+def test_byte_rate_charges_amount(clock):
+    limiter = RateLimiter(1000, burst=1000, unit="bytes")
+    limiter.acquire(1000)
+    assert clock.deadlines == []
+    # 令牌允许为负：超出的 500 字节按 1000 字节/秒等待 0.5 秒
+    limiter.acquire(500)
+    assert clock.deadlines[0] - 10 ** 12 == pytest.approx(5e8, abs=1)
+
+
+def test_achieved_rate_before_first_acquire():
+    assert RateLimiter(10).achieved_rate() == 0.0
+
+
+def test_sleep_until_ns_does_not_return_early():
+    deadline = time.monotonic_ns() + 5000000
+    redis_sender._sleep_until_ns(deadline)
+    assert time.monotonic_ns() >= deadline
+
+
+def test_reserve_returns_deadline_without_sleeping(clock):
+    limiter = RateLimiter(1000, burst=2)
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == 0
+    # asyncio 发送端拿截止时刻自己 await sleep，reserve 本身不等待
+    deadlines = [limiter.reserve() for _ in range(3)]
+    assert clock.deadlines == []
+    assert [deadline - clock.now for deadline in deadlines] == [1000000, 2000000, 3000000]
+
+
+def test_reserve_and_acquire_share_the_bucket(clock):
+    limiter = RateLimiter(1000, burst=1)
+    limiter.acquire()
+    deadline = limiter.reserve()
+    limiter.acquire()
+    assert clock.deadlines == [deadline + 1000000]
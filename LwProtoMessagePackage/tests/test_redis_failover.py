@@ -0,0 +1,124 @@
+# coding=utf8
+from types import SimpleNamespace
+
+import pytest
+import redis
+
+import redis_failover
+from conftest import FakeRedis
+from redis_failover import SentinelRedis
+
+
+class FakeSentinel(object):
+    """
+    代替 redis.sentinel.Sentinel：master_for 返回共享的 FakeRedis；
+    每次 discover_master 返回 masters 里的下一个地址，用来模拟 Sentinel 选出新主节点。
+    """
+
+    def __init__(self, sentinels, socket_timeout=None):
+        self.sentinels = sentinels
+        self.server = FakeRedis()
+        self.server.disconnects = 0
+        self.server.connection_pool = SimpleNamespace(disconnect=self._disconnect)
+        self.masters = [("10.0.0.1", 6380)]
+        self.discovered = 0
+        FakeSentinel.last = self
+
+    def _disconnect(self):
+        self.server.disconnects += 1
+
+    def master_for(self, master_name, **kwargs):
+        return self.server
+
+    def discover_master(self, master_name):
+        self.discovered += 1
+        master = self.masters[min(self.discovered, len(self.masters)) - 1]
+        if master != self.masters[0]:
+            # 新主节点可写
+            self.server.fail_execute = False
+        return master
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(redis_failover, "Sentinel", FakeSentinel)
+    return SentinelRedis({"ip": "10.0.0.9", "password": None, "db": "0"}, failover_timeout=1, retry_delay=0.001)
+
+
+def test_connects_through_sentinels(monkeypatch):
+    monkeypatch.setattr(redis_failover, "Sentinel", FakeSentinel)
+    SentinelRedis({"ip": "10.0.0.9", "password": None})
+    assert FakeSentinel.last.sentinels == [("10.0.0.9", redis_failover.DEFAULT_SENTINEL_PORT)]
+    client = SentinelRedis({"sentinels": "a:1,b:2", "password": None})
+    assert FakeSentinel.last.sentinels == [("a", 1), ("b", 2)]
+    assert client.master == ("10.0.0.1", 6380)
+
+
+def test_commands_pass_through_without_retry(client):
+    assert client.lpush("q", b"1") == 1
+    assert client.llen("q") == 1
+    assert (client.reconnects, client.failovers) == (0, 0)
+
+
+def test_failover_resolves_new_master_and_retries(client):
+    sentinel = FakeSentinel.last
+    sentinel.masters.append(("10.0.0.2", 6380))
+    sentinel.server.fail_execute = True
+    assert client.lpush("q", b"1") == 1
+    assert client.master == ("10.0.0.2", 6380)
+    assert (client.reconnects, client.failovers, sentinel.server.disconnects) == (1, 1, 1)
+    assert sentinel.server.queues == {"q": [b"1"]}
+
+
+def test_gives_up_after_failover_timeout(client):
+    client._failover_timeout = 0.02
+    FakeSentinel.last.server.fail_execute = True
+    with pytest.raises(redis.ConnectionError):
+        client.lpush("q", b"1")
+    assert client.reconnects == 0
+
+
+def test_other_errors_are_not_retried(client):
+    server = FakeSentinel.last.server
+    server.wrongtype.add("q")
+    with pytest.raises(redis.ResponseError):
+        client.lpush("q", b"1")
+    assert FakeSentinel.last.discovered == 1
+
+
+def test_readonly_counts_as_failover(client):
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) == 1:
+            raise redis.exceptions.ReadOnlyError("READONLY You can't write against a read only replica.")
+        return "ok"
+    assert client.call(func) == "ok"
+    assert len(calls) == 2 and client.reconnects == 1
+
+
+def test_pipeline_replays_the_whole_batch(client):
+    sentinel = FakeSentinel.last
+    sentinel.masters.append(("10.0.0.2", 6380))
+    sentinel.server.fail_execute = True
+    pipe = client.pipeline(transaction=False)
+    pipe.lpush("cfg", b"1", b"2")
+    pipe.lpush("sta", b"3")
+    pipe.llen("cfg")
+    assert len(pipe) == 3
+    assert pipe.execute() == [2, 1, 2]
+    # 第一次往返失败，按原命令重新构建后整批重放一次
+    assert sentinel.server.executes == 2
+    assert sentinel.server.queues == {"cfg": [b"2", b"1"], "sta": [b"3"]}
+    assert len(pipe) == 0
+
+
+def test_pipeline_commands_are_cleared_when_retries_run_out(client):
+    client._failover_timeout = 0.02
+    FakeSentinel.last.server.fail_execute = True
+    pipe = client.pipeline()
+    pipe.lpush("cfg", b"1")
+    with pytest.raises(redis.ConnectionError):
+        pipe.execute()
+    assert len(pipe) == 0
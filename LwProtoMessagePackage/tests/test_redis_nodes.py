@@ -0,0 +1,100 @@
+# coding=utf8
+import pytest
+import redis
+from redis.crc import key_slot
+
+import redis_nodes
+from conftest import FakeRedis
+from proto_tools import ORCH_QUEUES, configQueue, replyQueue, smConfigQueue, smStatsQueue, statsQueue
+from redis_nodes import MultiNodeRedis
+
+NODES = "10.0.0.1:6379,10.0.0.2:6379,10.0.0.3:6379"
+A, B, C = ("10.0.0.1", 6379), ("10.0.0.2", 6379), ("10.0.0.3", 6379)
+
+
+def test_nodes_mode_spreads_queues_round_robin():
+    client = MultiNodeRedis({"nodes": NODES}, ORCH_QUEUES)
+    assert [client.node_for(name) for name in ORCH_QUEUES] == [A, B, C, A, B]
+    # Cfg/Sta 的 slot 都落在最后一段，按 slot 路由会挤到同一个节点
+    assert key_slot(configQueue.encode()) > 2 * 16384 // 3 and key_slot(statsQueue.encode()) > 2 * 16384 // 3
+    assert client.node_for(configQueue) != client.node_for(statsQueue)
+
+
+def test_bytes_and_str_keys_route_alike():
+    client = MultiNodeRedis({"nodes": NODES}, ORCH_QUEUES)
+    assert client.node_for(statsQueue.encode()) == client.node_for(statsQueue) == B
+
+
+@pytest.mark.parametrize("key", ["other", "ServerToOrchUnknown", "x" * 40])
+def test_unassigned_keys_route_by_slot(key):
+    client = MultiNodeRedis({"nodes": NODES}, ORCH_QUEUES)
+    per_node = 16384 // 3
+    assert client.node_for(key) == [A, B, C][min(key_slot(key.encode()) // per_node, 2)]
+
+
+def test_pinned_queue_wins_over_round_robin():
+    client = MultiNodeRedis({"nodes": NODES, "queue_nodes": {statsQueue: "10.0.0.9:7000", "other": "10.0.0.1:6379"}},
+                            ORCH_QUEUES)
+    assert client.node_for(statsQueue) == ("10.0.0.9", 7000)
+    assert client.node_for("other") == A
+    # 其余队列的轮转分配不受钉住的队列影响
+    assert [client.node_for(name) for name in (configQueue, replyQueue, smConfigQueue, smStatsQueue)] == [A, C, A, B]
+    assert sorted(client.clients) == [A, B, C, ("10.0.0.9", 7000)]
+
+
+def test_route_log(capsys):
+    MultiNodeRedis({"nodes": "10.0.0.1:6379,10.0.0.2:6379"}, (configQueue, statsQueue))
+    assert capsys.readouterr().out.strip() == \
+        f"info 队列路由：{configQueue}->10.0.0.1:6379，{statsQueue}->10.0.0.2:6379"
+
+
+@pytest.mark.parametrize("reply", [
+    [[0, 8191, [b"10.0.0.1", 6379, b"id1"]], [8192, 16383, [b"10.0.0.2", 6379, b"id2"], [b"10.0.0.3", 6379]]],
+    {(0, 8191): {"primary": ("10.0.0.1", 6379)}, (8192, 16383): {"primary": ("10.0.0.2", 6379)}},
+])
+def test_cluster_mode_follows_cluster_slots(monkeypatch, reply):
+    class FakeStrictRedis(redis.StrictRedis):
+        def execute_command(self, *args, **options):
+            assert args == ("CLUSTER", "SLOTS")
+            return reply
+    monkeypatch.setattr(redis_nodes.redis, "StrictRedis", FakeStrictRedis)
+    client = MultiNodeRedis({"cluster": True, "ip": "10.0.0.1", "port": "6379"}, ORCH_QUEUES)
+    for name in ORCH_QUEUES:
+        assert client.node_for(name) == (A if key_slot(name.encode()) <= 8191 else B)
+
+
+@pytest.fixture
+def client():
+    client = MultiNodeRedis({"nodes": NODES}, (configQueue, statsQueue, replyQueue))
+    client.clients = {node: FakeRedis() for node in client.clients}
+    return client
+
+
+def test_pipeline_splits_by_node_and_keeps_order(client):
+    pipe = client.pipeline()
+    pipe.lpush(statsQueue, b"s1", b"s2")
+    pipe.lpush(configQueue, b"c1")
+    pipe.llen(statsQueue)
+    pipe.lpush(replyQueue, b"r1")
+    assert pipe.execute() == [2, 1, 2, 1]
+    assert [client.clients[node].executes for node in (A, B, C)] == [1, 1, 1]
+    assert client.clients[B].queues == {statsQueue: [b"s2", b"s1"]}
+    assert {node: (stats["messages"], stats["bytes"], stats["commands"]) for node, stats in client.stats.items()} == \
+        {A: (1, 2, 1), B: (2, 4, 1), C: (1, 2, 1)}
+
+
+def test_pipeline_node_failure_is_per_node(client):
+    client.clients[B].fail_execute = True
+    pipe = client.pipeline()
+    pipe.lpush(configQueue, b"c1")
+    pipe.lpush(statsQueue, b"s1")
+    with pytest.raises(redis.ConnectionError):
+        pipe.execute()
+    # 跨节点的 pipeline 不是原子的：失败节点之前的节点已经写入
+    assert client.clients[A].queues == {configQueue: [b"c1"]}
+    pipe.lpush(configQueue, b"c2")
+    pipe.lpush(statsQueue, b"s2")
+    results = pipe.execute(raise_on_error=False)
+    assert results[0] == 2 and isinstance(results[1], redis.ConnectionError)
+    # 只统计真正写入的条数
+    assert client.stats[B]["messages"] == 0 and client.stats[A]["messages"] == 2
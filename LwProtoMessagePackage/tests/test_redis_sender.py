@@ -0,0 +1,106 @@
+# coding=utf8
+import time
+
+import pytest
+import redis
+
+from conftest import FakeRedis
+from redis_sender import BatchedSender
+
+
+def test_single_lpush_path():
+    server = FakeRedis()
+    sender = BatchedSender(server)
+    sender.send("cfg", b"1")
+    sender.send("cfg", b"2")
+    sender.close()
+    assert server.queues == {"cfg": [b"2", b"1"]}
+    assert sender.counts == {"cfg": 2}
+    assert sender.dropped == {}
+
+
+def test_batches_keep_per_queue_order():
+    server = FakeRedis()
+    sender = BatchedSender(server, batch_size=3, max_latency=0)
+    for i in range(7):
+        sender.send("sta" if i % 2 else "cfg", b"%d" % i)
+    # 7 条帧按 batch_size=3 触发两次 pipeline，剩下一条由 close 发出
+    assert server.executes == 2
+    sender.close()
+    assert server.executes == 3
+    # 与逐条 LPUSH 的结果一致
+    assert server.queues == {"cfg": [b"6", b"4", b"2", b"0"], "sta": [b"5", b"3", b"1"]}
+    assert sender.counts == {"cfg": 4, "sta": 3}
+    assert sender.dropped == {}
+
+
+def test_lpush_failure_mid_batch_is_not_resent():
+    server = FakeRedis()
+    sender = BatchedSender(server, batch_size=2, max_latency=0)
+    sender.send("cfg", b"0")
+    sender.send("cfg", b"1")
+    server.fail_execute = True
+    sender.send("cfg", b"2")
+    with pytest.raises(redis.ConnectionError):
+        sender.send("sta", b"3")
+    server.fail_execute = False
+    sender.send("cfg", b"4")
+    sender.close()
+    # 失败那批帧只计入 dropped，之后的 flush/close 不会重发
+    assert server.queues == {"cfg": [b"4", b"1", b"0"]}
+    assert sender.counts == {"cfg": 3}
+    assert sender.dropped == {"cfg": 1, "sta": 1}
+
+
+def test_wrongtype_only_drops_failed_queue():
+    server = FakeRedis(wrongtype={"sta"})
+    sender = BatchedSender(server, batch_size=4, max_latency=0)
+    sender.send("cfg", b"0")
+    sender.send("sta", b"1")
+    sender.send("cfg", b"2")
+    with pytest.raises(redis.ResponseError):
+        sender.send("sta", b"3")
+    assert server.queues == {"cfg": [b"2", b"0"]}
+    assert sender.counts == {"cfg": 2}
+    assert sender.dropped == {"sta": 2}
+    sender.close()
+    assert server.executes == 1
+
+
+def test_with_block_does_not_flush_while_raising():
+    server = FakeRedis()
+    with pytest.raises(KeyError):
+        with BatchedSender(server, batch_size=10, max_latency=0) as sender:
+            sender.send("cfg", b"0")
+            server.fail_execute = True
+            raise KeyError("original")
+    # 原异常不被 flush 的异常掩盖，剩余帧直接丢弃，不访问 Redis
+    assert server.executes == 0
+    assert sender.dropped == {"cfg": 1}
+
+
+def test_with_block_flushes_on_success():
+    server = FakeRedis()
+    with BatchedSender(server, batch_size=10, max_latency=0) as sender:
+        sender.send("cfg", b"0")
+    assert server.queues == {"cfg": [b"0"]}
+    sender.close()
+    assert server.executes == 1
+
+
+def test_timer_error_surfaces_on_next_send():
+    server = FakeRedis()
+    server.fail_execute = True
+    sender = BatchedSender(server, batch_size=100, max_latency=0.01)
+    sender.send("cfg", b"0")
+    deadline = time.monotonic() + 5
+    while not sender.dropped and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sender.dropped == {"cfg": 1}
+    server.fail_execute = False
+    with pytest.raises(redis.ConnectionError):
+        sender.send("cfg", b"1")
+    sender.send("cfg", b"2")
+    sender.close()
+    assert server.queues == {"cfg": [b"2"]}
+    assert sender.counts == {"cfg": 1}
@@ -0,0 +1,52 @@
+# coding=utf8
+import pytest
+from LwProto import LightwanMsg_pb2
+
+from conftest import sample_lines
+from proto_bench import legacy_scan_header
+from proto_tools import HEADER_FIELDS, handle_header, scan_header
+
+HEADER = ("2024-10-28 14:06:47.966 [recv-stat-0] DEBUG cloudwan.cpe.proto.message.StatsMessageReceiver [] - "
+          "recv stat message: version=48 reserved=0 orchId=19096 customerId=1909622898 clientId=1 tranId=365869 "
+          "type=635 payload=")
+
+
+def tokens(line):
+    offsets = scan_header(line)
+    return tuple(line[slice(*offsets[field])] for field in HEADER_FIELDS)
+
+
+@pytest.mark.parametrize("line", sample_lines() + [
+    HEADER + "netId: 0 transactionId: 365869",
+    # payload 文本里再次出现 payload=：旧实现 split("payload=")[1] 截止到这里
+    HEADER + 'netId: 0 msgBase { login { version: "payload=x" } }',
+    HEADER + "netId: 0 payload=1 payload=2",
+    # payload 文本里出现头部字段名：头部字段取第一次出现处
+    HEADER + "netId: 0 type=9 tranId=1",
+    # 值后面紧跟同名字段
+    "version=1 orchId=2 customerId=3 clientId=4 tranId=5 type=6type=7 payload=netId: 0",
+    # 字段出现在 payload 之后
+    "payload=netId: 0 tranId=9 version=1 orchId=2 customerId=3 clientId=4 type=6",
+    "version=1 orchId=2 customerId=3 clientId=4 type=6 payload=netId: 0 tranId=5",
+    # 空值
+    "version= orchId=2 customerId=3 clientId=4 tranId=5 type=6 payload=",
+])
+def test_scan_header_matches_legacy_split(line):
+    assert tokens(line) == legacy_scan_header(line)
+
+
+def test_missing_field_raises_like_legacy():
+    line = "version=1 orchId=2 customerId=3 clientId=4 type=6 payload=netId: 0"
+    with pytest.raises(IndexError):
+        legacy_scan_header(line)
+    with pytest.raises(IndexError):
+        scan_header(line)
+
+
+def test_handle_header_parses_payload_up_to_next_payload_marker():
+    header = handle_header(HEADER + "netId: 7 transactionId: 1 payload=not protobuf text")
+    expected = LightwanMsg_pb2.PayloadType(netId=7, transactionId=1).SerializeToString()
+    assert header["payload"] == expected
+    assert header["plen"] == len(expected)
+    assert (header["version"], header["orchId"], header["customerId"], header["clientId"], header["tranId"],
+            header["mtype"]) == (48, 19096, 1909622898, 1, 365869, 635)
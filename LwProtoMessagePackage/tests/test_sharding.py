@@ -0,0 +1,76 @@
+# coding=utf8
+import collections
+
+import pytest
+
+import message_common_simulate
+from conftest import FakeRedis, sample_lines
+from message_common_simulate import create_simulate_messages, shard_ranges
+
+
+@pytest.mark.parametrize("total, shards", [(0, 1), (1, 1), (10, 3), (10, 10), (3, 8), (100000, 7), (7, "2")])
+def test_shard_ranges_cover_every_line_once(total, shards):
+    ranges = shard_ranges(total, shards)
+    assert len(ranges) == int(shards)
+    assert ranges[0][0] == 0 and ranges[-1][1] == total
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    sizes = [end - start for start, end in ranges]
+    # 前 total % shards 份各多 1 行
+    assert sizes == sorted(sizes, reverse=True)
+    assert max(sizes) - min(sizes) <= 1
+
+
+class InlineExecutor(object):
+    """在当前进程里依次执行 worker，代替 ProcessPoolExecutor，并记下各分片"""
+
+    shards = []
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def map(self, fn, shards):
+        InlineExecutor.shards = list(shards)
+        return [fn(shard) for shard in InlineExecutor.shards]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeRedis()
+    monkeypatch.setattr(message_common_simulate, "ProcessPoolExecutor", InlineExecutor)
+    monkeypatch.setattr(message_common_simulate, "redis_connect", lambda redis_info: server)
+    return server
+
+
+def corpus(count):
+    # clientId 各不相同，发送后按头部 clientId（第 8~10 字节）核对每行恰好发送一次
+    return "\n".join(create_simulate_messages(sample_lines()[0], 1800, 1800249612, client_id)
+                     for client_id in range(1, count + 1))
+
+
+@pytest.mark.parametrize("processes, threads", [(1, 1), (3, 2), (4, 5)])
+def test_multiprocess_sends_every_line_once(server, processes, threads):
+    totals = message_common_simulate.simulate_message_multiprocess_jenkins(
+        1, "0", {}, corpus(11), threads, "0", 1, "allInOne", processes)
+    assert [shard[6:8] for shard in InlineExecutor.shards] == shard_ranges(11, processes)
+    assert totals == {queue_name: len(frames) for queue_name, frames in server.queues.items()}
+    client_ids = collections.Counter(int.from_bytes(frame[8:10], "big")
+                                     for frames in server.queues.values() for frame in frames)
+    assert client_ids == collections.Counter(range(1, 12))
+
+
+def test_rate_and_burst_are_split_per_process(server):
+    message_common_simulate.simulate_message_multiprocess_jenkins(
+        1, "0", {}, corpus(4), 1, "0", 1, "allInOne", 4, rate=100000, burst=400, rate_unit="bytes")
+    options = [shard[-1] for shard in InlineExecutor.shards]
+    assert [(o["rate"], o["burst"], o["rate_unit"]) for o in options] == [(25000.0, 100.0, "bytes")] * 4
+
+
+def test_no_rate_leaves_processes_unlimited(server):
+    message_common_simulate.simulate_message_multiprocess_jenkins(1, "0", {}, corpus(2), 1, "0", 1, "allInOne", 2)
+    assert [(shard[-1]["rate"], shard[-1]["burst"]) for shard in InlineExecutor.shards] == [(None, None)] * 2
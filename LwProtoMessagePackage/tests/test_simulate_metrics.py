@@ -0,0 +1,138 @@
+# coding=utf8
+import json
+import random
+
+import pytest
+
+import simulate_metrics
+from simulate_metrics import LatencyHistogram, SimulateMetrics, _bucket_index, _bucket_upper
+
+# 每个 2 的幂区间分成 2**5 份，桶宽不超过桶下界的 1/32
+RESOLUTION = 1 / 32
+
+
+def bucket_bounds(value):
+    index = _bucket_index(value)
+    return (_bucket_upper(index - 1) + 1 if index else 0), _bucket_upper(index)
+
+
+def edge_values():
+    values = set(range(0, 300))
+    for bit in range(6, 40):
+        for offset in (-1, 0, 1):
+            values.add((1 << bit) + offset)
+    values.update(random.Random(1).randrange(1 << 39) for _ in range(2000))
+    return sorted(values)
+
+
+def test_every_value_falls_inside_its_bucket():
+    previous = -1
+    for value in edge_values():
+        lower, upper = bucket_bounds(value)
+        assert lower <= value <= upper
+        assert upper - lower <= max(0, lower * RESOLUTION)
+        index = _bucket_index(value)
+        assert index >= previous
+        previous = index
+
+
+def test_small_values_are_exact():
+    assert [bucket_bounds(value) for value in range(64)] == [(value, value) for value in range(64)]
+
+
+def test_out_of_range_values_clamp_to_last_bucket():
+    assert _bucket_index(1 << 45) == _bucket_index((1 << 41) + 12345) == simulate_metrics._BUCKET_COUNT - 1
+
+
+def assert_close(estimate, exact):
+    # 返回桶上界：不低于真实值，也不超过一个桶宽
+    assert exact <= estimate <= exact * (1 + RESOLUTION)
+
+
+def exact_percentile(values, quantile):
+    values = sorted(values)
+    return values[max(1, int(round(quantile * len(values)))) - 1]
+
+
+@pytest.mark.parametrize("distribution", ["uniform", "lognormal", "bimodal"])
+def test_percentiles_match_exact_within_bucket_resolution(distribution):
+    rng = random.Random(distribution)
+    if distribution == "uniform":
+        values = list(range(1, 100001))
+        rng.shuffle(values)
+    elif distribution == "lognormal":
+        values = [int(rng.lognormvariate(6, 1.5)) for _ in range(100000)]
+    else:
+        # 99% 的命令 200us，1% 卡在 50ms：p50 看不出来，p99/p999 必须看得出来
+        values = [200] * 99000 + [50000] * 1000
+        rng.shuffle(values)
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    assert histogram.count == len(values) and histogram.total == sum(values) and histogram.max == max(values)
+    for quantile in (0.5, 0.99, 0.999):
+        assert_close(histogram.percentile(quantile), exact_percentile(values, quantile))
+
+
+def test_bimodal_tail_shows_up_in_p999():
+    histogram = LatencyHistogram()
+    for value in [200] * 99000 + [50000] * 1000:
+        histogram.record(value)
+    assert histogram.percentile(0.5) == histogram.percentile(0.99) == bucket_bounds(200)[1]
+    assert 50000 <= histogram.percentile(0.999) <= 50000 * (1 + RESOLUTION)
+
+
+def test_percentile_edge_cases():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(0.99) == 0
+    histogram.record(-5)
+    histogram.record(1000.7)
+    assert histogram.count == 2 and histogram.max == 1000
+    # 桶上界超过最大值时返回最大值
+    assert histogram.percentile(1.0) == 1000
+    assert histogram.percentile(0.0) == 0
+
+
+def test_prometheus_text():
+    metrics = SimulateMetrics()
+    metrics.record_sent("ServerToOrchSta", 3, 300)
+    metrics.record_sent("ServerToOrchCfg", 1, 50)
+    metrics.record_sent("ServerToOrchSta", 2, 200)
+    for micros in [100] * 98 + [5000, 90000]:
+        metrics.observe("pipeline", micros / 1e6)
+    lines = metrics.prometheus_text().splitlines()
+    elapsed = [line for line in lines if line.startswith("lwsim_elapsed_seconds ")]
+    assert len(elapsed) == 1 and float(elapsed[0].split()[1]) >= 0
+    assert [line for line in lines if not line.startswith("lwsim_elapsed_seconds ")] == [
+        "# HELP lwsim_messages_total Messages written to Redis, per queue.",
+        "# TYPE lwsim_messages_total counter",
+        'lwsim_messages_total{queue="ServerToOrchCfg"} 1',
+        'lwsim_messages_total{queue="ServerToOrchSta"} 5',
+        "# HELP lwsim_bytes_total Frame bytes written to Redis, per queue.",
+        "# TYPE lwsim_bytes_total counter",
+        'lwsim_bytes_total{queue="ServerToOrchCfg"} 50',
+        'lwsim_bytes_total{queue="ServerToOrchSta"} 500',
+        "# HELP lwsim_elapsed_seconds Seconds since the run started.",
+        "# TYPE lwsim_elapsed_seconds gauge",
+        "# HELP lwsim_redis_latency_seconds Redis LPUSH/pipeline round-trip latency.",
+        "# TYPE lwsim_redis_latency_seconds summary",
+        # 分位数取所在桶的上界（100us 落在 [100, 101]），但不超过记录到的最大值
+        'lwsim_redis_latency_seconds{op="pipeline",quantile="0.5"} 0.000101',
+        'lwsim_redis_latency_seconds{op="pipeline",quantile="0.99"} 0.005119',
+        'lwsim_redis_latency_seconds{op="pipeline",quantile="0.999"} 0.090000',
+        'lwsim_redis_latency_seconds_sum{op="pipeline"} 0.104800',
+        'lwsim_redis_latency_seconds_count{op="pipeline"} 100',
+    ]
+
+
+def test_json_snapshot_file(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    metrics = SimulateMetrics().start(json_file=str(path), interval=60)
+    metrics.record_sent("ServerToOrchSta", 4, 400)
+    metrics.observe("lpush", 0.001)
+    metrics.close()
+    snapshot = json.loads(path.read_text().splitlines()[-1])
+    assert snapshot["messages"] == 4 and snapshot["bytes"] == 400
+    assert snapshot["queues"] == {"ServerToOrchSta": {"messages": 4, "bytes": 400}}
+    assert snapshot["latency_us"]["lpush"]["count"] == 1
+    assert 1000 <= snapshot["latency_us"]["lpush"]["p50"] <= 1000 * (1 + RESOLUTION)
@@ -0,0 +1,143 @@
+# coding=utf8
+import collections
+import threading
+import time
+
+import pytest
+import redis
+
+import message_common_simulate
+from conftest import FakePipeline, FakeRedis, sample_lines
+from message_common_simulate import create_simulate_messages, handle_stats, simulate_work_stealing, work_chunks
+
+
+class LoggingPipeline(FakePipeline):
+    def execute(self, raise_on_error=True):
+        server = self._server
+        with server.lock:
+            if server.fail_after is not None and len(server.log) >= server.fail_after:
+                self._commands = []
+                raise redis.ConnectionError("connection lost")
+            now = time.monotonic()
+            server.log += [(now, int.from_bytes(value[8:10], "big"))
+                           for op, _, values in self._commands if op == "lpush" for value in values]
+            return super().execute(raise_on_error)
+
+
+class LoggingRedis(FakeRedis):
+    """按往返记下每条帧的 (时刻, clientId)；已写入 fail_after 条之后的往返抛连接错误"""
+
+    def __init__(self, fail_after=None):
+        super().__init__()
+        self.log = []
+        self.fail_after = fail_after
+        self.lock = threading.Lock()
+
+    def pipeline(self, transaction=True):
+        return LoggingPipeline(self)
+
+
+def log_text(count):
+    return "\n".join(create_simulate_messages(sample_lines()[0], 1800, 1800249612, client_id)
+                     for client_id in range(1, count + 1))
+
+
+def corpus(count):
+    return handle_stats(log_text(count), "allInOne")
+
+
+def run(redis_cli, lines=10, threads=3, chunk_size=4, repeated=1, groups=1, interval="0", **options):
+    lines_list, queue_list, frames = corpus(lines)
+    result = {}
+
+    def target():
+        try:
+            result["results"] = simulate_work_stealing(redis_cli, repeated, "0", interval, groups, lines_list,
+                                                       queue_list, frames, threads, chunk_size, **options)
+        except Exception as e:
+            result["error"] = e
+    # 在单独的线程里跑，卡住时用例失败而不是整个 pytest 挂住
+    runner = threading.Thread(target=target, daemon=True)
+    runner.start()
+    runner.join(30)
+    assert not runner.is_alive(), "simulate_work_stealing hung"
+    return result
+
+
+@pytest.mark.parametrize("line_count, repeat, chunk_size", [(10, 1, 4), (10, 3, 4), (7, 2, 7), (3, 2, 16), (0, 2, 4)])
+def test_work_chunks_cover_every_unit_once(line_count, repeat, chunk_size):
+    units = [(j, index) for j, start, end in work_chunks(line_count, repeat, chunk_size) for index in range(start, end)]
+    assert units == [(j, index) for j in range(repeat) for index in range(line_count)]
+    assert all(end - start <= chunk_size for _, start, end in work_chunks(line_count, repeat, chunk_size))
+
+
+@pytest.mark.parametrize("threads, chunk_size, repeated, batch_size", [(1, 1, 1, 1), (3, 4, 3, 1), (8, 2, 2, 5),
+                                                                       (2, 64, 4, 3)])
+def test_every_line_repeat_is_sent_exactly_once(threads, chunk_size, repeated, batch_size):
+    server = LoggingRedis()
+    result = run(server, lines=10, threads=threads, chunk_size=chunk_size, repeated=repeated, batch_size=batch_size,
+                 batch_latency=0)
+    assert "error" not in result
+    assert collections.Counter(client_id for _, client_id in server.log) == \
+        collections.Counter({client_id: repeated for client_id in range(1, 11)})
+    results = result["results"]
+    assert len(results) == threads
+    assert sum(r["messages"] for r in results.values()) == 10 * repeated
+    assert sum(r["chunks"] for r in results.values()) == len(list(work_chunks(10, repeated, chunk_size)))
+    assert sum(sum(r["counts"].values()) for r in results.values()) == 10 * repeated
+
+
+def test_groups_wait_at_the_barrier():
+    server = LoggingRedis()
+    # 批量缓冲在组结束处 flush，下一组要等所有线程发完本组并过了组间间隔才开始
+    result = run(server, lines=12, threads=3, chunk_size=2, repeated=2, groups=3, interval="0.05", batch_size=4,
+                 batch_latency=0)
+    assert "error" not in result
+    log = sorted(server.log)
+    assert len(log) == 72
+    for group in range(3):
+        assert collections.Counter(client_id for _, client_id in log[group * 24:(group + 1) * 24]) == \
+            collections.Counter({client_id: 2 for client_id in range(1, 13)})
+    for boundary in (24, 48):
+        assert log[boundary][0] - log[boundary - 1][0] >= 0.05
+
+
+def test_raises_when_every_sender_thread_fails():
+    server = LoggingRedis(fail_after=0)
+    result = run(server, lines=50, threads=4, chunk_size=1, repeated=20)
+    assert isinstance(result["error"], redis.ConnectionError)
+
+
+def test_raises_when_one_sender_thread_fails_mid_group():
+    server = LoggingRedis(fail_after=25)
+    result = run(server, lines=50, threads=4, chunk_size=1, repeated=20, groups=3, interval="0")
+    assert isinstance(result["error"], redis.ConnectionError)
+    # 失败后不再投放新的工作，其余线程随即退出
+    assert len(server.log) < 100
+
+
+@pytest.fixture
+def stealing(monkeypatch):
+    server = LoggingRedis()
+    calls = []
+    monkeypatch.setattr(message_common_simulate, "redis_connect", lambda redis_info: server)
+    original = message_common_simulate.simulate_work_stealing
+    monkeypatch.setattr(message_common_simulate, "simulate_work_stealing",
+                        lambda *args, **kwargs: calls.append(args[9]) or original(*args, **kwargs))
+    return server, calls
+
+
+def test_static_blocks_by_default(stealing):
+    server, calls = stealing
+    message_common_simulate.simulate_message_quickly_jenkins(2, "0", {}, log_text(6), 3, "0", 1, "allInOne")
+    assert calls == []
+    assert collections.Counter(client_id for _, client_id in server.log) == \
+        collections.Counter({client_id: 2 for client_id in range(1, 7)})
+
+
+def test_chunk_size_opts_in_to_work_stealing(stealing):
+    server, calls = stealing
+    message_common_simulate.simulate_message_quickly_jenkins(2, "0", {}, log_text(6), 3, "0", 1, "allInOne",
+                                                             chunk_size=4)
+    assert calls == [4]
+    assert len(server.log) == 12
@@ -1,8 +1,16 @@
 #!/usr/bin/env python
 # coding=utf8
+import os
 import time
 import re
+import queue
+from functools import partial
 from proto_tools import *
+from redis_sender import BatchedSender, RateLimiter, QueueBackpressure
+from progress_reporter import ProgressReporter
+from simulate_metrics import start_metrics
+from queue_monitor import QueueDepthMonitor
+from lwpack import is_lwpack, load_lwpack
 try:
     # Optional dependency: only needed by simulate_message_quickly_main().
     # When this package is copied under lw_communication/, autotest Keywords may not exist.
@@ -39,108 +47,335 @@ def create_simulate_messages(log_str, orchId, customerId, clientId):
     return replaced_str
 
 
-def handle_stats_patch(message):
-    lines = message.split("\n")
+# 路由规则（按顺序匹配，命中即停）：mtype 集合 -> 目标队列；都不命中时行内带 reply 标记的发往 ServerToOrchReply，否则发往 ServerToOrchCfg
+ROUTE_RULES = (
+    (range(601, 1 << 16), statsQueue),
+    # reply 类型：历史上可能用 mtype<200 区分，这里补充支持 402（login reply）等
+    (range(0, 200), replyQueue),
+    ({402}, replyQueue),
+)
+REPLY_MARKERS = ("reply message",)
+# 商密（sm）消息改发对应的 _SM 队列
+SM_QUEUES = {configQueue: smConfigQueue, statsQueue: smStatsQueue}
+
+
+class QueueRouter(object):
+    """
+    表驱动的队列路由：ROUTE_RULES、reply 标记、部署方式、sm 队列映射在首次遇到某个 (mtype, 是否带 reply 标记) 时
+    求值一次并缓存成查找表，之后每行只做一次字典查找。
+
+    route() 返回该消息要发往的队列元组：all-in-one 部署为 (路由队列,)，patch 部署额外再发一份到 ServerToOrchCfg。
+    """
+
+    def __init__(self, orch_deploy="allInOne", sm=False):
+        self._patch = 'allInOne' not in orch_deploy
+        self._sm = sm
+        self._table = {}
+
+    def _compile(self, mtype, reply_marker):
+        queue_name = replyQueue if reply_marker else configQueue
+        for mtypes, target in ROUTE_RULES:
+            if mtype in mtypes:
+                queue_name = target
+                break
+        queues = (queue_name, configQueue) if self._patch else (queue_name,)
+        if self._sm:
+            queues = tuple(SM_QUEUES.get(name, name) for name in queues)
+        return queues
+
+    def route(self, mtype, line=""):
+        key = (mtype, any(marker in line for marker in REPLY_MARKERS))
+        queues = self._table.get(key)
+        if queues is None:
+            queues = self._table[key] = self._compile(*key)
+        return queues
+
+
+def handle_stats(message, orch_deploy, processes=1, msg_type="normal"):
+    """
+    每行只解析、编码一次，再按 QueueRouter 扇出到各目标队列；同一行的多个队列共享同一帧对象（不拷贝）。
+    返回 (lines_list, queue_list, message_bytes_list)，三个列表按发送顺序一一对应。
+    """
+    lines = [i for i in message.split("\n") if i.strip()]
+    router = QueueRouter(orch_deploy, sm=msg_type == "sm")
     lines_list, message_bytes_list, queueName_list = [], [], []
-    for i in lines:
-        if not i.strip():
-            continue
-        for j in range(2):
+    for i, head_dict in zip(lines, handle_headers(lines, msg_type, processes)):
+        message_bytes = get_message_template(i, msg_type, head_dict).frame
+        for queueName in router.route(head_dict["mtype"], i):
             lines_list.append(i)
-            head_dict = handle_header(i)
-            message_bytes = message_encode(head_dict)
             message_bytes_list.append(message_bytes)
-            queueName = configQueue
-            if j ==1:
-                queueName = configQueue
-            elif head_dict["mtype"] > 600:
-                queueName = statsQueue
-            # reply 类型：历史上可能用 mtype<200 区分，这里补充支持 402（login reply）等
-            elif head_dict["mtype"] < 200 or head_dict["mtype"] == 402 or "reply message" in i:
-                queueName = replyQueue
             queueName_list.append(queueName)
     return lines_list, queueName_list, message_bytes_list
 
-def handle_stats_allinone(message):
-    lines = message.split("\n")
-    lines_list, message_bytes_list, queueName_list = [], [], []
-    for i in lines:
-        if not i.strip():
-            continue
-        lines_list.append(i)
-        head_dict = handle_header(i)
-        message_bytes = message_encode(head_dict)
-        message_bytes_list.append(message_bytes)
-        queueName = configQueue
-        if head_dict["mtype"] > 600:
-            queueName = statsQueue
-        # reply 类型：历史上可能用 mtype<200 区分，这里补充支持 402（login reply）等
-        elif head_dict["mtype"] < 200 or head_dict["mtype"] == 402 or "reply message" in i:
-            queueName = replyQueue
-        queueName_list.append(queueName)
-    return lines_list, queueName_list, message_bytes_list
 
-def handle_stats_allinone(message):
-    lines = message.split("\n")
-    lines_list, message_bytes_list, queueName_list = [], [], []
-    for i in lines:
-        if not i.strip():
-            continue
-        lines_list.append(i)
-        head_dict = handle_header(i)
-        message_bytes = message_encode(head_dict)
-        message_bytes_list.append(message_bytes)
-        queueName = configQueue
-        if head_dict["mtype"] > 600:
-            queueName = statsQueue
-        # reply 类型：历史上可能用 mtype<200 区分，这里补充支持 402（login reply）等
-        elif head_dict["mtype"] < 200 or head_dict["mtype"] == 402 or "reply message" in i:
-            queueName = replyQueue
-        queueName_list.append(queueName)
-    return lines_list, queueName_list, message_bytes_list
+def handle_stats_patch(message, processes=1):
+    return handle_stats(message, "patch", processes)
+
+
+def handle_stats_allinone(message, processes=1):
+    return handle_stats(message, "allInOne", processes)
+
 
 def send_stats(redis_info, repeat, speed_info, group_interval, total_group, lines_list, queue_list,
                message_bytes_list,
-               line_num):
-    config_count, stats_count, reply_count = 0, 0, 0
+               line_num, batch_size=1, batch_latency=0.05, rate_limiter=None, reporter=None, metrics=None,
+               backpressure=None, fanout=None):
+    """
+    :param reporter: 共享的 ProgressReporter，按线程/队列汇总计数并定时输出；为 None 时不输出逐条进度。
+    :param metrics: 共享的 SimulateMetrics，记录 LPUSH/pipeline 延迟和各队列写入量；为 None 时不计时。
+    :param backpressure: 共享的 QueueBackpressure，目标队列深度超过高水位时在发送前暂停。
+    :param fanout: HeaderFanout，每条消息刷新时间戳后按它扇出成多个 CPE 变体依次发送（只改写头部 id）。
+    """
     current_thread_name = threading.current_thread().name
-    cpeid_pattern = re.compile(r"clientId=(\d+)")
-    for group in range(int(total_group)):
-        num = line_num
-        for j in range(int(repeat)):
-            for index, line in enumerate(lines_list):
-                if "timestamp:" in line:
-                    init_timestamp = int(line.split("timestamp: ")[1].split(" ")[0])
-                    print(f"原时间戳为：{init_timestamp}")
-                    current_timestamp = int(round(time.time(), 6) * 1000000)
-                    line = line.replace(rf"timestamp: {init_timestamp}", rf"timestamp: {current_timestamp}")
-                    current_timestamp = int(line.split("timestamp: ")[1].split(" ")[0])
-                    print(f"当前时间戳为：{current_timestamp}")
-                match = cpeid_pattern.search(line)
-                cpeId = match.group(1)
-                print(
-                    f"线程[{current_thread_name}]：第{num}行(原文件行数索引)的消息正在发送，请等待。。。。。。 clientId={cpeId}")
-                num += 1
-                head_dict = handle_header(line)
-                message_bytes_list[index] = message_encode(head_dict)
-
-                redis_info.lpush(queue_list[index], message_bytes_list[index])
-                if queue_list[index] == configQueue:
-                    config_count += 1
-                elif queue_list[index] == statsQueue:
-                    stats_count += 1
-                elif queue_list[index] == replyQueue:
-                    reply_count += 1
-                if speed_info != "0" or j != int(repeat) - 1:
-                    time.sleep(float(speed_info))
-        if group_interval != "0" or group != int(total_group) - 1:
-            time.sleep(float(group_interval))
+    # 每行只在首次使用时解析，之后的重复/分组直接复用缓存的帧，每次发送只在字节层面刷新时间戳
+    templates = [get_message_template(line) if line is not None else MessageTemplate.from_frame(frame)
+                 for line, frame in zip(lines_list, message_bytes_list)]
+    buffer = bytearray()
+    with BatchedSender(redis_info, batch_size, batch_latency, metrics) as sender:
+        for group in range(int(total_group)):
+            num = line_num
+            for j in range(int(repeat)):
+                for index, template in enumerate(templates):
+                    send_template(sender, template, queue_list[index], num, current_thread_name, rate_limiter,
+                                  reporter, backpressure, fanout, buffer)
+                    num += 1
+                    if rate_limiter is None and (speed_info != "0" or j != int(repeat) - 1):
+                        time.sleep(float(speed_info))
+            if group_interval != "0" or group != int(total_group) - 1:
+                sender.flush()
+                time.sleep(float(group_interval))
+    print_send_counts(sender.counts)
+    return sender.counts
+
+
+def send_template(sender, template, queue_name, num, worker, rate_limiter=None, reporter=None, backpressure=None,
+                  fanout=None, buffer=None):
+    """
+    刷新一条模板的时间戳（有 fanout 时再扇出成多个 CPE 变体），按限速/背压交给 sender 发送。
+    buffer 为发送线程复用的 bytearray：逐条 LPUSH 时各变体只在其中原地改写头部 id，不再每个变体拷贝一次整帧；
+    批量发送时帧要留到 flush，仍按变体生成新的 bytes。
+    """
+    current_timestamp = int(round(time.time(), 6) * 1000000)
+    message_bytes = template.stamp(current_timestamp)
+    if fanout is None:
+        frames = (message_bytes,)
+    elif buffer is not None and not sender.retains_frames:
+        frames = fanout.variants_into(message_bytes, buffer)
+    else:
+        frames = fanout.variants(message_bytes)
+    for frame in frames:
+        if reporter is not None and reporter.record(worker, queue_name, len(frame)):
+            reporter.trace(worker, num, template, current_timestamp)
+        if rate_limiter is not None:
+            # 设置了全局限速时由令牌桶控制节奏，不再按 speed 逐条 sleep
+            rate_limiter.acquire(1 if rate_limiter.unit == "msgs" else len(frame))
+        if backpressure is not None:
+            backpressure.wait(queue_name)
+        sender.send(queue_name, frame)
+
+
+class SenderFailure(object):
+    """
+    发送线程共享的失败标志：第一个异常退出的发送线程记下异常并置位，
+    投放工作的线程据此停止 put/join 并把这个异常抛给调用方，而不是在满队列或 join() 上一直阻塞。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self.error = None
+
+    def set(self, error):
+        with self._lock:
+            if self.error is None:
+                self.error = error
+        self._event.set()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def raise_if_set(self):
+        if self._event.is_set():
+            raise self.error
+
+
+def put_unless_failed(work_queue, item, failure, timeout=0.1):
+    """
+    带超时地反复 put，直到放入成功；期间发送线程失败则抛出该线程的异常。
+    """
+    while True:
+        failure.raise_if_set()
+        try:
+            work_queue.put(item, timeout=timeout)
+            return
+        except queue.Full:
+            pass
+
+
+def join_unless_failed(work_queue, failure, timeout=0.1):
+    """
+    等 work_queue 中已投放的工作全部 task_done；期间发送线程失败则抛出该线程的异常。
+    """
+    with work_queue.all_tasks_done:
+        while work_queue.unfinished_tasks:
+            failure.raise_if_set()
+            work_queue.all_tasks_done.wait(timeout)
+
+
+def stop_senders(work_queue, senders, failure, timeout=0.1):
+    """
+    给每个发送线程投放一个 None 结束标记并等它们退出。发送线程已失败时先丢弃队列里没发的工作，
+    失败后仍在运行的线程取到任何东西都会退出，已退出的线程不会再取，因此满队列上的 put 不会一直阻塞。
+    """
+    for _ in senders:
+        while True:
+            if failure.is_set():
+                drain_queue(work_queue)
+            try:
+                work_queue.put(None, timeout=timeout)
+                break
+            except queue.Full:
+                pass
+    [sender.join() for sender in senders]
+
+
+def drain_queue(work_queue):
+    while True:
+        try:
+            work_queue.get_nowait()
+        except queue.Empty:
+            return
+        work_queue.task_done()
+
+
+# 组结束标记：每个发送线程取到一个，flush 后在 barrier 上等齐其他线程
+_GROUP_END = object()
+
+
+def work_chunks(line_count, repeat, chunk_size):
+    """
+    把 (行, 第几轮重复) 工作单元按 chunk_size 行切成小块 (第几轮重复, 起始行, 结束行)，
+    每轮重复依次覆盖全部行。
+    """
+    for j in range(int(repeat)):
+        for start_index in range(0, line_count, chunk_size):
+            yield j, start_index, min(start_index + chunk_size, line_count)
+
+
+def send_stats_stealing(redis_info, speed_info, repeat, work_queue, barrier, templates, queue_list, results,
+                        batch_size=1, batch_latency=0.05, rate_limiter=None, reporter=None, metrics=None,
+                        backpressure=None, fanout=None, failure=None):
+    """
+    工作窃取发送线程：所有线程从同一个 work_queue 取小块 (第几轮重复, 起始行, 结束行)，发完一块再取下一块，
+    先空闲的线程自然多分担，不会因为静态分块里大消息扎堆而拖长整次运行。取到 None 结束；
+    取到 _GROUP_END 时 flush 批量缓冲后在 barrier 上等齐其他线程，组间间隔从整组发完开始计算。
+
+    templates/queue_list 是全部行共享的模板和目标队列，结果（各队列计数、块数、条数、忙碌秒数）写入 results[线程名]。
+    发送出错时把异常记到共享的 failure（SenderFailure）后退出；其他线程发现 failure 已置位也随即退出。
+    """
+    sender = BatchedSender(redis_info, batch_size, batch_latency, metrics)
+    current_thread_name = threading.current_thread().name
+    buffer = bytearray()
+    chunks = messages = 0
+    busy = 0.0
+    try:
+        while True:
+            chunk = work_queue.get()
+            try:
+                if chunk is None or (failure is not None and failure.is_set()):
+                    break
+                if chunk is _GROUP_END:
+                    sender.flush()
+                    try:
+                        barrier.wait()
+                    except threading.BrokenBarrierError:
+                        pass
+                    continue
+                started = time.monotonic()
+                j, start_index, end_index = chunk
+                for index in range(start_index, end_index):
+                    send_template(sender, templates[index], queue_list[index], index + 1, current_thread_name,
+                                  rate_limiter, reporter, backpressure, fanout, buffer)
+                    if rate_limiter is None and (speed_info != "0" or j != int(repeat) - 1):
+                        time.sleep(float(speed_info))
+                chunks += 1
+                messages += end_index - start_index
+                busy += time.monotonic() - started
+            finally:
+                work_queue.task_done()
+        sender.close()
+    except Exception as e:
+        # 本线程异常退出时打断 barrier，避免其他线程在组结束处一直等它
+        barrier.abort()
+        sender.close(flush=False)
+        if failure is None:
+            raise
+        print("error", f"发送线程[{current_thread_name}]异常退出：{e!r}")
+        failure.set(e)
+    finally:
+        print_send_counts(sender.counts)
+        results[current_thread_name] = {"counts": sender.counts, "chunks": chunks, "messages": messages, "busy": busy}
+    return sender.counts
+
+
+def simulate_work_stealing(redis_cli, repeated, speed, group_message_intervals, total_group_message, lines,
+                           queue_list, message_bytes_list, threads, chunk_size, **send_options):
+    """
+    以工作窃取方式发送：按 work_chunks 把每组的工作切块放进共享队列，threads 个发送线程动态领取。
+    结束时输出每个线程的块数、条数、忙碌和空闲时间（空闲 = 运行时间 - 组间间隔 - 忙碌），
+    以及理想耗时（全部忙碌时间 / 线程数）供对比。任一发送线程异常退出时停止投放，等其余线程退出后抛出该异常。
+    """
+    templates = [get_message_template(line) if line is not None else MessageTemplate.from_frame(frame)
+                 for line, frame in zip(lines, message_bytes_list)]
+    threads = int(threads)
+    work_queue = queue.Queue()
+    barrier = threading.Barrier(threads)
+    results = {}
+    failure = SenderFailure()
+    senders = [threading.Thread(target=send_stats_stealing,
+                                args=(redis_cli, speed, repeated, work_queue, barrier, templates, queue_list, results),
+                                kwargs=dict(send_options, failure=failure), name=f"Sender-{i + 1}")
+               for i in range(threads)]
+    begin = time.monotonic()
+    paused = 0.0
+    [sender.start() for sender in senders]
+    try:
+        for group in range(int(total_group_message)):
+            for chunk in work_chunks(len(templates), repeated, int(chunk_size)):
+                put_unless_failed(work_queue, chunk, failure)
+            if group_message_intervals != "0" or group != int(total_group_message) - 1:
+                for _ in senders:
+                    put_unless_failed(work_queue, _GROUP_END, failure)
+                join_unless_failed(work_queue, failure)
+                pause_start = time.monotonic()
+                time.sleep(float(group_message_intervals))
+                paused += time.monotonic() - pause_start
+    finally:
+        stop_senders(work_queue, senders, failure)
+    failure.raise_if_set()
+    wall = time.monotonic() - begin - paused
+    report_work_stealing(results, wall, threads)
+    return results
+
+
+def report_work_stealing(results, wall, threads):
+    total_busy = sum(result["busy"] for result in results.values())
+    print("info", f"工作窃取：共{sum(result['chunks'] for result in results.values())}块/"
+                  f"{sum(result['messages'] for result in results.values())}条，发送耗时{wall:.2f}秒（不含组间间隔），"
+                  f"理想耗时{total_busy / threads if threads else 0:.2f}秒（总忙碌{total_busy:.2f}秒/{threads}线程）")
+    for name, result in sorted(results.items()):
+        idle = max(0.0, wall - result["busy"])
+        print("info", f"线程[{name}]：处理{result['chunks']}块/{result['messages']}条，忙碌{result['busy']:.2f}秒，"
+                      f"空闲{idle:.2f}秒（{idle / wall * 100 if wall > 0 else 0:.1f}%）")
+
+
+def print_send_counts(counts):
     print("info",
-          rf"消息发送完成，本次ServerToOrchCfg队列共发送消息{config_count}条，ServerToOrchSta队列共发送消息{stats_count}条，ServerToOrchReply队列共发送消息{reply_count}条")
+          rf"消息发送完成，本次ServerToOrchCfg队列共发送消息{counts.get(configQueue, 0)}条，ServerToOrchSta队列共发送消息{counts.get(statsQueue, 0)}条，ServerToOrchReply队列共发送消息{counts.get(replyQueue, 0)}条")
 
 
 def simulate_message_quickly_main(orch_env, messages, repeated=1, speed=0, threads=1, group_message_intervals=1,
-                                  total_group_message=1):
+                                  total_group_message=1, metrics_port=None, metrics_file=None, metrics_interval=1.0):
     if read_orch_config is None:
         raise RuntimeError(
             "read_orch_config import failed. If you want to use simulate_message_quickly_main(), "
@@ -151,9 +386,8 @@ def simulate_message_quickly_main(orch_env, messages, repeated=1, speed=0, threa
     redis_info = {"ip": orch_info['proto_redis']['ip'], "port": orch_info['proto_redis']['port'],
                   "password": orch_info['proto_redis']['password'], "db": orch_info['proto_redis']['db']}
     if orch_env =='autotest_zone2':
-        redis_master = get_master_address(redis_info, 'mymaster')
-        print(redis_master)
-        redis_info = eval(str(redis_master))
+        # 经 Sentinel 连接并跟随主从切换，代替启动时只解析一次 get_master_address
+        redis_info["master_name"] = 'mymaster'
     print(redis_info)
     redis_cli = redis_connect(redis_info)
     # 根据部署方式选择不同的处理函数
@@ -185,40 +419,320 @@ def simulate_message_quickly_main(orch_env, messages, repeated=1, speed=0, threa
         message_bytes_list_list.append(sub_message_bytes)
     argvs_list = [redis_cli_list, repeated_list, speed_list, group_interval_list, group_total_list, lines_list_list,
                   queue_list_list, message_bytes_list_list, start_line_nums]
-    my_thread_multi_argvs(send_stats, argvs_list)
+    reporter = ProgressReporter()
+    metrics = start_metrics(metrics_port, metrics_file, metrics_interval)
+    my_thread_multi_argvs(partial(send_stats, reporter=reporter, metrics=metrics), argvs_list)
+    reporter.close()
+    if metrics is not None:
+        metrics.close()
+    report_connection(redis_cli)
+
+
+def prepare_messages(messages, orch_deploy, encode_processes=1):
+    """
+    按部署方式解析消息模板，返回 (lines_list, queue_list, message_bytes_list)。
+    messages 可以是 .lwpack 路径/对象（由 lwpack.py 预编译，mmap 加载），也可以是消息模板文本。
+    """
+    if is_lwpack(messages):
+        return load_lwpack(messages, orch_deploy)
+    return handle_stats(messages, orch_deploy, encode_processes)
+
+
+def shard_ranges(total, shards):
+    """
+    把 total 行按连续块切成 shards 份，返回 [(start, end), ...]，前 total % shards 份各多 1 行。
+    """
+    ranges = []
+    per_shard, extra = divmod(total, int(shards))
+    start = 0
+    for i in range(int(shards)):
+        end = start + per_shard + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
 
 
-def simulate_message_quickly_jenkins(repeated, speed, redis_info, messages, threads, group_message_intervals, total_group_message,orch_deploy):
+def simulate_message_quickly_jenkins(repeated, speed, redis_info, messages, threads, group_message_intervals, total_group_message,orch_deploy,
+                                     encode_processes=1, batch_size=1, batch_latency=0.05, rate=None, burst=None,
+                                     rate_unit="msgs", progress_interval=10, trace_sample=0, metrics_port=None,
+                                     metrics_file=None, metrics_interval=1.0, high_water=None, low_water=None,
+                                     depth_poll_interval=0.1, depth_monitor=None, depth_monitor_interval=0.05,
+                                     fanout_orch_ids=None, fanout_customer_ids=None, fanout_client_ids=None,
+                                     chunk_size=0):
+    """
+    :param chunk_size: 工作窃取的块大小（行数）：>0 时各线程从共享队列动态领取 (行, 第几轮重复) 小块，
+                       结束时输出各线程空闲时间；默认 0 按原来的静态连续分块，每个线程固定一段行。
+    :param rate: 全局目标速率（条/秒，rate_unit="bytes" 时为字节/秒），所有线程共享一个令牌桶，
+                 设置后替代 speed 的逐条 sleep（组间间隔仍然生效）。
+    :param burst: 令牌桶容量，默认 rate/100。
+    :param progress_interval: 每隔多少秒输出一行吞吐汇总（<=0 时只在结束时输出一次）。
+    :param trace_sample: 每多少条抽样输出一次逐条发送明细，0 表示不输出。
+    :param metrics_port: 指定后在该端口提供 Prometheus 格式的 /metrics（速率、各队列计数、LPUSH 延迟分位数）。
+    :param metrics_file: 指定后每 metrics_interval 秒向该文件追加一行 JSON 指标快照。
+    :param high_water: 闭环背压的高水位：每 depth_poll_interval 秒 LLEN 一次目标队列，超过即暂停发往该队列，
+                       回落到 low_water（默认 high_water/2）以下恢复。
+    :param depth_monitor: 指定 CSV 路径后每 depth_monitor_interval 秒记录一次全部 orch 队列深度，
+                          结束时输出各队列的消费速率和积压开始时间。
+    :param fanout_client_ids: 多 CPE 扇出的 clientId 范围（如 "1-100000"），fanout_orch_ids / fanout_customer_ids 同理；
+                              每条消息按各范围的笛卡尔积只改写头部 id 后分别发送，未指定的 id 保留原值。
+    """
     redis_info = eval(str(redis_info))
     redis_cli = redis_connect(redis_info)
-    if 'allInOne' in orch_deploy:
-        lines, queueName_list, message_bytes_list = handle_stats_allinone(messages)
+    lines, queueName_list, message_bytes_list = prepare_messages(messages, orch_deploy, encode_processes)
+    rate_limiter = RateLimiter(rate, burst, rate_unit) if rate else None
+    reporter = ProgressReporter(progress_interval, trace_sample)
+    # 队列深度记录器按 LPUSH 成功后的计数算写入速率，不用 reporter 在限速/背压/攒批之前的计数
+    metrics = start_metrics(metrics_port, metrics_file, metrics_interval, force=bool(depth_monitor))
+    backpressure = QueueBackpressure(redis_cli, queueName_list, high_water, low_water,
+                                     depth_poll_interval) if high_water else None
+    monitor = QueueDepthMonitor(redis_cli, metrics.sent_counts, depth_monitor,
+                                depth_monitor_interval) if depth_monitor else None
+    fanout = None
+    if fanout_orch_ids or fanout_customer_ids or fanout_client_ids:
+        fanout = HeaderFanout(*(parse_id_range(ids) if ids else None
+                                for ids in (fanout_orch_ids, fanout_customer_ids, fanout_client_ids)))
+    send_options = dict(batch_size=batch_size, batch_latency=batch_latency, rate_limiter=rate_limiter,
+                        reporter=reporter, metrics=metrics, backpressure=backpressure, fanout=fanout)
+    if int(chunk_size) > 0:
+        simulate_work_stealing(redis_cli, repeated, speed, group_message_intervals, total_group_message, lines,
+                               queueName_list, message_bytes_list, threads, chunk_size, **send_options)
     else:
-        lines, queueName_list, message_bytes_list = handle_stats_patch(messages)
-    start_line_nums = []
-    lines_per_thread = len(lines) // int(threads)
-    extra_lines = len(lines) % int(threads)
-    start_index = 0
-    redis_cli_list, repeated_list, speed_list, group_interval_list, group_total_list, lines_list_list, queue_list_list, message_bytes_list_list = [], [], [], [], [], [], [], []
+        start_line_nums = []
+        redis_cli_list, repeated_list, speed_list, group_interval_list, group_total_list, lines_list_list, queue_list_list, message_bytes_list_list = [], [], [], [], [], [], [], []
+        for start_index, end_index in shard_ranges(len(lines), threads):
+            start_line_nums.append(start_index + 1)
+            redis_cli_list.append(redis_cli)
+            repeated_list.append(repeated)
+            speed_list.append(speed)
+            group_interval_list.append(group_message_intervals)
+            group_total_list.append(total_group_message)
+            lines_list_list.append(lines[start_index:end_index])
+            queue_list_list.append(queueName_list[start_index:end_index])
+            message_bytes_list_list.append(message_bytes_list[start_index:end_index])
+        argvs_list = [redis_cli_list, repeated_list, speed_list, group_interval_list, group_total_list,
+                      lines_list_list, queue_list_list, message_bytes_list_list, start_line_nums]
+        my_thread_multi_argvs(partial(send_stats, **send_options), argvs_list)
+    reporter.close()
+    if monitor is not None:
+        monitor.close()
+        monitor.report()
+    if backpressure is not None:
+        backpressure.close()
+        backpressure.report()
+    if metrics is not None:
+        metrics.close()
+    report_connection(redis_cli)
+    if rate_limiter is not None:
+        rate_limiter.report()
+
+
+def _simulate_shard(shard):
+    """
+    多进程模式的 worker：在独立进程里用自己的 Redis 连接池，以 threads 个线程发送分到的连续行块，
+    返回本进程各队列计数与耗时。必须是模块级函数（Windows 下 spawn 需要 pickle）。
+    """
+    redis_info, repeated, speed, group_message_intervals, total_group_message, source, start, end, threads, \
+        options = shard
+    if is_lwpack(source):
+        # .lwpack 由每个 worker 自己 mmap，只传路径和行号范围
+        _, queue_list, message_bytes_list = load_lwpack(source)
+        queue_list, message_bytes_list = queue_list[start:end], message_bytes_list[start:end]
+    else:
+        queue_list, message_bytes_list = source
+    redis_cli = redis_connect(redis_info)
+    rate_limiter = RateLimiter(options["rate"], options["burst"], options["rate_unit"]) if options["rate"] else None
+    reporter = ProgressReporter(options["progress_interval"], options["trace_sample"], name=f"进程{os.getpid()}")
+    backpressure = QueueBackpressure(redis_cli, queue_list, options["high_water"], options["low_water"],
+                                     options["depth_poll_interval"]) if options["high_water"] else None
+    results = []
+
+    def run(sub_start, sub_end):
+        results.append(send_stats(redis_cli, repeated, speed, group_message_intervals, total_group_message,
+                                  [None] * (sub_end - sub_start), queue_list[sub_start:sub_end],
+                                  message_bytes_list[sub_start:sub_end], start + sub_start + 1,
+                                  batch_size=options["batch_size"], batch_latency=options["batch_latency"],
+                                  rate_limiter=rate_limiter, reporter=reporter, backpressure=backpressure))
+
+    begin = time.monotonic()
+    workers = [threading.Thread(target=run, args=sub_range)
+               for sub_range in shard_ranges(len(queue_list), threads)]
+    [worker.start() for worker in workers]
+    [worker.join() for worker in workers]
+    reporter.close()
+    if backpressure is not None:
+        backpressure.close()
+    report_connection(redis_cli)
+    counts = {}
+    for result in results:
+        for queue_name, count in result.items():
+            counts[queue_name] = counts.get(queue_name, 0) + count
+    return {"pid": os.getpid(), "counts": counts, "elapsed": time.monotonic() - begin}
+
+
+def simulate_message_multiprocess_jenkins(repeated, speed, redis_info, messages, threads, group_message_intervals,
+                                          total_group_message, orch_deploy, processes, encode_processes=1,
+                                          batch_size=1, batch_latency=0.05, rate=None, burst=None, rate_unit="msgs",
+                                          progress_interval=10, trace_sample=0, high_water=None, low_water=None,
+                                          depth_poll_interval=0.1):
+    """
+    多进程分片模式：协调进程解析并切分语料，启动 processes 个 worker 进程（各自独立的 Redis 连接池、
+    各自 threads 个发送线程），绕开单进程 GIL；结束后合并各进程的队列计数和吞吐，输出一份汇总报告。
+
+    :param rate: 全局目标速率，平均分给各进程（每个进程 rate/processes）。
+    :param high_water: 闭环背压高水位，各进程各自轮询队列深度，超过即暂停（见 simulate_message_quickly_jenkins）。
+    """
+    redis_info = eval(str(redis_info))
+    processes = int(processes)
+    if is_lwpack(messages):
+        total = len(load_lwpack(messages, orch_deploy)[1])
+    else:
+        _, queueName_list, message_bytes_list = prepare_messages(messages, orch_deploy, encode_processes)
+        total = len(queueName_list)
+    options = {"batch_size": batch_size, "batch_latency": batch_latency,
+               "rate": float(rate) / processes if rate else None,
+               "burst": float(burst) / processes if burst else None, "rate_unit": rate_unit,
+               "progress_interval": progress_interval, "trace_sample": trace_sample, "high_water": high_water,
+               "low_water": low_water, "depth_poll_interval": depth_poll_interval}
+    shards = []
+    for start, end in shard_ranges(total, processes):
+        source = messages if is_lwpack(messages) else (queueName_list[start:end], message_bytes_list[start:end])
+        shards.append((redis_info, repeated, speed, group_message_intervals, total_group_message, source, start, end,
+                       threads, options))
+    begin = time.monotonic()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        results = list(pool.map(_simulate_shard, shards))
+    elapsed = time.monotonic() - begin
+    totals = {}
+    for result in results:
+        sent = sum(result["counts"].values())
+        print("info", f"进程[{result['pid']}]：共发送消息{sent}条，耗时{result['elapsed']:.2f}秒，"
+                      f"吞吐{sent / result['elapsed'] if result['elapsed'] else 0:.1f}条/秒")
+        for queue_name, count in result["counts"].items():
+            totals[queue_name] = totals.get(queue_name, 0) + count
+    sent = sum(totals.values())
+    print("info", f"多进程汇总：{processes}个进程共发送消息{sent}条，耗时{elapsed:.2f}秒，"
+                  f"总吞吐{sent / elapsed if elapsed else 0:.1f}条/秒")
+    print_send_counts(totals)
+    return totals
+
+
+def iter_message_records(message_file, orch_deploy):
+    """
+    流式读取消息模板文件：逐行读取、解析、编码，惰性产出 (行号, 队列名, 帧, 模板)，
+    不会把整个文件或全部编码结果同时放进内存。patch 部署时每行产出两条（第二条固定发往 ServerToOrchCfg）。
+    """
+    num = 0
+    router = QueueRouter(orch_deploy)
+    with open(message_file, "r") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            template = MessageTemplate(line)
+            for queue_name in router.route(template.header["mtype"], line):
+                num += 1
+                yield num, queue_name, template
+
+
+def send_stats_streaming(redis_info, speed_info, record_queue, batch_size=1, batch_latency=0.05, rate_limiter=None,
+                         reporter=None, metrics=None, backpressure=None, failure=None):
+    """
+    流式发送线程：从有界队列中取记录发送，直到取到 None。
+    发送出错时把异常记到共享的 failure（SenderFailure）后退出；其他线程发现 failure 已置位也随即退出。
+    """
+    sender = BatchedSender(redis_info, batch_size, batch_latency, metrics)
+    current_thread_name = threading.current_thread().name
+    try:
+        while True:
+            record = record_queue.get()
+            try:
+                if record is None or (failure is not None and failure.is_set()):
+                    break
+                num, queue_name, template = record
+                current_timestamp = int(round(time.time(), 6) * 1000000)
+                message_bytes = template.stamp(current_timestamp)
+                if reporter is not None and reporter.record(current_thread_name, queue_name, len(message_bytes)):
+                    reporter.trace(current_thread_name, num, template, current_timestamp)
+                if rate_limiter is not None:
+                    rate_limiter.acquire(1 if rate_limiter.unit == "msgs" else len(message_bytes))
+                if backpressure is not None:
+                    backpressure.wait(queue_name)
+                sender.send(queue_name, message_bytes)
+            finally:
+                record_queue.task_done()
+            if rate_limiter is None and speed_info != "0":
+                time.sleep(float(speed_info))
+        sender.close()
+    except Exception as e:
+        sender.close(flush=False)
+        if failure is None:
+            raise
+        print("error", f"发送线程[{current_thread_name}]异常退出：{e!r}")
+        failure.set(e)
+    print_send_counts(sender.counts)
+
+
+def simulate_message_streaming_jenkins(repeated, speed, redis_info, message_file, threads, group_message_intervals,
+                                       total_group_message, orch_deploy, queue_size=1000, batch_size=1,
+                                       batch_latency=0.05, rate=None, burst=None, rate_unit="msgs",
+                                       progress_interval=10, trace_sample=0, metrics_port=None, metrics_file=None,
+                                       metrics_interval=1.0, high_water=None, low_water=None, depth_poll_interval=0.1,
+                                       depth_monitor=None, depth_monitor_interval=0.05):
+    """
+    内存有界的流式发送：一个读取线程边读文件边编码，发送线程经有界队列拉取，
+    峰值内存只与 queue_size 有关，与模板文件大小无关。每一轮重复/每一组都会重新顺序读取文件。
+
+    :param message_file: 消息模板文件路径（不是文件内容）。
+    :param queue_size: 读取线程与发送线程之间的队列长度上限。
+    :param batch_size: 每个发送线程攒多少条后批量 LPUSH（1 表示逐条发送）。
+    :param batch_latency: 批量模式下一条消息最多等待多少秒就必须发出。
+    :param rate: 全局目标速率（条/秒或字节/秒，见 rate_unit），设置后替代 speed 的逐条 sleep。
+    :param burst: 令牌桶容量，默认 rate/100。
+    """
+    redis_info = eval(str(redis_info))
+    redis_cli = redis_connect(redis_info)
+    rate_limiter = RateLimiter(rate, burst, rate_unit) if rate else None
+    reporter = ProgressReporter(progress_interval, trace_sample)
+    metrics = start_metrics(metrics_port, metrics_file, metrics_interval, force=bool(depth_monitor))
+    # 流式模式事先不知道会用到哪些队列，按三个主队列轮询
+    backpressure = QueueBackpressure(redis_cli, [configQueue, statsQueue, replyQueue], high_water, low_water,
+                                     depth_poll_interval) if high_water else None
+    monitor = QueueDepthMonitor(redis_cli, metrics.sent_counts, depth_monitor,
+                                depth_monitor_interval) if depth_monitor else None
+    record_queue = queue.Queue(maxsize=int(queue_size))
+    failure = SenderFailure()
+    senders = []
     for i in range(int(threads)):
-        end_index = start_index + lines_per_thread + (1 if i < extra_lines else 0)
-        sub_lines = lines[start_index:end_index]
-        sub_queue_list = queueName_list[start_index:end_index]
-        sub_message_bytes = message_bytes_list[start_index:end_index]
-        start_line_num = start_index + 1
-        start_line_nums.append(start_line_num)
-        start_index = end_index
-        redis_cli_list.append(redis_cli)
-        repeated_list.append(repeated)
-        speed_list.append(speed)
-        group_interval_list.append(group_message_intervals)
-        group_total_list.append(total_group_message)
-        lines_list_list.append(sub_lines)
-        queue_list_list.append(sub_queue_list)
-        message_bytes_list_list.append(sub_message_bytes)
-    argvs_list = [redis_cli_list, repeated_list, speed_list, group_interval_list, group_total_list, lines_list_list,
-                  queue_list_list, message_bytes_list_list, start_line_nums]
-    my_thread_multi_argvs(send_stats, argvs_list)
+        t = threading.Thread(target=send_stats_streaming, args=(redis_cli, speed, record_queue, batch_size,
+                                                                batch_latency, rate_limiter, reporter, metrics,
+                                                                backpressure, failure))
+        senders.append(t)
+        t.start()
+    try:
+        for group in range(int(total_group_message)):
+            for j in range(int(repeated)):
+                for record in iter_message_records(message_file, orch_deploy):
+                    put_unless_failed(record_queue, record, failure)
+            if group_message_intervals != "0" or group != int(total_group_message) - 1:
+                # 等本组全部发完再计组间间隔
+                join_unless_failed(record_queue, failure)
+                time.sleep(float(group_message_intervals))
+    finally:
+        stop_senders(record_queue, senders, failure)
+        reporter.close()
+        if metrics is not None:
+            metrics.close()
+        if backpressure is not None:
+            backpressure.close()
+            backpressure.report()
+        if monitor is not None:
+            monitor.close()
+            monitor.report()
+        report_connection(redis_cli)
+    # 发送线程在最后一组的 put 全部完成之后才失败时，也要把异常交给调用方
+    failure.raise_if_set()
+    if rate_limiter is not None:
+        rate_limiter.report()
 
 
 def simulate_message_quickly_jenkins_bak(repeated, speed, redis_info, messages, threads, group_message_intervals, total_group_message):
@@ -1,11 +1,28 @@
 #!/usr/bin/env python
 # coding=utf8
-import sys
-from message_common_simulate import simulate_message_quickly_jenkins
+import argparse
+from message_common_simulate import simulate_message_quickly_jenkins, simulate_message_streaming_jenkins, \
+    simulate_message_multiprocess_jenkins
+from message_async_simulate import simulate_message_async_jenkins
+from lwpack import is_lwpack
 
-def simulate_main(repeated, speed, redis_info, messages, threads, group_message_intervals, total_group_message, requirement,orch_deploy):
+def simulate_main(repeated, speed, redis_info, messages, threads, group_message_intervals, total_group_message, requirement,orch_deploy,
+                  encode_processes=1, batch_size=1, batch_latency=0.05, rate=None, burst=None, rate_unit="msgs",
+                  progress_interval=10, trace_sample=0, metrics_port=None, metrics_file=None, metrics_interval=1.0,
+                  high_water=None, low_water=None, depth_poll_interval=0.1, depth_monitor=None,
+                  depth_monitor_interval=0.05, fanout_orch_ids=None, fanout_customer_ids=None, fanout_client_ids=None,
+                  chunk_size=0):
     simulate_message_quickly_jenkins(repeated, speed, redis_info, messages, threads,
-                                                                      group_message_intervals, total_group_message,orch_deploy)
+                                                                      group_message_intervals, total_group_message,orch_deploy,
+                                     encode_processes=encode_processes, batch_size=batch_size,
+                                     batch_latency=batch_latency, rate=rate, burst=burst, rate_unit=rate_unit,
+                                     progress_interval=progress_interval, trace_sample=trace_sample,
+                                     metrics_port=metrics_port, metrics_file=metrics_file,
+                                     metrics_interval=metrics_interval, high_water=high_water, low_water=low_water,
+                                     depth_poll_interval=depth_poll_interval, depth_monitor=depth_monitor,
+                                     depth_monitor_interval=depth_monitor_interval, fanout_orch_ids=fanout_orch_ids,
+                                     fanout_customer_ids=fanout_customer_ids, fanout_client_ids=fanout_client_ids,
+                                     chunk_size=chunk_size)
 
 
 def simulate_and_check_main():
@@ -13,18 +30,127 @@ def simulate_and_check_main():
 
 
 if __name__ == '__main__':
-    repeated = sys.argv[1]  # 每条消息重复发送次数
-    speed = sys.argv[2]  # 每条消息发送的间隔时间，单位秒
-    redis_info = sys.argv[3]  # redis连接信息
-    message = sys.argv[4]  # 消息发送的模板
-    with open(message,"r") as f:
-        messages = f.read()
-    threads = sys.argv[5]  # 多线程的个数
-    group_message_intervals = sys.argv[6]  # 第一组和第二组的时间间隔
-    total_group_message = sys.argv[7]  # 总的消息组数
-    requirement = sys.argv[8]  # 要求：填correctly或者quickly
-    orch_deploy = sys.argv[9]
-    simulate_main(repeated, speed, redis_info, messages, threads, group_message_intervals, total_group_message, requirement,orch_deploy)
-
-
+    ap = argparse.ArgumentParser(description='Proto Redis 消息注入工具（jenkins 风格参数）')
+    ap.add_argument('repeated', help='每条消息重复发送次数')
+    ap.add_argument('speed', help='每条消息发送的间隔时间，单位秒')
+    ap.add_argument('redis_info', help="redis连接信息，形如 \"{'ip':'x.x.x.x','port':'6380','password':'xxx','db':'0'}\"")
+    ap.add_argument('message', help='消息发送的模板，或 lwpack.py 编译出的 .lwpack 文件')
+    ap.add_argument('threads', help='多线程的个数')
+    ap.add_argument('group_message_intervals', help='第一组和第二组的时间间隔')
+    ap.add_argument('total_group_message', help='总的消息组数')
+    ap.add_argument('requirement', help='要求：填correctly或者quickly')
+    ap.add_argument('orch_deploy', help='包含 allInOne 时走 all-in-one 处理，否则走 patch 处理')
+    ap.add_argument('--stream', default=False, action='store_true',
+                    help='流式读取模板文件并经有界队列发送，内存占用与文件大小无关（不支持 .lwpack）')
+    ap.add_argument('--stream-queue-size', type=int, default=1000, metavar='<n>',
+                    help='流式模式下读取线程与发送线程之间的队列长度（默认 1000）')
+    ap.add_argument('--encode-processes', type=int, default=1, metavar='<n>',
+                    help='启动时用多少个进程并行解析/编码模板文本（默认 1，即不启用进程池）')
+    ap.add_argument('--batch-size', type=int, default=1, metavar='<n>',
+                    help='每个线程攒多少条消息后按队列合并成多值 LPUSH 经 pipeline 发送（默认 1，逐条发送）')
+    ap.add_argument('--batch-latency', type=float, default=0.05, metavar='<secs>',
+                    help='批量模式下消息最长等待时间，超时即发送（默认 0.05）')
+    ap.add_argument('--rate', type=float, metavar='<n>',
+                    help='全局目标发送速率（所有线程共享的令牌桶），设置后替代 speed 的逐条 sleep')
+    ap.add_argument('--burst', type=float, metavar='<n>',
+                    help='令牌桶容量（默认 rate/100）')
+    ap.add_argument('--rate-unit', choices=['msgs', 'bytes'], default='msgs',
+                    help='--rate 的单位：msgs 为条/秒，bytes 为字节/秒（默认 msgs）')
+    ap.add_argument('--engine', choices=['threads', 'asyncio'], default='threads',
+                    help='发送引擎：threads 为每个分片一个线程；asyncio 为 threads 个协程共享 redis.asyncio 连接池')
+    ap.add_argument('--pool-size', type=int, metavar='<n>',
+                    help='asyncio 引擎的连接池上限（默认等于 threads）')
+    ap.add_argument('--processes', type=int, default=1, metavar='<n>',
+                    help='多进程分片：把消息切成 n 份交给 n 个进程（各自 threads 个线程）发送并汇总计数（默认 1）')
+    ap.add_argument('--progress-interval', type=float, default=10, metavar='<secs>',
+                    help='每隔多少秒输出一行吞吐汇总（按线程/队列计数，默认 10；0 表示只在结束时输出）')
+    ap.add_argument('--trace-sample', type=int, default=0, metavar='<n>',
+                    help='每 n 条消息抽样输出一次逐条发送明细（默认 0，不输出）')
+    ap.add_argument('--metrics-port', type=int, metavar='<port>',
+                    help='在该端口提供 Prometheus 格式的 /metrics：发送速率、各队列计数、LPUSH/pipeline 延迟 p50/p99/p999')
+    ap.add_argument('--metrics-file', metavar='<path>',
+                    help='每隔 --metrics-interval 秒向该文件追加一行 JSON 指标快照')
+    ap.add_argument('--metrics-interval', type=float, default=1.0, metavar='<secs>',
+                    help='JSON 指标快照的间隔（默认 1）')
+    ap.add_argument('--high-water', type=int, metavar='<n>',
+                    help='闭环背压：目标队列 LLEN 超过 n 时暂停发往该队列，回落到 --low-water 以下恢复')
+    ap.add_argument('--low-water', type=int, metavar='<n>',
+                    help='背压恢复发送的队列深度（默认 high-water/2）')
+    ap.add_argument('--depth-poll-interval', type=float, default=0.1, metavar='<secs>',
+                    help='背压模式下轮询队列深度的间隔（默认 0.1）')
+    ap.add_argument('--depth-monitor', metavar='<csv>',
+                    help='高频记录全部 orch 队列（含 _SM）深度到 CSV，结束时输出各队列消费速率与积压开始时间')
+    ap.add_argument('--depth-monitor-interval', type=float, default=0.05, metavar='<secs>',
+                    help='队列深度采样间隔（默认 0.05）')
+    ap.add_argument('--fanout-clients', metavar='<ids>',
+                    help='多 CPE 扇出：每条消息按 clientId 范围（如 1-100000 或 1,3,5-9）只改写头部后分别发送')
+    ap.add_argument('--fanout-customers', metavar='<ids>', help='扇出的 customerId 范围，与 --fanout-clients 组合')
+    ap.add_argument('--fanout-orchs', metavar='<ids>', help='扇出的 orchId 范围，与 --fanout-clients 组合')
+    ap.add_argument('--chunk-size', type=int, default=0, metavar='<n>',
+                    help='工作窃取：各线程从共享队列每次领取 n 行（如 16）；默认 0 按原来的静态连续分块')
+    args = ap.parse_args()
+    fanout = args.fanout_clients or args.fanout_customers or args.fanout_orchs
+    if fanout and (args.stream or args.processes > 1 or args.engine == 'asyncio'):
+        ap.error('--fanout-* options are only supported by the default threads engine.')
+    if args.processes > 1 and (args.metrics_port or args.metrics_file or args.depth_monitor):
+        ap.error('--metrics-port/--metrics-file/--depth-monitor are not supported together with --processes.')
+    if args.stream and (args.engine == 'asyncio' or args.processes > 1):
+        ap.error('--stream is only supported by the default threads engine in a single process.')
+    if args.stream and args.encode_processes > 1:
+        ap.error('--encode-processes is not supported together with --stream, lines are encoded as they are read.')
 
+    if args.stream:
+        if is_lwpack(args.message):
+            ap.error('--stream expects a message text file, .lwpack files are already mmap-loaded.')
+        simulate_message_streaming_jenkins(args.repeated, args.speed, args.redis_info, args.message, args.threads,
+                                           args.group_message_intervals, args.total_group_message, args.orch_deploy,
+                                           queue_size=args.stream_queue_size, batch_size=args.batch_size,
+                                           batch_latency=args.batch_latency, rate=args.rate, burst=args.burst,
+                                           rate_unit=args.rate_unit, progress_interval=args.progress_interval,
+                                           trace_sample=args.trace_sample, metrics_port=args.metrics_port,
+                                           metrics_file=args.metrics_file, metrics_interval=args.metrics_interval,
+                                           high_water=args.high_water, low_water=args.low_water,
+                                           depth_poll_interval=args.depth_poll_interval,
+                                           depth_monitor=args.depth_monitor,
+                                           depth_monitor_interval=args.depth_monitor_interval)
+    else:
+        if is_lwpack(args.message):
+            messages = args.message
+        else:
+            with open(args.message,"r") as f:
+                messages = f.read()
+        if args.processes > 1:
+            simulate_message_multiprocess_jenkins(args.repeated, args.speed, args.redis_info, messages, args.threads,
+                                                  args.group_message_intervals, args.total_group_message,
+                                                  args.orch_deploy, args.processes,
+                                                  encode_processes=args.encode_processes, batch_size=args.batch_size,
+                                                  batch_latency=args.batch_latency, rate=args.rate, burst=args.burst,
+                                                  rate_unit=args.rate_unit, progress_interval=args.progress_interval,
+                                                  trace_sample=args.trace_sample, high_water=args.high_water,
+                                                  low_water=args.low_water,
+                                                  depth_poll_interval=args.depth_poll_interval)
+        elif args.engine == 'asyncio':
+            simulate_message_async_jenkins(args.repeated, args.speed, args.redis_info, messages, args.threads,
+                                           args.group_message_intervals, args.total_group_message, args.orch_deploy,
+                                           pool_size=args.pool_size, encode_processes=args.encode_processes,
+                                           batch_size=args.batch_size, batch_latency=args.batch_latency,
+                                           rate=args.rate, burst=args.burst,
+                                           rate_unit=args.rate_unit, progress_interval=args.progress_interval,
+                                           trace_sample=args.trace_sample, metrics_port=args.metrics_port,
+                                           metrics_file=args.metrics_file, metrics_interval=args.metrics_interval,
+                                           high_water=args.high_water, low_water=args.low_water,
+                                           depth_poll_interval=args.depth_poll_interval,
+                                           depth_monitor=args.depth_monitor,
+                                           depth_monitor_interval=args.depth_monitor_interval)
+        else:
+            simulate_main(args.repeated, args.speed, args.redis_info, messages, args.threads,
+                          args.group_message_intervals, args.total_group_message, args.requirement, args.orch_deploy,
+                          encode_processes=args.encode_processes, batch_size=args.batch_size,
+                          batch_latency=args.batch_latency, rate=args.rate, burst=args.burst, rate_unit=args.rate_unit,
+                          progress_interval=args.progress_interval, trace_sample=args.trace_sample,
+                          metrics_port=args.metrics_port, metrics_file=args.metrics_file,
+                          metrics_interval=args.metrics_interval, high_water=args.high_water,
+                          low_water=args.low_water, depth_poll_interval=args.depth_poll_interval,
+                          depth_monitor=args.depth_monitor, depth_monitor_interval=args.depth_monitor_interval,
+                          fanout_orch_ids=args.fanout_orchs, fanout_customer_ids=args.fanout_customers,
+                          fanout_client_ids=args.fanout_clients, chunk_size=args.chunk_size)
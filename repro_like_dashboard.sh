@@ -11,6 +11,13 @@
 # - 需要确保：client-id 不重复，否则 CommServer 会 override 连接，堆不出多条曲线
 #
 # 停止：运行 stop_repro.sh 或手动 pkill -f "tester.py (client|orch)"
+#
+# client 侧也可以在一个进程内完成（一个事件循环内多条连接，共享 payload 缓冲区，内存占用小得多）：
+#   ./tester.py clients 192.168.0.143:15623 --legacy --customer-id=120 --client-range 10000 10199 \
+#     --type=401 --len=200 --gap=0 --per-phase=50 --phase-interval=60
+# orch 侧同理：
+#   ./tester.py orchs 192.168.0.143:55559 --legacy --orch-range 5000 5049 --range 0 1023 0 0 0 0 \
+#     --per-phase=10 --phase-interval=60
 
 set -euo pipefail
 
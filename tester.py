@@ -12,12 +12,13 @@ import signal
 import ssl
 import argparse
 import binascii
+import functools
 
 from abc import ABC, abstractmethod
 from collections import namedtuple
 from Crypto.Cipher import DES
 from Crypto.Util.Padding import pad, unpad
-from typing import BinaryIO, Tuple, Union
+from typing import BinaryIO, Callable, List, Tuple, Union
 
 
 #
@@ -209,8 +210,12 @@ class LWMsg:
     @staticmethod
     def parse_header_v2(enchdata: bytes) -> LW_MSG_HEADER_V2:
         if len(enchdata) == LW_MSG_HEADER_V2_LEN_ENC:
-            hdata = LWMsg.decrypt(enchdata)
-            hdrv2 = LW_MSG_HEADER_V2(*LW_MSG_HEADER_V2_PACKER.unpack(hdata))
+            try:
+                hdata = LWMsg.decrypt(enchdata)
+                hdrv2 = LW_MSG_HEADER_V2(*LW_MSG_HEADER_V2_PACKER.unpack(hdata))
+            except (ValueError, struct.error) as e:
+                # bad DES padding, or a plain text of the wrong length.
+                raise BadFormatError() from e
             if hdrv2.VerMagic == MSGV2:
                 return hdrv2
         raise BadFormatError()
@@ -325,7 +330,123 @@ class LWMsgSubscribe(LWMsg):
         #json_bytes += b'\0'
         hdr = super().serialize_v3(json.__len__() if ForceLen == 0 else ForceLen)
         return hdr + json_bytes
-        
+
+
+#
+# payload buffers shared by all clients in a process. payload_seq() only depends on
+# (count, step & 0xff), so there are at most 256 distinct payloads per length, and the
+# DES encryption of a payload is deterministic (fixed key/iv), so v2 cipher text is
+# cached as well.
+#
+class LWPayloadCache:
+    def __init__(self) -> None:
+        self._seq = {}
+        self._enc = {}
+
+    def seq(self, count: int, step: int) -> bytes:
+        key = (count, step & 0xff)
+        if key not in self._seq:
+            # same bytes as payload_seq(count, step): byte n only depends on n % 256, so build
+            # one 256-byte period and repeat it.
+            msg = LWMsgClient(CustomerId=0, ClientId=0)
+            msg.payload_seq(count=min(count, 256), step=step & 0xff)
+            self._seq[key] = None if count == 0 else (msg._data * (count // 256 + 1))[:count]
+        return self._seq[key]
+
+    def encrypted(self, data: bytes) -> bytes:
+        encdata = self._enc.get(data)
+        if encdata is None:
+            encdata = self._enc[data] = LWMsg.encrypt(data) if data is not None else b''
+        return encdata
+
+
+#
+# frame generator for one client. consecutive frames only differ in TransactionId and in
+# the payload_seq() step, which is (TransactionId + 1) & 0xff, so all 256 payloads are
+# taken from the shared LWPayloadCache up front and the header is packed once. for v3,
+# each frame patches TransactionId in the header template and updates the checksum
+# incrementally (RFC 1624 eqn. 3: HC' = ~(~HC + ~m + m')) over the same native-order
+# 16-bit words header_checksum() sums. for v2, the first two DES-CBC blocks of the
+# encrypted header never change; only the last block (TransactionId + padding) is
+# encrypted again, chained from the cached second cipher block.
+#
+class LWFrameRing:
+    _NATIVE_WORDS = struct.Struct('=HH')
+    _TRANSACTION = struct.Struct('!L')
+    _TRANSACTION_OFFSET = LW_MSG_HEADER_V3_LEN - 4
+
+    def __init__(
+        self,
+        customerid: int,
+        clientid: int,
+        type: int,
+        size: int,
+        version: int=MSGV3,
+        payload_bytes: bytes=None,
+        payloads: LWPayloadCache=None
+        ) -> None:
+        payloads = LWPayloadCache() if payloads is None else payloads
+        if payload_bytes is not None:
+            ring = [payload_bytes] * 256
+        else:
+            ring = [payloads.seq(count=size, step=step) for step in range(256)]
+        if version == MSGV2:
+            ring = [payloads.encrypted(data) for data in ring]
+        self._ring = [data if data is not None else b'' for data in ring]
+        self._version = version
+        msg = LWMsgClient(Version=version, CustomerId=customerid, ClientId=clientid, Type=type, TransactionId=0)
+        if version == MSGV3:
+            self._header = bytearray(LWMsg.serialize_v3(msg, len(self._ring[0])))
+            self._words = LWFrameRing._NATIVE_WORDS.unpack_from(self._header, LWFrameRing._TRANSACTION_OFFSET)
+        elif version == MSGV2:
+            enchdata = LWMsg.serialize_v2(msg, len(self._ring[0]))
+            plain = pad(LW_MSG_HEADER_V2_PACKER.pack(*LW_MSG_HEADER_V2(
+                VerMagic=version, CustomerId=customerid, ClientId=clientid, Type=type, Len=len(self._ring[0]))),
+                DES_BLOCK_SIZE)
+            self._prefix = enchdata[: -DES_BLOCK_SIZE]
+            self._chain = int.from_bytes(enchdata[-2 * DES_BLOCK_SIZE : -DES_BLOCK_SIZE], 'big')
+            self._padding = plain[LW_MSG_HEADER_V2_LEN :]
+            self._ecb = DES.new(key=LWMsg._key, mode=DES.MODE_ECB)
+        else:
+            raise InvalidVersionError()
+
+    def header_v3(self, transaction: int) -> bytes:
+        hdr = self._header
+        LWFrameRing._TRANSACTION.pack_into(hdr, LWFrameRing._TRANSACTION_OFFSET, transaction)
+        m1, m2 = self._words
+        n1, n2 = self._words = LWFrameRing._NATIVE_WORDS.unpack_from(hdr, LWFrameRing._TRANSACTION_OFFSET)
+        s = (~(hdr[2] | hdr[3] << 8) & 0xffff) + (~m1 & 0xffff) + (~m2 & 0xffff) + n1 + n2
+        s = (s & 0xffff) + (s >> 16)
+        s = (s & 0xffff) + (s >> 16)
+        s ^= 0xffff
+        hdr[2] = s & 0xff
+        hdr[3] = s >> 8
+        return bytes(hdr)
+
+    def header_v2(self, transaction: int) -> bytes:
+        block = int.from_bytes(LWFrameRing._TRANSACTION.pack(transaction) + self._padding, 'big') ^ self._chain
+        return self._prefix + self._ecb.encrypt(block.to_bytes(DES_BLOCK_SIZE, 'big'))
+
+    def extend(self, frames: list, transaction: int, count: int) -> int:
+        # appends header and payload of 'count' frames starting at 'transaction' to 'frames',
+        # returns the number of bytes added.
+        header = self.header_v3 if self._version == MSGV3 else self.header_v2
+        ring = self._ring
+        nbytes = 0
+        for transaction in range(transaction, transaction + count):
+            hdr = header(transaction)
+            payload = ring[(transaction + 1) & 0xff]
+            frames.append(hdr)
+            frames.append(payload)
+            nbytes += len(hdr) + len(payload)
+        return nbytes
+
+    def frame(self, transaction: int) -> bytes:
+        frames = []
+        self.extend(frames, transaction, 1)
+        return b''.join(frames)
+
+
 #
 # used to launch openssl s_client to do the SSL connection. but there appears to be
 # a bug in it in that when we push too quickly into its stdin pipe, s_client could
@@ -333,26 +454,44 @@ class LWMsgSubscribe(LWMsg):
 # to pure python tester here.
 #
 class LWStream:
-    def __init__(self, host: str, ca: str, cert: str, key: str) -> None:
+    def __init__(self, host: str, ca: str, cert: str, key: str, protocol: 'LWFrameProtocol'=None) -> None:
         try:
             addr, port = host.rsplit(':', 1)
             port = int(port)
         except ValueError:
             raise ValueError('invalid server address: \'{0}\''.format(host))
         if ca is not None and cert is not None and key is not None:
-            sslctx = ssl.SSLContext()
-            sslctx.verify_mode = ssl.CERT_REQUIRED
-            sslctx.check_hostname = False
-            sslctx.load_verify_locations(ca)
-            sslctx.load_cert_chain(cert, key)
+            sslctx = LWStream.ssl_context(ca, cert, key)
         else:
             sslctx = False
         self._host = addr
         self._port = port
         self._sslctx = sslctx
+        self._protocol = protocol
+
+    # connections using the same certificate share one SSL context.
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def ssl_context(ca: str, cert: str, key: str) -> ssl.SSLContext:
+        sslctx = ssl.SSLContext()
+        sslctx.verify_mode = ssl.CERT_REQUIRED
+        sslctx.check_hostname = False
+        sslctx.load_verify_locations(ca)
+        sslctx.load_cert_chain(cert, key)
+        return sslctx
 
     # enter/exit to support 'with ... as ...' context management.
     async def __aenter__(self) -> None:
+        if self._protocol is not None:
+            # frame protocol connection: no stream reader, the protocol doubles as the writer.
+            await asyncio.get_event_loop().create_connection(
+                lambda: self._protocol,
+                host=self._host,
+                port=self._port,
+                ssl=self._sslctx
+                )
+            self.reader, self.writer = None, self._protocol
+            return self
         self.reader, self.writer = await asyncio.open_connection(
             host=self._host,
             port=self._port,
@@ -365,6 +504,141 @@ class LWStream:
         await self.writer.wait_closed()
 
 
+#
+# frame decoding protocol. the transport reads straight into one reusable receive buffer;
+# every complete v3 (or v2 if legacy) frame in it is decoded in place and the whole batch
+# is handed to on_frames() as (header, frame) pairs, where 'header' has the field order
+# of LW_MSG_HEADER_V3 (a LW_MSG_HEADER_V2 for v2) and 'frame' is a memoryview of the raw
+# header + payload. the views are only valid during the call: copy anything that has to
+# outlive it, including data passed to write() since a transport (SSL in particular) may
+# keep a reference to it. the protocol also offers the StreamWriter calls the runners use.
+#
+class LWFrameProtocol(asyncio.BufferedProtocol):
+    MIN_READ = 65536
+
+    def __init__(self, on_frames: Callable[[list], None], legacy: bool=False, bufsize: int=262144) -> None:
+        self._on_frames = on_frames
+        self._legacy = legacy
+        self._hdrlen = LW_MSG_HEADER_V2_LEN_ENC if legacy else LW_MSG_HEADER_V3_LEN
+        self._buf = bytearray(max(bufsize, self.MIN_READ))
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        # bytes the frame at '_start' needs to be complete, known once its header is in.
+        self._need = self._hdrlen
+        self._paused = False
+        self._drain_waiter = None
+        self.transport = None
+        self.closed = asyncio.get_event_loop().create_future()
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        pending = self._end - self._start
+        if len(self._buf) - self._end < self.MIN_READ or len(self._buf) - self._start < self._need:
+            size = len(self._buf)
+            if size < pending + max(self.MIN_READ, self._need - pending):
+                # never resize in place, a handler may still hold views of the old buffer.
+                size = max(size * 2, pending + self.MIN_READ, self._need + self.MIN_READ)
+                buf = bytearray(size)
+                buf[:pending] = self._view[self._start : self._end]
+                self._buf, self._view = buf, memoryview(buf)
+            else:
+                self._view[:pending] = self._view[self._start : self._end]
+            self._start, self._end = 0, pending
+        return self._view[self._end :]
+
+    def buffer_updated(self, nbytes: int) -> None:
+        self._end += nbytes
+        frames = []
+        view = self._view
+        start, end = self._start, self._end
+        error = None
+        try:
+            while end - start >= self._hdrlen:
+                if self._legacy:
+                    hdr = LWMsg.parse_header_v2(bytes(view[start : start + self._hdrlen]))
+                    size = self._hdrlen + hdr.Len
+                else:
+                    if not header_checksum_verify(view[start : start + self._hdrlen].tobytes()):
+                        raise BadFormatError()
+                    hdr = LW_MSG_HEADER_V3_PACKER.unpack_from(view, start)
+                    if hdr[0] != MSGV3:
+                        raise BadFormatError()
+                    size = self._hdrlen + hdr[7]
+                if end - start < size:
+                    self._need = size
+                    break
+                frames.append((hdr, view[start : start + size]))
+                start += size
+                self._need = self._hdrlen
+        except LWTestError as e:
+            # still hand over the good frames in front of the bad one.
+            error = e
+        self._start = start
+        try:
+            if frames:
+                self._on_frames(frames)
+        except Exception as e:
+            error = e
+        if error is not None:
+            self.transport.abort()
+            if not self.closed.done():
+                self.closed.set_exception(error)
+
+    def eof_received(self) -> bool:
+        return False
+
+    def connection_lost(self, exc: Exception) -> None:
+        if not self.closed.done():
+            if exc is None and self._end != self._start:
+                exc = asyncio.IncompleteReadError(bytes(self._view[self._start : self._end]), self._need)
+            elif exc is None:
+                exc = asyncio.IncompleteReadError(b'', self._hdrlen)
+            self.closed.set_exception(exc)
+        self._wakeup_drain(exc)
+
+    # flow control, same semantics as StreamWriter.drain().
+    def pause_writing(self) -> None:
+        self._paused = True
+
+    def resume_writing(self) -> None:
+        self._paused = False
+        self._wakeup_drain(None)
+
+    def _wakeup_drain(self, exc: Exception) -> None:
+        waiter, self._drain_waiter = self._drain_waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None) if exc is None else waiter.set_exception(exc)
+
+    def write(self, data: bytes) -> None:
+        self.transport.write(data)
+
+    def writelines(self, data: List[bytes]) -> None:
+        self.transport.writelines(data)
+
+    async def drain(self) -> None:
+        if self.transport.is_closing():
+            # let connection_lost() run first.
+            await asyncio.sleep(0)
+        if self.closed.done():
+            # re-raise why the connection went away.
+            await self.closed
+        if self._paused:
+            self._drain_waiter = asyncio.get_event_loop().create_future()
+            await self._drain_waiter
+
+    def close(self) -> None:
+        self.transport.close()
+
+    async def wait_closed(self) -> None:
+        try:
+            await self.closed
+        except (OSError, asyncio.IncompleteReadError, LWTestError):
+            pass
+
+
 #
 # TLS client socket runner abstract base class.
 #
@@ -379,33 +653,15 @@ class LWStreamRunner(ABC):
     async def _async_run(self, stream: LWStream) -> None:
         raise NotImplementedError()
 
+    # runners returning a LWFrameProtocol here get a frame protocol connection instead of streams.
+    def _protocol(self) -> LWFrameProtocol:
+        return None
+
     async def async_run(self) -> None:
-        async with LWStream(host=self._host, ca=self._ca, cert=self._cert, key=self._key) as strm:
+        async with LWStream(host=self._host, ca=self._ca, cert=self._cert, key=self._key,
+                            protocol=self._protocol()) as strm:
             await self._async_run(strm)
 
-    @staticmethod
-    async def async_readmsg_v3(stream: LWStream) -> Tuple[LWMsgClient, bytes]:
-        hdata = await stream.reader.readexactly(LW_MSG_HEADER_V3_LEN)
-        hdr = LWMsg.parse_header_v3(hdata)
-        payload = await stream.reader.readexactly(hdr.Len) if hdr.Len != 0 else b''
-        msg = LWMsgClient.deserialize(hdr, payload)
-        data = hdata + payload
-        return (msg, data)
-
-    @staticmethod
-    async def async_readmsg_v2(stream: LWStream) -> Tuple[LWMsgClient, bytes]:
-        enchdata = await stream.reader.readexactly(LW_MSG_HEADER_V2_LEN_ENC)
-        hdr = LWMsg.parse_header_v2(enchdata)
-        if hdr.Len != 0:
-            encpayload = await stream.reader.readexactly(hdr.Len)
-            payload = LWMsg.decrypt(encpayload)
-        else:
-            encpayload = b''
-            payload = None
-        msg = LWMsgClient.deserialize(hdr, payload)
-        encdata = enchdata + encpayload
-        return (msg, encdata)
-
 
 #
 # orchestrator classes.
@@ -448,7 +704,8 @@ class LWOrchEcho(LWOrch):
         cert: str=None,
         key: str=None,
         legacy: bool=False,
-        show: bool=False
+        show: bool=False,
+        queue_size: int=0
         ) -> None:
         super().__init__(id=id, host=host, ca=ca, cert=cert, key=key, legacy=legacy)
         self._msgTypestart = msgTypeStart
@@ -458,34 +715,62 @@ class LWOrchEcho(LWOrch):
         self._clientIdStart = clientIdStart
         self._clientIdEnd = clientIdEnd
         self._show = show
+        self._queue_size = queue_size
+        self.connected = False
+        self.received = 0
+        self.received_bytes = 0
+        self.echoed = 0
+        self.dropped = 0
 
     async def _async_send(self, stream: LWStream, queue: asyncio.Queue) -> None:
         while True:
             data = await queue.get()
-            if data is None: break
             stream.writer.write(data)
             await stream.writer.drain()
+            self.echoed += 1
             queue.task_done()
 
-    async def _async_recv(self, stream: LWStream, queue: asyncio.Queue) -> None:
-        while True:
-            msg, data = await LWStreamRunner.async_readmsg_v3(stream)
-            if self._show: print(msg)
+    def _protocol(self) -> LWFrameProtocol:
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        return LWFrameProtocol(self._on_frames)
+
+    def _on_frames(self, frames: list) -> None:
+        for hdr, frame in frames:
+            self.received += 1
+            self.received_bytes += len(frame)
+            if self._show:
+                print(LWMsgClient.deserialize(LW_MSG_HEADER_V3._make(hdr), bytes(frame[LW_MSG_HEADER_V3_LEN:])))
             try:
                 # MUST keep consuming inbound data, discard message if we have to.
-                queue.put_nowait(data)
+                # the frame view is only valid during this call, queue a copy.
+                self._queue.put_nowait(bytes(frame))
             except asyncio.QueueFull:
-                print('ERROR: queue full, message discarded!', file=sys.stderr)
-        # put a None to signal quit.
-        await queue.put(None)
+                self.dropped += 1
+                print('ERROR: orch {0}: queue full, message discarded!'.format(self._id), file=sys.stderr)
+
+    async def _async_recv(self, stream: LWStream) -> None:
+        # frames are delivered to _on_frames() by the protocol, just wait for the connection to go away.
+        await stream.writer.closed
 
     async def _async_run(self, stream: LWStream) -> None:
         # subscribe type range first.
         sub = LWMsgSubscribe(msgTypeStart=self._msgTypestart, msgTypeEnd=self._msgTypeEnd, customerIdStart=self._customerIdStart, customerIdEnd=self._customerIdEnd, clientIdStart=self._clientIdStart, clientIdEnd=self._clientIdEnd, OrchId=self._id)
         stream.writer.write(sub.serialize())
         await stream.writer.drain()
-        queue = asyncio.Queue()
-        await asyncio.gather(self._async_send(stream, queue), self._async_recv(stream, queue))
+        queue = self._queue
+        self.connected = True
+        # the sender waits on the queue forever, so cancel it as soon as the connection goes away
+        # (and the other way round). no TaskGroup here, python 3.7 must still work.
+        tasks = [asyncio.ensure_future(self._async_send(stream, queue)), asyncio.ensure_future(self._async_recv(stream))]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.connected = False
 
 
 #
@@ -533,7 +818,11 @@ class LWClientCrazy(LWClient):
         gap: float=None,
         payload_file: str=None,
         payload_hex: str=None,
-        payload_text: str=None
+        payload_text: str=None,
+        payload_bytes: bytes=None,
+        payloads: LWPayloadCache=None,
+        batch: int=64,
+        high_water: int=262144
         ) -> None:
         super().__init__(
             customerid=customerid,
@@ -549,51 +838,304 @@ class LWClientCrazy(LWClient):
         self._count = count
         self._transaction = startseq
         self._gap = gap
+        self._batch = max(batch, 1)
+        self._high_water = high_water
         self._version = MSGV2 if legacy else MSGV3
-        self._async_read = LWStreamRunner.async_readmsg_v2 \
-            if legacy else LWStreamRunner.async_readmsg_v3
-        self._payload_bytes = None
+        self._legacy = legacy
+        self._ring = LWFrameRing(
+            customerid=customerid,
+            clientid=clientid,
+            type=type,
+            size=size,
+            version=self._version,
+            payload_bytes=payload_bytes if payload_bytes is not None else
+                LWClientCrazy.load_payload(payload_file, payload_hex, payload_text),
+            payloads=payloads
+            )
+        self.connected = False
+        self.sent = 0
+        self.sent_bytes = 0
+        self.received = 0
 
+    @staticmethod
+    def load_payload(payload_file: str=None, payload_hex: str=None, payload_text: str=None) -> bytes:
         # payload override (priority: file > hex > text)
         if payload_file:
             with open(payload_file, 'rb') as f:
-                self._payload_bytes = f.read()
+                return f.read()
         elif payload_hex:
             hx = payload_hex.replace(' ', '').replace('\n', '').replace('\r', '').replace('\t', '')
-            self._payload_bytes = binascii.unhexlify(hx)
+            return binascii.unhexlify(hx)
         elif payload_text is not None:
-            self._payload_bytes = payload_text.encode('utf-8')
+            return payload_text.encode('utf-8')
+        return None
 
     async def _async_send(self, stream: LWStream) -> None:
+        writer = stream.writer
+        # the transport pauses writing above the high-water mark, drain() then waits for it to go low.
+        writer.transport.set_write_buffer_limits(high=self._high_water)
+        # a positive gap paces single messages, otherwise up to 'batch' frames go out in one write.
+        batch = 1 if self._gap else self._batch
         cnt = 0
         while self._count < 0 or cnt < self._count:
-            msg = LWMsgClient(
-                Version=self._version,
-                CustomerId=self._customerid,
-                ClientId=self._clientid,
-                Type=self._type,
-                TransactionId=self._transaction
-                )
-            self._transaction += 1
-            if self._payload_bytes is not None:
-                msg._data = self._payload_bytes
-            else:
-                msg.payload_seq(count=self._size, step=self._transaction & 0xff)
-            data = msg.serialize()
-            stream.writer.write(data)
-            # XXX: in cygwin python3.7 _async_recv() seems to be starved without this sleep(0) !!
-            # it could be cause by the send buffer size, though.
-            if self._gap is not None: await asyncio.sleep(self._gap)
-            await stream.writer.drain()
-            cnt += 1
+            n = batch if self._count < 0 else min(batch, self._count - cnt)
+            frames = []
+            self.sent_bytes += self._ring.extend(frames, self._transaction, n)
+            self._transaction += n
+            writer.writelines(frames)
+            self.sent += n
+            cnt += n
+            if self._gap: await asyncio.sleep(self._gap)
+            if writer.transport.get_write_buffer_size() > self._high_water or writer.transport.is_closing():
+                # drain() also raises once the connection is gone.
+                await writer.drain()
+            elif not self._gap:
+                # XXX: in cygwin python3.7 _async_recv() seems to be starved without this sleep(0) !!
+                # yield once per batch so the receiver and other connections get to run.
+                await asyncio.sleep(0)
+
+    def _protocol(self) -> LWFrameProtocol:
+        return LWFrameProtocol(self._on_frames, legacy=self._legacy)
+
+    def _on_frames(self, frames: list) -> None:
+        # headers are validated by the protocol. v2 payloads are DES encrypted, decrypt them so
+        # a corrupted reply fails the connection, then discard the replies.
+        if self._legacy:
+            for hdr, frame in frames:
+                try:
+                    payload = LWMsg.decrypt(frame[LW_MSG_HEADER_V2_LEN_ENC:].tobytes()) if hdr.Len != 0 else None
+                except ValueError as e:
+                    raise BadFormatError() from e
+                LWMsgClient.deserialize(hdr, payload)
+        self.received += len(frames)
 
     async def _async_recv(self, stream: LWStream) -> None:
-        while True:
-            msg, data = await self._async_read(stream)
+        await stream.writer.closed
 
     async def _async_run(self, stream: LWStream) -> None:
-        if self._count != 0:
-            await asyncio.gather(self._async_send(stream), self._async_recv(stream))
+        self.connected = True
+        try:
+            if self._count != 0:
+                await asyncio.gather(self._async_send(stream), self._async_recv(stream))
+        finally:
+            self.connected = False
+
+
+def parse_profile(text: str) -> Tuple[int, int, float]:
+    # '<type>:<len>[:<gap>]', e.g. '401:200' or '635:40960:0.01'.
+    try:
+        fields = text.split(':')
+        if len(fields) not in (2, 3): raise ValueError()
+        return (int(fields[0]), int(fields[1]), float(fields[2]) if len(fields) == 3 else None)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid profile: \'{0}\', expect <type>:<len>[:<gap>]'.format(text))
+
+
+#
+# runs many stream runners inside one event loop, started in phases of 'per_phase'
+# connections every 'phase_interval' seconds. a runner that fails is counted and logged
+# without affecting the others; subclasses print one aggregated stats line per interval.
+#
+class LWSwarm(ABC):
+    def __init__(self, runners: list, per_phase: int=0, phase_interval: float=0.0, stats_interval: float=10.0) -> None:
+        self.runners = runners
+        self._per_phase = per_phase if per_phase > 0 else len(runners)
+        self._phase_interval = phase_interval
+        self._stats_interval = stats_interval
+        self._failed = 0
+
+    @abstractmethod
+    def _name(self, runner: LWStreamRunner) -> str:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def stats(self, elapsed: float) -> str:
+        raise NotImplementedError()
+
+    def report(self) -> None:
+        pass
+
+    async def _async_run_one(self, runner: LWStreamRunner) -> None:
+        try:
+            await runner.async_run()
+        except (OSError, asyncio.IncompleteReadError, LWTestError) as e:
+            self._failed += 1
+            print('ERROR: {0}: {1!r}'.format(self._name(runner), e), file=sys.stderr)
+
+    async def _async_stats(self) -> None:
+        loop = asyncio.get_event_loop()
+        last = loop.time()
+        while True:
+            await asyncio.sleep(self._stats_interval)
+            now = loop.time()
+            print('STATS: ' + self.stats(now - last))
+            last = now
+
+    async def async_run(self) -> None:
+        stats = asyncio.ensure_future(self._async_stats()) if self._stats_interval > 0 else None
+        tasks = []
+        for n in range(0, len(self.runners), self._per_phase):
+            if n != 0: await asyncio.sleep(self._phase_interval)
+            tasks += [asyncio.ensure_future(self._async_run_one(r)) for r in self.runners[n : n + self._per_phase]]
+            print('INFO: {0} started: {1}/{2}'.format(type(self).__name__, len(tasks), len(self.runners)))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            if stats is not None: stats.cancel()
+            print('STATS: done, ' + self.stats(0))
+            self.report()
+
+
+#
+# many crazy clients inside one event loop. the clients share payload buffers and SSL
+# contexts, and take their type/len/gap round-robin from 'profiles'.
+#
+class LWClientSwarm(LWSwarm):
+    def __init__(
+        self,
+        customerid: int,
+        clientids: range,
+        host: str,
+        profiles: List[Tuple[int, int, float]],
+        count: int,
+        ca: str=None,
+        cert: str=None,
+        key: str=None,
+        legacy: bool=False,
+        per_phase: int=0,
+        phase_interval: float=0.0,
+        stats_interval: float=10.0,
+        payload_bytes: bytes=None,
+        batch: int=64,
+        high_water: int=262144
+        ) -> None:
+        payloads = LWPayloadCache()
+        clients = []
+        for n, clientid in enumerate(clientids):
+            type, size, gap = profiles[n % len(profiles)]
+            clients.append(LWClientCrazy(
+                customerid=customerid,
+                clientid=clientid,
+                host=host,
+                type=type,
+                size=size,
+                count=count,
+                ca=ca,
+                cert=cert,
+                key=key,
+                legacy=legacy,
+                gap=gap,
+                payload_bytes=payload_bytes,
+                payloads=payloads,
+                batch=batch,
+                high_water=high_water
+                ))
+        super().__init__(clients, per_phase=per_phase, phase_interval=phase_interval, stats_interval=stats_interval)
+        self._last_sent = 0
+
+    def _name(self, runner: LWClientCrazy) -> str:
+        return 'client {0}'.format(runner._clientid)
+
+    def stats(self, elapsed: float) -> str:
+        sent = sum(c.sent for c in self.runners)
+        rate = (sent - self._last_sent) / elapsed if elapsed > 0 else 0.0
+        self._last_sent = sent
+        return 'connected {0}/{1} failed {2} sent {3} msgs {4} bytes ({5:.1f} msgs/s)'.format(
+            sum(c.connected for c in self.runners), len(self.runners), self._failed, sent,
+            sum(c.sent_bytes for c in self.runners), rate)
+
+
+#
+# many echo orchs inside one event loop, one subscription connection per orch id.
+# each orch keeps its own counters; stats lines aggregate them and the final report
+# lists the orchs that discarded messages.
+#
+class LWOrchSwarm(LWSwarm):
+    def __init__(
+        self,
+        orchids: range,
+        ranges: List[List[int]],
+        host: str,
+        ca: str=None,
+        cert: str=None,
+        key: str=None,
+        legacy: bool=False,
+        show: bool=False,
+        queue_size: int=0,
+        split_clients: bool=False,
+        per_phase: int=0,
+        phase_interval: float=0.0,
+        stats_interval: float=10.0
+        ) -> None:
+        orchs = []
+        for n, orchid in enumerate(orchids):
+            # orchs sharing the same --range are numbered 0..sharing-1 among themselves.
+            sharing = len(range(n % len(ranges), len(orchids), len(ranges)))
+            msgtypes, customerids, clientids = LWOrchSwarm.subscription(ranges[n % len(ranges)], n // len(ranges),
+                                                                        sharing, split_clients)
+            orchs.append(LWOrchEcho(
+                id=orchid,
+                msgTypeStart=msgtypes[0],
+                msgTypeEnd=msgtypes[1],
+                customerIdStart=customerids[0],
+                customerIdEnd=customerids[1],
+                clientIdStart=clientids[0],
+                clientIdEnd=clientids[1],
+                host=host,
+                ca=ca,
+                cert=cert,
+                key=key,
+                legacy=legacy,
+                show=show,
+                queue_size=queue_size
+                ))
+        super().__init__(orchs, per_phase=per_phase, phase_interval=phase_interval, stats_interval=stats_interval)
+        self._last_received = 0
+
+    @staticmethod
+    def subscription(rng: List[int], n: int, total: int, split_clients: bool) -> Tuple[Tuple[int, int], ...]:
+        # with 'split_clients', the n-th of 'total' orchs only subscribes its share of the clientId range.
+        first, last = rng[4], rng[5]
+        if split_clients:
+            share = (last - first + 1) / total
+            first, last = first + int(n * share), first + int((n + 1) * share) - 1
+            last = max(first, last)
+        return ((rng[0], rng[1]), (rng[2], rng[3]), (first, last))
+
+    def _name(self, runner: LWOrchEcho) -> str:
+        return 'orch {0}'.format(runner._id)
+
+    def stats(self, elapsed: float) -> str:
+        received = sum(o.received for o in self.runners)
+        rate = (received - self._last_received) / elapsed if elapsed > 0 else 0.0
+        self._last_received = received
+        return 'connected {0}/{1} failed {2} received {3} msgs {4} bytes ({5:.1f} msgs/s) echoed {6} dropped {7} ' \
+            '(by {8} orchs)'.format(
+                sum(o.connected for o in self.runners), len(self.runners), self._failed, received,
+                sum(o.received_bytes for o in self.runners), rate, sum(o.echoed for o in self.runners),
+                sum(o.dropped for o in self.runners), sum(o.dropped != 0 for o in self.runners))
+
+    def report(self) -> None:
+        for o in self.runners:
+            if o.dropped != 0:
+                print('STATS: orch {0}: received {1} msgs {2} bytes echoed {3} dropped {4}'.format(
+                    o._id, o.received, o.received_bytes, o.echoed, o.dropped))
+
+
+def raise_nofile_limit(connections: int) -> None:
+    # one socket per connection, plus some headroom for stdio/certificates.
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = connections + 64
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        soft = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+        if soft < wanted:
+            print('WARNING: open files limited to {0}, {1} connections need {2}'.format(soft, connections, wanted),
+                file=sys.stderr)
 
 
 #
@@ -603,7 +1145,8 @@ if __name__ == "__main__":
 
     ap = argparse.ArgumentParser(description='CommServer TLS tester.')
     g0 = ap.add_argument_group('tester and connection')
-    g0.add_argument('tester', choices=['client', 'orch'], metavar='{client | orch}',
+    g0.add_argument('tester', choices=['client', 'orch', 'clients', 'orchs'],
+        metavar='{client | orch | clients | orchs}',
         help='(REQUIRED) run tester as.')
     g0.add_argument('host', metavar='<server-addr>:<port>',
         help='(REQUIRED) the CommServer addr and port to connect.')
@@ -620,19 +1163,42 @@ if __name__ == "__main__":
         help='the number of messages (default: infinite).')
     g1.add_argument('--gap', type=float, metavar='<secs>',
         help='the seconds to wait btw messages, e.g., 0.01')
+    g1.add_argument('--batch', type=int, default=64, metavar='<n>',
+        help='the max number of messages coalesced into one write when --gap is not positive (default: 64).')
+    g1.add_argument('--high-water', type=int, default=262144, metavar='<bytes>',
+        help='only wait for the connection to drain when its write buffer exceeds this (default: 262144).')
     g1.add_argument('--payload-file', metavar='<path>',
         help='use exact payload bytes from file (overrides --len/payload_seq).')
     g1.add_argument('--payload-hex', metavar='<hex>',
         help='use exact payload bytes from hex string (overrides --len/payload_seq).')
     g1.add_argument('--payload-text', metavar='<text>',
         help='use exact payload text (utf-8) (overrides --len/payload_seq).')
+    g4 = ap.add_argument_group('multi-connection options (clients / orchs), also use the client-/orch-specific options')
+    g4.add_argument('--client-range', type=int, nargs=2, metavar='<n>',
+        help='(REQUIRED for clients) the first and last client id, one connection per client id.')
+    g4.add_argument('--orch-range', type=int, nargs=2, metavar='<n>',
+        help='(REQUIRED for orchs) the first and last orch id, one subscription per orch id; '
+             'repeat --range to give the orchs different ranges (assigned round-robin).')
+    g4.add_argument('--split-clients', default=False, action='store_true',
+        help='split the clientId range of --range evenly among the orchs instead of subscribing each to all of it.')
+    g4.add_argument('--profile', type=parse_profile, action='append', metavar='<type>:<len>[:<gap>]',
+        help='per-connection message type/length/gap, assigned round-robin; repeatable '
+             '(default: --type/--len/--gap).')
+    g4.add_argument('--per-phase', type=int, default=0, metavar='<n>',
+        help='connections to start per phase (default: all at once).')
+    g4.add_argument('--phase-interval', type=float, default=0.0, metavar='<secs>',
+        help='the seconds to wait btw phases.')
+    g4.add_argument('--stats-interval', type=float, default=10.0, metavar='<secs>',
+        help='the seconds btw aggregated stats lines, 0 to disable (default: 10).')
     g2 = ap.add_argument_group('orch-specific options')
-    g2.add_argument('--range', type=int, nargs=6, metavar='<n>',
+    g2.add_argument('--range', type=int, nargs=6, action='append', metavar='<n>',
         help='(REQUIRED) the range of msgType/customerId/clientId to subscribe for.')
     g2.add_argument('--orch-id', type=int, default=0, metavar='<n>',
         help='the orchestrator id.')
     g2.add_argument('--show', default=False, action='store_true',
         help='display messages received.')
+    g2.add_argument('--queue-size', type=int, default=0, metavar='<n>',
+        help='the echo queue size, messages are discarded when it is full (default: unlimited).')
     g3 = ap.add_argument_group('common options (optional)')
     g3.add_argument('--ca', metavar='<certfile>',
         help='the CA certificate to authenticate CommServer.')
@@ -645,16 +1211,62 @@ if __name__ == "__main__":
     args = ap.parse_args()
 
     if (args.tester == 'client' and (args.customer_id is None or args.client_id is None)) or \
-       (args.tester == 'orch' and args.range is None):
+       (args.tester == 'clients' and (args.customer_id is None or args.client_range is None)) or \
+       (args.tester in ('orch', 'orchs') and args.range is None) or \
+       (args.tester == 'orchs' and args.orch_range is None):
         ap.error('missing required arguments for \'{0}\'.'.format(args.tester))
 
     # enable CTRL-C breaking program for Windows.
     signal.signal(signal.SIGINT, signal.SIG_DFL)
 
-    if args.tester == 'client':
+    if args.tester in ('client', 'clients'):
         payload_opts = [args.payload_file is not None, args.payload_hex is not None, args.payload_text is not None]
         if sum(payload_opts) > 1:
             ap.error('only one of --payload-file/--payload-hex/--payload-text can be specified.')
+
+    if args.tester == 'clients':
+        if args.client_range[0] > args.client_range[1]:
+            ap.error('--client-range: the first client id must not exceed the last.')
+        if args.legacy and args.client_range[1] > 0xffff:
+            ap.error('--client-range: legacy (v2) headers only carry 16-bit client ids.')
+        raise_nofile_limit(args.client_range[1] - args.client_range[0] + 1)
+        runner = LWClientSwarm(
+            customerid=args.customer_id,
+            clientids=range(args.client_range[0], args.client_range[1] + 1),
+            host=args.host,
+            profiles=args.profile or [(args.type, args.len, args.gap)],
+            count=args.count,
+            ca=args.ca,
+            cert=args.cert,
+            key=args.key,
+            legacy=args.legacy,
+            per_phase=args.per_phase,
+            phase_interval=args.phase_interval,
+            stats_interval=args.stats_interval,
+            payload_bytes=LWClientCrazy.load_payload(args.payload_file, args.payload_hex, args.payload_text),
+            batch=args.batch,
+            high_water=args.high_water
+            )
+    elif args.tester == 'orchs':
+        if args.orch_range[0] > args.orch_range[1]:
+            ap.error('--orch-range: the first orch id must not exceed the last.')
+        raise_nofile_limit(args.orch_range[1] - args.orch_range[0] + 1)
+        runner = LWOrchSwarm(
+            orchids=range(args.orch_range[0], args.orch_range[1] + 1),
+            ranges=args.range,
+            host=args.host,
+            ca=args.ca,
+            cert=args.cert,
+            key=args.key,
+            legacy=args.legacy,
+            show=args.show,
+            queue_size=args.queue_size,
+            split_clients=args.split_clients,
+            per_phase=args.per_phase,
+            phase_interval=args.phase_interval,
+            stats_interval=args.stats_interval
+            )
+    elif args.tester == 'client':
         runner = LWClientCrazy(
             customerid=args.customer_id,
             clientid=args.client_id,
@@ -669,23 +1281,26 @@ if __name__ == "__main__":
             gap=args.gap,
             payload_file=args.payload_file,
             payload_hex=args.payload_hex,
-            payload_text=args.payload_text
+            payload_text=args.payload_text,
+            batch=args.batch,
+            high_water=args.high_water
             )
     else:
         runner = LWOrchEcho(
             id=args.orch_id,
-            msgTypeStart=args.range[0],
-            msgTypeEnd=args.range[1],
-            customerIdStart=args.range[2],
-            customerIdEnd=args.range[3],
-            clientIdStart=args.range[4],
-            clientIdEnd=args.range[5],
+            msgTypeStart=args.range[-1][0],
+            msgTypeEnd=args.range[-1][1],
+            customerIdStart=args.range[-1][2],
+            customerIdEnd=args.range[-1][3],
+            clientIdStart=args.range[-1][4],
+            clientIdEnd=args.range[-1][5],
             host=args.host,
             ca=args.ca,
             cert=args.cert,
             key=args.key,
             legacy=args.legacy,
-            show=args.show
+            show=args.show,
+            queue_size=args.queue_size
             )
 
     asyncio.run(runner.async_run())
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tester import LW_MSG_HEADER_V3_LEN, LWClientCrazy, LWMsg  # noqa: E402
+
+
+class FakeTransport:
+    def __init__(self):
+        self.high = None
+        self.buffered = 0
+        self.closing = False
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        self.high = high
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+    def is_closing(self):
+        return self.closing
+
+
+class FakeWriter:
+    # the socket takes 'flush' bytes per drain(); writes only land in the buffer.
+    def __init__(self, flush=None):
+        self.transport = FakeTransport()
+        self.writes = []
+        self.drains = []
+        self._flush = flush
+
+    def writelines(self, data):
+        data = b''.join(data)
+        self.writes.append(split_frames(data))
+        self.transport.buffered += len(data)
+
+    async def drain(self):
+        self.drains.append(self.transport.buffered)
+        if self.transport.closing:
+            raise ConnectionResetError()
+        self.transport.buffered = max(0, self.transport.buffered - (self._flush or self.transport.buffered))
+
+
+def split_frames(data):
+    frames = []
+    while data:
+        size = LW_MSG_HEADER_V3_LEN + LWMsg.parse_header_v3(data[:LW_MSG_HEADER_V3_LEN]).Len
+        frames.append(data[:size])
+        data = data[size:]
+    return frames
+
+
+class FakeStream:
+    def __init__(self, writer):
+        self.writer = writer
+
+
+def make_client(count, size=200, batch=4, high_water=262144, gap=None):
+    return LWClientCrazy(1909622898, 7, 'localhost:0', 401, size, count, startseq=100, batch=batch,
+                         high_water=high_water, gap=gap)
+
+
+def send(client, writer):
+    asyncio.run(client._async_send(FakeStream(writer)))
+
+
+def test_frames_go_out_in_batches():
+    client = make_client(10, batch=4)
+    writer = FakeWriter()
+    send(client, writer)
+    assert [len(frames) for frames in writer.writes] == [4, 4, 2]
+    frames = [frame for batch in writer.writes for frame in batch]
+    assert [LWMsg.parse_header_v3(frame[:LW_MSG_HEADER_V3_LEN]).TransactionId for frame in frames] == \
+        list(range(100, 110))
+    assert client.sent == 10
+    assert client.sent_bytes == sum(map(len, frames))
+    assert writer.transport.high == 262144
+
+
+def test_no_drain_below_high_water():
+    client = make_client(1000, batch=64)
+    writer = FakeWriter()
+    writer.transport.buffered = -10 ** 9  # the socket always keeps up
+    send(client, writer)
+    assert client.sent == 1000
+    assert writer.drains == []
+
+
+def test_drain_only_above_high_water():
+    high_water = 10000
+    client = make_client(2000, batch=8, high_water=high_water)
+    writer = FakeWriter(flush=high_water // 2)
+    send(client, writer)
+    assert client.sent == 2000
+    assert writer.drains
+    assert all(buffered > high_water for buffered in writer.drains)
+    # one batch is ~1.8 KiB, so many batches were coalesced between two drains.
+    assert len(writer.drains) < len(writer.writes) // 2
+
+
+def test_gap_sends_single_messages():
+    client = make_client(3, batch=64, gap=0.001)
+    writer = FakeWriter()
+    send(client, writer)
+    assert [len(frames) for frames in writer.writes] == [1, 1, 1]
+
+
+def test_closing_transport_drains_and_raises():
+    client = make_client(-1, batch=4)
+    writer = FakeWriter()
+    writer.transport.closing = True
+    with pytest.raises(ConnectionResetError):
+        send(client, writer)
+    assert client.sent == 4
+    assert len(writer.drains) == 1
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tester import (LW_MSG_HEADER_V2_LEN, LW_MSG_HEADER_V3_LEN, MSGV2, MSGV3, BadFormatError,  # noqa: E402
+                    LWFrameProtocol, LWMsg, LWMsgClient, header_checksum)
+
+
+class FakeTransport:
+    def __init__(self):
+        self.aborted = False
+
+    def abort(self):
+        self.aborted = True
+
+
+class Recorder:
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, frames):
+        # views point into the protocol buffer, copy them before it is compacted.
+        # TransactionId is the last header field in both v3 and v2.
+        self.batches.append([(hdr[-1], bytes(frame)) for hdr, frame in frames])
+
+    @property
+    def frames(self):
+        return [frame for batch in self.batches for frame in batch]
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    asyncio.set_event_loop(None)
+    loop.close()
+
+
+def make_frame(transaction, size):
+    msg = LWMsgClient(Version=MSGV3, CustomerId=1909622898, ClientId=7, Type=401, TransactionId=transaction)
+    msg.payload_seq(count=size, step=transaction & 0xff)
+    return msg.serialize()
+
+
+def make_protocol(bufsize=0, legacy=False):
+    recorder = Recorder()
+    protocol = LWFrameProtocol(recorder, legacy=legacy, bufsize=bufsize)
+    protocol.connection_made(FakeTransport())
+    return protocol, recorder
+
+
+def feed(protocol, data, chunk=None):
+    # what the event loop does: ask for a buffer, read at most 'chunk' bytes into it, report them.
+    while data:
+        buf = protocol.get_buffer(-1)
+        n = min(len(buf), len(data), chunk or len(data))
+        buf[:n] = data[:n]
+        protocol.buffer_updated(n)
+        data = data[n:]
+
+
+@pytest.mark.parametrize("chunk", [1, 7, LW_MSG_HEADER_V3_LEN, LW_MSG_HEADER_V3_LEN + 1, 1000, None])
+def test_frames_split_across_reads(loop, chunk):
+    frames = [make_frame(transaction, size) for transaction, size in enumerate([0, 1, 200, 5000, 17, 0, 300])]
+    protocol, recorder = make_protocol()
+    feed(protocol, b''.join(frames), chunk)
+    assert recorder.frames == list(enumerate(frames))
+    assert not protocol.closed.done()
+
+
+def test_partial_frame_waits_for_the_rest(loop):
+    frame = make_frame(1, 300)
+    protocol, recorder = make_protocol()
+    feed(protocol, frame[:LW_MSG_HEADER_V3_LEN + 10])
+    assert recorder.batches == []
+    feed(protocol, frame[LW_MSG_HEADER_V3_LEN + 10:] + make_frame(2, 0))
+    assert recorder.batches == [[(1, frame), (2, make_frame(2, 0))]]
+
+
+def test_buffer_grows_for_frames_larger_than_it(loop):
+    protocol, recorder = make_protocol()
+    initial = protocol.get_buffer(-1)
+    assert len(initial) == LWFrameProtocol.MIN_READ
+    big = make_frame(3, 3 * LWFrameProtocol.MIN_READ)
+    feed(protocol, make_frame(2, 10) + big + make_frame(4, 10), chunk=4096)
+    assert recorder.frames == [(2, make_frame(2, 10)), (3, big), (4, make_frame(4, 10))]
+    assert len(protocol._buf) >= len(big)
+    # the old buffer is reallocated, not resized in place, so views into it stay valid.
+    initial[0] = 0
+
+
+def test_buffer_is_compacted_instead_of_growing(loop):
+    protocol, recorder = make_protocol()
+    frames = [make_frame(transaction, 1000) for transaction in range(500)]
+    data = b''.join(frames)
+    # a partial frame left at the end of every read has to be moved to the front.
+    feed(protocol, data, chunk=len(frames[0]) * 3 + 100)
+    assert recorder.frames == list(enumerate(frames))
+    # ~500 KiB went through a buffer that never had to grow past one read plus the partial frame.
+    assert len(protocol._buf) <= 2 * LWFrameProtocol.MIN_READ
+
+
+def test_bad_header_delivers_the_good_frames_before_it(loop):
+    good = [make_frame(transaction, 100) for transaction in range(3)]
+    bad = bytearray(make_frame(3, 100))
+    bad[10] ^= 0xff  # breaks the header checksum
+    protocol, recorder = make_protocol()
+    feed(protocol, b''.join(good) + bytes(bad) + make_frame(4, 100))
+    assert recorder.batches == [list(enumerate(good))]
+    assert protocol.transport.aborted
+    with pytest.raises(BadFormatError):
+        protocol.closed.result()
+
+
+def test_wrong_version_is_a_bad_format(loop):
+    protocol, recorder = make_protocol()
+    header = bytearray(make_frame(0, 0))
+    header[0] = MSGV3 + 1
+    header_checksum(header)
+    feed(protocol, bytes(header))
+    assert recorder.batches == []
+    assert isinstance(protocol.closed.exception(), BadFormatError)
+
+
+def test_handler_error_fails_the_connection(loop):
+    def on_frames(frames):
+        raise BadFormatError()
+    protocol = LWFrameProtocol(on_frames)
+    protocol.connection_made(FakeTransport())
+    feed(protocol, make_frame(1, 10))
+    assert protocol.transport.aborted
+    assert isinstance(protocol.closed.exception(), BadFormatError)
+
+
+def test_connection_lost_mid_frame(loop):
+    protocol, recorder = make_protocol()
+    feed(protocol, make_frame(1, 10)[:-1])
+    protocol.connection_lost(None)
+    assert isinstance(protocol.closed.exception(), asyncio.IncompleteReadError)
+
+
+@pytest.mark.parametrize("header", [
+    bytes(range(24)),  # bad DES padding
+    LWMsg.encrypt(b'x' * (LW_MSG_HEADER_V2_LEN - 1)),  # valid padding, header one byte short
+], ids=["padding", "length"])
+def test_legacy_undecryptable_header_is_a_bad_format(loop, header):
+    good = LWMsgClient(Version=MSGV2, CustomerId=1909622898, ClientId=7, Type=401, TransactionId=1)
+    good.payload_seq(count=100)
+    frame = good.serialize()
+    protocol, recorder = make_protocol(legacy=True)
+    feed(protocol, frame + header + frame)
+    assert recorder.batches == [[(1, frame)]]
+    assert protocol.transport.aborted
+    assert isinstance(protocol.closed.exception(), BadFormatError)